@@ -1,9 +1,10 @@
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
 from redis.asyncio import Redis
 import asyncio
-import json
 import logging
 from app.core.config import settings
+from app.core.history import resolve_history
+from app.core import wire
 # run_scoring imported inside function to avoid circular deps if any
 
 logger = logging.getLogger(__name__)
@@ -14,22 +15,21 @@ producer = None
 async def push_trace(event_data: dict):
     if producer:
         try:
-            await producer.send_and_wait(settings.KAFKA_TOPIC_TRACES, event_data)
+            await producer.send_and_wait(settings.KAFKA_TOPIC_TRACES, event_data, headers=wire.kafka_headers())
         except Exception as e:
-            logger.error(f"Failed to push trace from evaluation-worker: {e}")
+            logger.error("Failed to push trace from evaluation-worker: %s", e)
 
 async def consume_messages():
-    logger.info(f"Starting consumer for {settings.KAFKA_TOPIC_EVALUATION_REQUESTS}...")
+    logger.info("Starting consumer for %s...", settings.KAFKA_TOPIC_EVALUATION_REQUESTS)
     global consumer, producer
     consumer = AIOKafkaConsumer(
         settings.KAFKA_TOPIC_EVALUATION_REQUESTS,
         bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-        group_id=settings.KAFKA_GROUP_EVALUATION,
-        value_deserializer=lambda m: json.loads(m.decode('utf-8'))
+        group_id=settings.KAFKA_GROUP_EVALUATION
     )
     producer = AIOKafkaProducer(
         bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-        value_serializer=lambda m: json.dumps(m).encode('utf-8')
+        value_serializer=wire.dumps_bytes
     )
 
     # Redis Init
@@ -44,7 +44,7 @@ async def consume_messages():
             logger.info("Successfully connected to Kafka.")
             break
         except Exception as e:
-            logger.error(f"Failed to connect to Kafka (Attempt {retry_count + 1}/{max_retries}): {e}")
+            logger.error("Failed to connect to Kafka (Attempt %d/%d): %s", retry_count + 1, max_retries, e)
             retry_count += 1
             await asyncio.sleep(5)
     else:
@@ -61,15 +61,25 @@ async def consume_messages():
         if not messages:
             return
             
-        logger.info(f"Processing batch of {len(messages)} messages...")
+        logger.info("Processing batch of %d messages", len(messages))
         
         results = []
         # Tách riêng battle requests và standard eval requests
         battle_payloads = []
         standard_payloads = []
         
+        # msgpack/JSON theo header content-type (message cũ không có header = JSON)
+        payloads = []
         for m in messages:
-            p = m.value
+            try:
+                payloads.append(wire.decode(m.value, m.headers))
+            except Exception as e:
+                logger.error("Skipping undecodable message at offset %s: %s", m.offset, e)
+
+        # History gửi theo tham chiếu (history_ref) -> đọc từ Redis
+        await asyncio.gather(*[resolve_history(redis_client, p) for p in payloads])
+        
+        for p in payloads:
             if p.get("response_a") and p.get("response_b"):
                 battle_payloads.append(p)
             else:
@@ -96,8 +106,10 @@ async def consume_messages():
                 else:
                     redis_key = f"campaign:{campaign_id}:evaluation_result"
                 
-                await redis_client.rpush(redis_key, json.dumps(res))
+                await redis_client.rpush(redis_key, wire.dumps(res))
                 await redis_client.expire(redis_key, 600)
+                # Wake up the orchestrator's result dispatcher
+                await redis_client.publish(settings.REDIS_RESULT_CHANNEL, redis_key)
 
             # 2. Check Confidence & Send result back
             total_score = res.get("total_score", 0.0)
@@ -106,13 +118,13 @@ async def consume_messages():
                 # Low confidence -> Manual Review
                 res["status"] = "needs_review"
                 res["confidence_flag"] = "low"
-                logger.warning(f"Campaign {campaign_id} has low score ({total_score}). Sending to Manual Review.")
-                await producer.send_and_wait(settings.KAFKA_TOPIC_MANUAL_REVIEW, res)
+                logger.warning("Campaign %s has low score (%s). Sending to manual review.", campaign_id, total_score, extra={"campaign_id": campaign_id})
+                await producer.send_and_wait(settings.KAFKA_TOPIC_MANUAL_REVIEW, res, headers=wire.kafka_headers())
             else:
                 # High confidence -> Completed
-                await producer.send_and_wait(settings.KAFKA_TOPIC_EVALUATION_COMPLETED, res)
+                await producer.send_and_wait(settings.KAFKA_TOPIC_EVALUATION_COMPLETED, res, headers=wire.kafka_headers())
         
-        logger.info(f"Batch processed. Sent {len(results)} results.")
+        logger.info("Batch processed. Sent %d results.", len(results))
 
     try:
         # Consumer Loop with Batching
@@ -18,6 +18,7 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379")
+    REDIS_RESULT_CHANNEL: str = os.getenv("REDIS_RESULT_CHANNEL", "campaign:results")
     
     # OpenAI / LLM
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
@@ -2,6 +2,9 @@ from fastapi import FastAPI
 import asyncio
 from app.consumers.kafka_consumer import consume_messages
 from app.core.config import settings
+from app.core.log import setup_logging
+
+setup_logging("evaluation-worker")
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -1,9 +1,11 @@
 from typing import List
 import random
-import json
+import re
 import logging
 from deepeval.tracing import observe
 from app.core.config import settings
+from app.core.log import brief, set_campaign_id
+from app.core.text_match import politeness_matcher
 
 logger = logging.getLogger(__name__)
 from deepeval.test_case import LLMTestCase
@@ -23,6 +25,9 @@ from deepeval.test_case import LLMTestCaseParams
 from deepeval.models.base_model import DeepEvalBaseLLM
 from langchain_openai import ChatOpenAI
 
+# Basic evaluation: số trong criteria (vd "The answer must be exactly 167.")
+_NUMBER_PATTERN = re.compile(r'\b\d+\b')
+
 class CustomDeepEvalLLM(DeepEvalBaseLLM):
     def __init__(self, model_name: str, api_key: str, base_url: str):
         self.model_name = model_name
@@ -218,7 +223,7 @@ class MetricFactory:
             )
             
         # Fallback
-        logger.warning(f"Metric {metric_id} not explicitly mapped. Returning None.")
+        logger.warning("Metric %s not explicitly mapped. Returning None.", metric_id)
         return None
 
 @observe()
@@ -272,9 +277,8 @@ async def run_scoring_batch(payloads: List[dict], trace_callback=None) -> List[d
                     
                     # Simple heuristic: Check if specific numbers or keywords from criteria are in output
                     # For Math: "The answer must be exactly 167." -> Check if "167" in text.
-                    import re
                     # Extract number from criteria if possible
-                    numbers = re.findall(r'\b\d+\b', criteria)
+                    numbers = _NUMBER_PATTERN.findall(criteria)
                     
                     if numbers:
                         # Check if ANY of the expected numbers are in the output
@@ -288,8 +292,7 @@ async def run_scoring_batch(payloads: List[dict], trace_callback=None) -> List[d
                     metric_results["basic_match"] = score
                     
                     # Simple Politeness Heuristic (để đáp ứng yêu cầu hiển thị UI)
-                    polite_keywords = ["please", "thank", "sorry", "hello", "hi", "vui lòng", "cảm ơn", "xin chào", "xin lỗi"]
-                    is_polite = any(kw in actual.lower() for kw in polite_keywords)
+                    is_polite = politeness_matcher.contains(actual)
                     metric_results["politeness"] = 1.0 if is_polite else 0.8 # Mặc định 0.8 vì logic robot thường lịch sự, 1.0 nếu có keyword
                     
                     # Add reasoning for UI
@@ -351,7 +354,8 @@ async def run_scoring_batch(payloads: List[dict], trace_callback=None) -> List[d
                     # OR we can pass the whole history context to GEval if we define it right.
                 })
 
-        logger.info(f"--- SCORING CAMPAIGN {campaign_id} ---")
+        log_ctx = {"campaign_id": campaign_id}
+        logger.info("Scoring campaign %s", campaign_id, extra=log_ctx)
         
         metric_results = {}
         
@@ -391,9 +395,9 @@ async def run_scoring_batch(payloads: List[dict], trace_callback=None) -> List[d
                             api_key=model_config.get("api_key"),
                             base_url=model_config.get("base_url") or "https://api.openai.com/v1"
                         )
-                        logger.info(f"Using Dynamic Custom Model for Eval: {model_config.get('model')}")
+                        logger.info("Using dynamic custom model for eval: %s", model_config.get('model'), extra=log_ctx)
                     except Exception as e:
-                        logger.error(f"Failed to init CustomDeepEvalLLM: {e}. Fallback to env.")
+                        logger.error("Failed to init CustomDeepEvalLLM: %s. Fallback to env.", e, extra=log_ctx)
                         eval_model = settings.MODEL_NAME
                 
                 # Execute each requested metric
@@ -410,7 +414,7 @@ async def run_scoring_batch(payloads: List[dict], trace_callback=None) -> List[d
                             if hasattr(metric_instance, 'reason') and metric_instance.reason:
                                 metric_results[f"{m_id}_reason"] = metric_instance.reason
                         except Exception as me:
-                            logger.error(f"Metric {m_id} failed: {me}")
+                            logger.error("Metric %s failed: %s", m_id, me, extra=log_ctx)
                             metric_results[m_id] = 0.0
 
                 # Log standardized JSON
@@ -421,13 +425,13 @@ async def run_scoring_batch(payloads: List[dict], trace_callback=None) -> List[d
                     "metrics": metric_results,
                     "model": eval_model.get_model_name() if hasattr(eval_model, 'get_model_name') else str(eval_model)
                 }
-                logger.info(json.dumps(event_data))
+                logger.info("Evaluation event: %s", brief(event_data), extra=log_ctx)
                 
                 if trace_callback:
                     await trace_callback(event_data)
 
             except Exception as e:
-                logger.error(f"DeepEval Failed: {e}")
+                logger.error("DeepEval failed: %s", e, extra=log_ctx)
                 metric_results = {"error": str(e), "score": 0.0}
         
         # Tính severity dựa trên metrics
@@ -469,7 +473,8 @@ async def run_battle_judge(payload: dict) -> dict:
     resp_a = payload.get("response_a", "")
     resp_b = payload.get("response_b", "")
     
-    logger.info(f"--- BATTLE JUDGE FOR CAMPAIGN {campaign_id} ---")
+    set_campaign_id(campaign_id)
+    logger.info("Battle judge for campaign %s", campaign_id)
     
     # Mock result if no API key
     if not settings.OPENAI_API_KEY or "placeholder" in settings.OPENAI_API_KEY:
@@ -535,7 +540,7 @@ async def run_battle_judge(payload: dict) -> dict:
             "metrics": {"battle_score": score}
         }
     except Exception as e:
-        logger.error(f"Battle Judge Failed: {e}")
+        logger.error("Battle judge failed: %s", e)
         return {
             "campaign_id": campaign_id,
             "status": "failed",
@@ -1,19 +1,26 @@
-from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException
 from typing import Dict, Any, List
 import uuid
 import os
 import json
+import logging
 from datetime import datetime
 
-from app.models.schemas import CreateBattleRequest
-from app.services.battle_arena_workflow import build_comparison_graph
+from app.models.schemas import CreateBattleRequest, CreateTournamentRequest
+from app.services.battle_arena_workflow import build_comparison_graph, is_pipelined
 from app.services.adversarial_workflow import build_adversarial_graph
-from app.services.checkpointer import get_checkpointer, get_redis_client
+from app.services.tournament import run_tournament
+from app.services.checkpointer import get_checkpointer, get_redis_client, ensure_checkpointer_setup, apply_retention
+from app.services.campaign_scheduler import campaign_scheduler
+from app.services.event_stream import event_stream
+from app.core.log import set_campaign_id
 
 router = APIRouter(prefix="/battle")
+logger = logging.getLogger(__name__)
 
 async def run_battle_background(campaign_id: str, req: CreateBattleRequest):
-    print(f"--- BACKGROUND BATTLE START: {campaign_id} ---")
+    set_campaign_id(campaign_id)
+    logger.info("Background battle start: %s", campaign_id)
     try:
         # Chọn graph dựa trên mode
         if req.mode == "adversarial":
@@ -32,7 +39,7 @@ async def run_battle_background(campaign_id: str, req: CreateBattleRequest):
                 "messages": []
             }
         else: # Default to comparison if mode is not adversarial or explicitly "comparison"
-            graph = build_comparison_graph()
+            graph = build_comparison_graph(is_pipelined(req.metadata))
             initial_state = {
                 "campaign_id": campaign_id,
                 "mode": "comparison",
@@ -51,7 +58,7 @@ async def run_battle_background(campaign_id: str, req: CreateBattleRequest):
             
         # Initialize Checkpointer (if graph has one)
         if hasattr(graph, 'checkpointer') and graph.checkpointer:
-            await graph.checkpointer.asetup()
+            await ensure_checkpointer_setup(graph.checkpointer)
         
         config = {
             "configurable": {
@@ -61,21 +68,35 @@ async def run_battle_background(campaign_id: str, req: CreateBattleRequest):
         }
         
         # Invoke Graph
-        async for _ in graph.astream(initial_state, config=config):
-            pass
+        final_state = await event_stream.run_graph(graph, initial_state, config, campaign_id)
+        
+        await apply_retention(campaign_id, final_state, kind="battle")
             
     except Exception as e:
-        print(f"CRITICAL ERROR in Battle Workflow: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Critical error in battle workflow: %s", e)
+
+async def run_battle_job(job: dict):
+    await run_battle_background(job["campaign_id"], CreateBattleRequest(**job["payload"]))
+
+campaign_scheduler.register("battle", run_battle_job)
+
+async def run_tournament_job(job: dict):
+    set_campaign_id(job["campaign_id"])
+    try:
+        summary = await run_tournament(CreateTournamentRequest(**job["payload"]))
+        logger.info("Tournament %s finished: %s", job["campaign_id"], summary)
+    except Exception as e:
+        logger.exception("Critical error in tournament: %s", e)
+
+campaign_scheduler.register("tournament", run_tournament_job)
 
 @router.post("/start")
-async def start_battle(req: CreateBattleRequest, background_tasks: BackgroundTasks):
+async def start_battle(req: CreateBattleRequest, workspace_id: str = Header(None)):
     """
     Khởi chạy luồng Battle Arena.
     """
     campaign_id = req.campaign_id
-    background_tasks.add_task(run_battle_background, campaign_id, req)
+    await campaign_scheduler.enqueue("battle", campaign_id, req.model_dump(), workspace_id=workspace_id, priority=req.priority)
     
     return {
         "campaign_id": campaign_id,
@@ -83,6 +104,23 @@ async def start_battle(req: CreateBattleRequest, background_tasks: BackgroundTas
         "message": "Battle Arena workflow started in background"
     }
 
+@router.post("/tournaments/start")
+async def start_tournament(req: CreateTournamentRequest, workspace_id: str = Header(None)):
+    """
+    Khởi chạy giải đấu nhiều Agent (round-robin / swiss), rating Elo cập nhật ở Resource Service.
+    """
+    if len(set(req.agent_ids)) < 2 or not req.prompts:
+        raise HTTPException(status_code=422, detail="Tournament needs at least 2 distinct agents and 1 prompt")
+    if req.format not in ("round_robin", "swiss"):
+        raise HTTPException(status_code=422, detail=f"Unknown tournament format: {req.format}")
+    await campaign_scheduler.enqueue("tournament", req.tournament_id, req.model_dump(), workspace_id=workspace_id, priority=req.priority)
+
+    return {
+        "tournament_id": req.tournament_id,
+        "status": "queued",
+        "message": "Battle tournament started in background"
+    }
+
 @router.get("/{campaign_id}/state")
 async def get_battle_state(campaign_id: str):
     """
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
-import httpx
+from app.core.http_client import get_http_client
 from app.services.benchmark_service import benchmark_service
 
 router = APIRouter()
@@ -53,17 +53,16 @@ async def list_benchmark_history(page: int = 1, size: int = 20):
     resource_service_url = benchmark_service.resource_service_url
     url = f"{resource_service_url}/resource/benchmarks?page={page}&size={size}"
     
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(url, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                # Frontend expects "data" to be the list of items
-                return {"success": True, "data": data.get("items", [])}
-            else:
-                raise HTTPException(status_code=resp.status_code, detail="Failed to fetch history")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        resp = await get_http_client().get(url)
+        if resp.status_code == 200:
+            data = resp.json()
+            # Frontend expects "data" to be the list of items
+            return {"success": True, "data": data.get("items", [])}
+        else:
+            raise HTTPException(status_code=resp.status_code, detail="Failed to fetch history")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history/{id}")
 async def get_benchmark_result(id: str):
@@ -73,12 +72,11 @@ async def get_benchmark_result(id: str):
     resource_service_url = benchmark_service.resource_service_url
     url = f"{resource_service_url}/resource/benchmarks/{id}"
     
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(url, timeout=10)
-            if resp.status_code == 200:
-                return {"success": True, "data": resp.json()}
-            else:
-                raise HTTPException(status_code=resp.status_code, detail="Failed to fetch result")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        resp = await get_http_client().get(url)
+        if resp.status_code == 200:
+            return {"success": True, "data": resp.json()}
+        else:
+            raise HTTPException(status_code=resp.status_code, detail="Failed to fetch result")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,68 +1,88 @@
-from fastapi import APIRouter, BackgroundTasks, Depends
-from typing import Dict, Any, List
+from fastapi import APIRouter, Depends, Response, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional
 import uuid
 import os
 import json
+import copy
+import asyncio
+import statistics
+import logging
 from datetime import datetime
 # from langfuse.callback import CallbackHandler
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.schemas import CreateCampaignRequest, CampaignResponse
-from app.services.workflow import build_dynamic_graph
-from app.services.checkpointer import get_checkpointer, get_redis_client
+from app.models.schemas import CreateCampaignRequest, CampaignResponse, CreateBatchRequest
+from app.services.workflow import build_dynamic_graph, execution_plan, update_campaign_status
+from app.services.expression import ExpressionError
+from app.services.checkpointer import get_checkpointer, get_redis_client, ensure_checkpointer_setup, apply_retention
 from app.db.engine import get_db
 from app.db.repository import CampaignRepository
+from app.services.campaign_scheduler import campaign_scheduler
+from app.services.code_executor import code_executor
+from app.services.campaign_index import campaign_index
+from app.services.event_stream import event_stream
+from app.services.campaign_recovery import resume_point, RECOVERY_JOB_KIND
+from app.services.durable_timers import durable_timers, wait_deadline
+from app.services.node_memo import node_memo
+from app.services.node_dispatch import node_dispatcher
+from app.services.resource_client import get_agent_config
+from app.core.security import decrypt_value
+import app.core.resources as resources
+from app.core.http_client import get_http_client
+from app.core.kafka_producer import kafka_producer
+from app.core.log import brief, set_campaign_id
 
 from fastapi import HTTPException, Header
 import httpx
 
-async def check_workspace_quota(workspace_id: str):
+logger = logging.getLogger(__name__)
+
+async def check_workspace_quota(workspace_id: str, runs: int = 1):
     if not workspace_id:
         return # Skip if no workspace provided in internal mode
     try:
         url = f"http://billing-service:8000/api/v1/billing/subscription?workspace_id={workspace_id}"
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, timeout=5)
-            if resp.status_code == 200:
-                data = resp.json()
-                plan = data.get("plan", {})
-                max_runs = plan.get("features", {}).get("max_runs_per_month", 99)
-                owner_id = data.get("owner_id")
-                
-                if max_runs == -1:
-                    return # Unlimited plan
-                    
-                redis = get_redis_client()
-                current_month = datetime.now().strftime('%Y-%m')
-                # Check quota based on owner_id (shared across workspaces)
-                usage_key = f"usage:{owner_id}:{current_month}:runs"
-                
-                # Get current usage
-                count = await redis.get(usage_key)
-                current_count = int(count) if count else 0
-                
-                if current_count >= max_runs:
-                    raise HTTPException(
-                        status_code=403, 
-                        detail=f"Quota Exceeded. You have used {current_count}/{max_runs} runs. Please upgrade your plan."
-                    )
+        resp = await get_http_client("billing").get(url)
+        if resp.status_code == 200:
+            data = resp.json()
+            plan = data.get("plan", {})
+            max_runs = plan.get("features", {}).get("max_runs_per_month", 99)
+            owner_id = data.get("owner_id")
+            
+            if max_runs == -1:
+                return # Unlimited plan
                 
-                # --- NEW: Call Billing Service to increment usage persistently ---
-                try:
-                    inc_url = "http://billing-service:8000/api/v1/billing/usage/increment"
-                    async with httpx.AsyncClient() as client:
-                        await client.post(inc_url, json={
-                            "user_id": str(owner_id),
-                            "resource_type": "runs",
-                            "amount": 1
-                        }, timeout=5)
-                except Exception as inc_err:
-                    print(f"Warning: Failed to increment persistent usage: {inc_err}")
-                    # Fallback to local redis increment if API fails to at least keep track
-                    await redis.incr(usage_key)
-                     
+            redis = get_redis_client()
+            current_month = datetime.now().strftime('%Y-%m')
+            # Check quota based on owner_id (shared across workspaces)
+            usage_key = f"usage:{owner_id}:{current_month}:runs"
+            
+            # Get current usage
+            count = await redis.get(usage_key)
+            current_count = int(count) if count else 0
+            
+            if current_count + runs > max_runs:
+                raise HTTPException(
+                    status_code=403, 
+                    detail=f"Quota Exceeded. You have used {current_count}/{max_runs} runs. Please upgrade your plan."
+                )
+            
+            # --- NEW: Call Billing Service to increment usage persistently ---
+            try:
+                inc_url = "http://billing-service:8000/api/v1/billing/usage/increment"
+                await get_http_client("billing").post(inc_url, json={
+                    "user_id": str(owner_id),
+                    "resource_type": "runs",
+                    "amount": runs
+                })
+            except Exception as inc_err:
+                logger.warning("Failed to increment persistent usage: %s", inc_err)
+                # Fallback to local redis increment if API fails to at least keep track
+                await redis.incrby(usage_key, runs)
+                 
     except httpx.RequestError as e:
-        print(f"Warning: Could not connect to Billing Service to check quota: {e}")
+        logger.warning("Could not connect to Billing Service to check quota: %s", e)
 
 router = APIRouter()
 
@@ -70,155 +90,232 @@ router = APIRouter()
 def health_check():
     return {"status": "ok", "service": "orchestrator", "persistence": "redis"}
 
+async def fetch_agent_target_config(agent_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Lấy Agent từ Resource Service (qua config cache) và map sang target_config (đã giải mã key).
+    """
+    try:
+        agent_data = await get_agent_config(agent_id)
+        if not agent_data:
+            logger.warning("Failed to fetch agent %s", agent_id)
+            return None
+        logger.debug("Loaded agent: %s", agent_data.get('name'))
+        
+        # Decrypt API Key
+        api_key = decrypt_value(agent_data.get("api_key_encrypted"))
+        lf_secret_key = decrypt_value(agent_data.get("langfuse_secret_key_encrypted"))
+        
+        # Map to target_config
+        target_config = {
+            "api_key": api_key,
+            "base_url": agent_data.get("endpoint_url"),
+            "model": agent_data.get("meta_data", {}).get("model"), # Fix Model Key
+            "provider": agent_data.get("meta_data", {}).get("provider", "DeepSeek"),
+            "langfuse_public_key": agent_data.get("langfuse_public_key"),
+            "langfuse_secret_key": lf_secret_key,
+            "langfuse_host": agent_data.get("langfuse_host"),
+            "langfuse_project_id": agent_data.get("langfuse_project_id")
+        }
+        return {"target_config": target_config, "agent_name": agent_data.get("name")}
+    except Exception as e:
+        logger.error("Error fetching agent: %s", e)
+    return None
+
+async def fetch_scenario(scenario_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Lấy Scenario (nodes/edges) từ Resource Service.
+    """
+    if not scenario_id:
+        logger.warning("req.scenario_id is missing or empty")
+        return None
+    logger.debug("Handling scenario_id: %s", scenario_id)
+    try:
+        url = f"http://resource-service:8000/resource/scenarios/{scenario_id}"
+        logger.debug("Fetching scenario from: %s", url)
+        resp = await get_http_client().get(url)
+        if resp.status_code == 200:
+            scenario_data = resp.json()
+            logger.debug("Loaded scenario: %s", scenario_data.get('name'))
+            return scenario_data
+        else:
+            logger.warning("Failed to load scenario %s: %s", scenario_id, resp.status_code)
+    except Exception as e:
+        logger.error("Error fetching scenario: %s", e)
+    return None
+
+def apply_agent_config(req: CreateCampaignRequest, agent_info: Optional[Dict[str, Any]]):
+    if not agent_info:
+        return
+    # Update metadata with target_config (merge if exists)
+    current_target = req.metadata.get("target_config", {})
+    req.metadata["target_config"] = {**agent_info["target_config"], **current_target}
+    req.metadata["agent_name"] = agent_info.get("agent_name")
+
+def count_expectations(scenario_data: Optional[Dict[str, Any]]) -> int:
+    # Count expectations for score normalization (precomputed in the scenario's execution plan)
+    if not scenario_data:
+        return 1
+    return execution_plan(scenario_data)["expectations_count"] or 1 # Avoid division by zero
+
+def missing_variables(scenario_data: Optional[Dict[str, Any]], metadata: Dict[str, Any]) -> List[str]:
+    # Biến {{...}} scenario dùng mà không node nào tạo ra -> phải truyền qua metadata["variables"]
+    if not scenario_data:
+        return []
+    required = execution_plan(scenario_data).get("required_variables") or []
+    provided = metadata.get("variables") or {}
+    return [name for name in required if name not in provided]
+
+async def execute_campaign(campaign_id: str, req: CreateCampaignRequest, scenario_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Chạy graph của scenario cho một campaign. Trả về final state (hoặc None nếu lỗi).
+    """
+    # Init Graph dynamically based on scenario data (cached per scenario hash)
+    app = build_dynamic_graph(scenario_data)
+    missing = missing_variables(scenario_data, req.metadata)
+    if missing:
+        logger.warning("Campaign %s: scenario variables not provided: %s", campaign_id, ", ".join(missing))
+
+    # Initialize Checkpointer (Create indices)
+    if hasattr(app, 'checkpointer') and app.checkpointer:
+        await ensure_checkpointer_setup(app.checkpointer)
+    
+    # Checkpointer configuration
+    config = {
+        "configurable": {
+            "thread_id": campaign_id,
+            "checkpoint_ns": "" 
+        }
+    }
+    
+    if not config.get("callbacks"):
+        config["callbacks"] = []
+    # config["callbacks"].append(langfuse_handler)
+
+    # Initial State
+    initial_state = {
+        "campaign_id": campaign_id,
+        "scenario_id": req.scenario_id,
+        "messages": [], # Annotated[operator.add] will append new messages
+        "status": "running",
+        "raw_score_sum": 0.0, # Counter for normalization
+        "current_score": 0.0, # Scaled score [0-10] for display
+        "metrics": {}, # Annotated[merge_metrics] will merge metrics
+        "metadata": {
+            **req.metadata,
+            "scenario_name": req.scenario_name,
+            "agent_id": req.agent_id,
+            "language": req.language
+        },
+        "error": None,
+        "retry_count": 0,
+        "_condition_result": "false",
+        "expectations_count": count_expectations(scenario_data)
+    }
+    
+    # Invoke Graph (Async)
+    set_campaign_id(campaign_id)
+    logger.info("Starting background execution for %s", campaign_id)
+    try:
+        # Job chạy lại sau restart / timer của Wait Node: tiếp tục từ checkpoint thay vì chạy lại từ đầu
+        graph_input, final_state = await resume_point(app, config, initial_state)
+        if final_state is None:
+            if graph_input is not initial_state:
+                await update_campaign_status(campaign_id, "running")
+            final_state = await event_stream.run_graph(app, graph_input, config, campaign_id)
+        elif wait_deadline(final_state) is None:
+            logger.info("Campaign %s already finished, skipping re-execution", campaign_id)
+            return final_state
+
+        resume_at = wait_deadline(final_state)
+        if resume_at is not None:
+            # Wait Node: nhả coroutine + slot scheduler, timer resume campaign khi đến hạn
+            await durable_timers.schedule(campaign_id, resume_at)
+            await update_campaign_status(campaign_id, "waiting")
+            logger.info("Campaign %s waiting until %.0f", campaign_id, resume_at)
+            return final_state
+
+        logger.info("Finished background execution for %s", campaign_id)
+        await apply_retention(campaign_id, final_state, kind="campaign")
+        return final_state
+    except Exception as inv_err:
+        logger.exception("Error during graph execution for %s: %s", campaign_id, inv_err)
+        # Đánh dấu failed: campaign còn "running" trong index sẽ bị recovery chạy lại (và lỗi lại) sau mỗi restart
+        await update_campaign_status(campaign_id, "failed", metrics={"error": str(inv_err)})
+        await event_stream.publish(campaign_id, "error", {"error": str(inv_err)})
+    return None
+
 async def run_campaign_background(campaign_id: str, req: CreateCampaignRequest):
-    print(f"DEBUG: run_campaign_background started for {campaign_id}", flush=True)
-    print(f"DEBUG: req dump: {req.model_dump()}", flush=True)
+    set_campaign_id(campaign_id)
+    logger.debug("run_campaign_background started: %s", brief(req))
     try:
         # Fetch Agent Data if agent_id is present
         agent_id = req.agent_id or req.metadata.get("agent_id")
         if agent_id:
-            try:
-                import httpx
-                from app.core.security import decrypt_value
-                
-                url = f"http://resource-service:8000/resource/agents/{agent_id}"
-                print(f"Fetching Agent (httpx) from: {url}")
-                
-                async with httpx.AsyncClient() as client:
-                    resp = await client.get(url, timeout=10)
-                    if resp.status_code == 200:
-                        agent_data = resp.json()
-                        print(f"Loaded Agent: {agent_data.get('name')}")
-                        
-                        # Decrypt API Key
-                        api_key = decrypt_value(agent_data.get("api_key_encrypted"))
-                        lf_secret_key = decrypt_value(agent_data.get("langfuse_secret_key_encrypted"))
-                        
-                        # Map to target_config
-                        target_config = {
-                            "api_key": api_key,
-                            "base_url": agent_data.get("endpoint_url"),
-                            "model": agent_data.get("meta_data", {}).get("model"), # Fix Model Key
-                            "provider": agent_data.get("meta_data", {}).get("provider", "DeepSeek"),
-                            "langfuse_public_key": agent_data.get("langfuse_public_key"),
-                            "langfuse_secret_key": lf_secret_key,
-                            "langfuse_host": agent_data.get("langfuse_host"),
-                            "langfuse_project_id": agent_data.get("langfuse_project_id")
-                        }
-                        
-                        # Update metadata with target_config (merge if exists)
-                        current_target = req.metadata.get("target_config", {})
-                        req.metadata["target_config"] = {**target_config, **current_target}
-                        req.metadata["agent_name"] = agent_data.get("name")
-                        
-                    else:
-                        print(f"Failed to fetch agent {agent_id}: {resp.status_code}")
-            except Exception as e:
-                print(f"Error fetching agent: {e}")
+            apply_agent_config(req, await fetch_agent_target_config(agent_id))
 
         # Fetch Scenario Details from Resource Service
-        import httpx
-        scenario_data = None
-        if req.scenario_id:
-            print(f"DEBUG: Handling scenario_id: {req.scenario_id}", flush=True)
-            try:
-                import urllib.request
-                import json
-                url = f"http://resource-service:8000/resource/scenarios/{req.scenario_id}"
-                print(f"Fetching Scenario (urllib) from: {url}", flush=True)
-                with urllib.request.urlopen(url) as response:
-                    if response.status == 200:
-                        data = response.read()
-                        scenario_data = json.loads(data)
-                        print(f"Loaded Scenario: {scenario_data.get('name')}", flush=True)
-                    else:
-                        print(f"Failed to load scenario {req.scenario_id}: {response.status}", flush=True)
-            except Exception as e:
-                print(f"Error fetching scenario (urllib): {e}", flush=True)
-        else:
-            print("DEBUG: req.scenario_id is missing or empty!", flush=True)
-
-        # Init Graph dynamically based on scenario data
-        app = build_dynamic_graph(scenario_data)
+        scenario_data = await fetch_scenario(req.scenario_id)
 
-        # Initialize Checkpointer (Create indices)
-        if hasattr(app, 'checkpointer') and app.checkpointer:
-            print("Running checkpointer setup...")
-            await app.checkpointer.asetup()
-            print("Checkpointer setup complete.")
-        
-        # Checkpointer configuration
-        config = {
-            "configurable": {
-                "thread_id": campaign_id,
-                "checkpoint_ns": "" 
-            }
-        }
-        
-        if not config.get("callbacks"):
-            config["callbacks"] = []
-        # config["callbacks"].append(langfuse_handler)
-
-        # Initial State
-        # Count expectations for score normalization
-        exp_count = 0
-        if scenario_data and "nodes" in scenario_data:
-            for n in scenario_data["nodes"]:
-                n_type = (n.get("data", {}).get("category") or n.get("type", "")).lower()
-                if n_type == "expectation":
-                    exp_count += 1
-        
-        if exp_count == 0: exp_count = 1 # Avoid division by zero
-        
-        initial_state = {
-            "campaign_id": campaign_id,
-            "scenario_id": req.scenario_id,
-            "messages": [], # Annotated[operator.add] will append new messages
-            "status": "running",
-            "raw_score_sum": 0.0, # Counter for normalization
-            "current_score": 0.0, # Scaled score [0-10] for display
-            "metrics": {}, # Annotated[merge_metrics] will merge metrics
-            "metadata": {
-                **req.metadata,
-                "scenario_name": req.scenario_name,
-                "agent_id": req.agent_id,
-                "language": req.language
-            },
-            "error": None,
-            "retry_count": 0,
-            "_condition_result": "false",
-            "expectations_count": exp_count
-        }
-        
-        # Invoke Graph (Async)
-        print(f"Starting background execution for {campaign_id} (ainvoke)...")
-        try:
-            await app.ainvoke(initial_state, config=config)
-            print(f"Finished background execution for {campaign_id}")
-        except Exception as inv_err:
-             print(f"Error during ainvoke for {campaign_id}: {inv_err}")
-             import traceback
-             traceback.print_exc()
+        await execute_campaign(campaign_id, req, scenario_data)
         
+    except ExpressionError as e:
+        # Scenario không compile được (vd: condition expression sai) -> fail sớm, không chạy graph
+        logger.warning("Invalid scenario for %s: %s", campaign_id, e)
+        await update_campaign_status(campaign_id, "failed", metrics={"error": str(e)})
+        await event_stream.publish(campaign_id, "error", {"error": str(e)})
     except Exception as e:
-        print(f"Graph Execution Error for {campaign_id}: {e}")
-        # In a robust system, we should save this error state to Redis manually here
+        logger.error("Graph execution error for %s: %s", campaign_id, e)
+        await update_campaign_status(campaign_id, "failed", metrics={"error": str(e)})
 
-@router.post("/campaigns", response_model=CampaignResponse)
-async def create_campaign(
-    req: CreateCampaignRequest, 
-    background_tasks: BackgroundTasks,
-    workspace_id: str = Header(None),
-    db: AsyncSession = Depends(get_db)
-):
+async def run_campaign_job(job: dict):
+    await run_campaign_background(job["campaign_id"], CreateCampaignRequest(**job["payload"]))
+
+campaign_scheduler.register("campaign", run_campaign_job)
+
+async def resume_campaign(campaign_id: str):
     """
-    Khởi tạo một Campaign mới (Async Background) với Quota Limit Check.
+    Resume campaign từ checkpoint: campaign bị gián đoạn (Orchestrator restart) không còn job gốc
+    trong scheduler, hoặc timer của Wait Node đã đến hạn.
+    Request ban đầu được dựng lại từ state trong checkpoint.
     """
-    # 0. Check Quota / Rate Limit before proceeding
-    await check_workspace_quota(workspace_id)
+    set_campaign_id(campaign_id)
+    checkpoint = await get_checkpointer().aget_tuple({"configurable": {"thread_id": campaign_id, "checkpoint_ns": ""}})
+    values = checkpoint.checkpoint.get("channel_values", {}) if checkpoint else {}
+    if not values.get("scenario_id"):
+        logger.warning("No checkpoint to resume for %s", campaign_id)
+        await update_campaign_status(campaign_id, "failed", metrics={"error": "Interrupted before first checkpoint"})
+        return
 
-    campaign_id = str(uuid.uuid4())
-    
+    metadata = values.get("metadata") or {}
+    req = CreateCampaignRequest(
+        scenario_id=values["scenario_id"],
+        scenario_name=metadata.get("scenario_name") or "Untitled",
+        agent_id=metadata.get("agent_id"),
+        language=metadata.get("language") or "en",
+        metadata=metadata
+    )
+    try:
+        final_state = await execute_campaign(campaign_id, req, await fetch_scenario(req.scenario_id))
+        if metadata.get("batch_id"):
+            await record_batch_result(metadata["batch_id"], campaign_id, req.agent_id, metadata.get("repetition"), final_state)
+            # Batch đã chạy xong phần của nó và đang chờ các campaign dừng ở Wait Node
+            if await resources.redis_client.hget(batch_key(metadata["batch_id"]), "status") == "waiting":
+                await refresh_batch_status(metadata["batch_id"])
+    except ExpressionError as e:
+        logger.warning("Invalid scenario for %s: %s", campaign_id, e)
+        await update_campaign_status(campaign_id, "failed", metrics={"error": str(e)})
+        await event_stream.publish(campaign_id, "error", {"error": str(e)})
+
+async def resume_campaign_job(job: dict):
+    await resume_campaign(job["campaign_id"])
+
+campaign_scheduler.register(RECOVERY_JOB_KIND, resume_campaign_job)
+
+async def register_campaign(db: AsyncSession, campaign_id: str, req: CreateCampaignRequest,
+                            extra_meta: Dict[str, Any] = None, workspace_id: str = None):
+    """
+    Lưu campaign (queued) vào Postgres và campaign index (Redis) để hiển thị.
+    """
     # 1. Save to Postgres via Repository
     try:
         repo = CampaignRepository(db)
@@ -232,10 +329,9 @@ async def create_campaign(
             "created_by": req.metadata.get("created_by", {})
         })
     except Exception as e:
-        print(f"DB Error (Non-blocking): {e}")
+        logger.error("DB error (non-blocking): %s", e)
 
-    # 2. Save metadata to Redis List for listing
-    redis = get_redis_client()
+    # 2. Save summary to the campaign index for listing
     meta = {
         "id": campaign_id,
         "scenario_id": req.scenario_id,
@@ -243,16 +339,31 @@ async def create_campaign(
         "agent_id": req.agent_id,
         "created_at": datetime.now().isoformat(),
         "status": "queued",
-        "created_by": req.metadata.get("created_by") # Store executor info
+        "created_by": req.metadata.get("created_by"), # Store executor info
+        **(extra_meta or {})
     }
-    # LPUSH adds to the head of the list (newest first)
-    await redis.lpush("campaigns:list", json.dumps(meta))
-    
+    await campaign_index.register(meta, workspace_id=workspace_id)
+
     # Backup metadata for direct access and fallback
-    await redis.set(f"campaign:{campaign_id}:meta", json.dumps(meta))
+    await resources.redis_client.set(f"campaign:{campaign_id}:meta", json.dumps(meta))
+
+@router.post("/campaigns", response_model=CampaignResponse)
+async def create_campaign(
+    req: CreateCampaignRequest, 
+    workspace_id: str = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Khởi tạo một Campaign mới (Async Background) với Quota Limit Check.
+    """
+    # 0. Check Quota / Rate Limit before proceeding
+    await check_workspace_quota(workspace_id)
+
+    campaign_id = str(uuid.uuid4())
+    await register_campaign(db, campaign_id, req, workspace_id=workspace_id)
     
-    # Trigger background execution
-    background_tasks.add_task(run_campaign_background, campaign_id, req)
+    # Enqueue for the Campaign Scheduler (durable, admission controlled)
+    await campaign_scheduler.enqueue("campaign", campaign_id, req.model_dump(), workspace_id=workspace_id, priority=req.priority)
 
     return {
         "campaign_id": campaign_id,
@@ -261,43 +372,311 @@ async def create_campaign(
         "messages": []
     }
 
+# --- Batch (Fan-out) Endpoints ---
+
+# Mỗi campaign của batch là một job riêng của scheduler
+BATCH_RUN_JOB_KIND = "batch_run"
+
+def batch_key(batch_id: str) -> str:
+    return f"batch:{batch_id}"
+
+async def record_batch_result(batch_id: str, campaign_id: str, agent_id: str, repetition: int,
+                              final_state: Optional[Dict[str, Any]]):
+    final_state = final_state or {}
+    result = {
+        "agent_id": agent_id,
+        "repetition": repetition,
+        # Campaign dừng ở Wait Node: kết quả được ghi lại khi resume xong
+        "status": "waiting" if wait_deadline(final_state) is not None else final_state.get("status") or "failed",
+        "score": final_state.get("current_score")
+    }
+    await resources.redis_client.hset(f"{batch_key(batch_id)}:results", campaign_id, json.dumps(result))
+
+def derive_batch_status(runs: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Trạng thái batch từ kết quả từng campaign: running khi còn campaign chưa chạy xong, waiting khi
+    các campaign còn lại dừng ở Wait Node, completed / failed khi tất cả cùng trạng thái, partial khi lẫn lộn.
+    """
+    statuses = [results.get(run["campaign_id"], {}).get("status") for run in runs]
+    if any(status is None for status in statuses):
+        return "running"
+    if any(status == "waiting" for status in statuses):
+        return "waiting"
+    if all(status == "completed" for status in statuses):
+        return "completed"
+    if any(status == "completed" for status in statuses):
+        return "partial"
+    return "failed"
+
+async def refresh_batch_status(batch_id: str) -> str:
+    redis = resources.redis_client
+    runs = json.loads(await redis.hget(batch_key(batch_id), "runs") or "[]")
+    raw_results = await redis.hgetall(f"{batch_key(batch_id)}:results")
+    status = derive_batch_status(runs, {cid: json.loads(raw) for cid, raw in raw_results.items()})
+    await redis.hset(batch_key(batch_id), "status", status)
+    return status
+
+async def run_campaign_batch(batch_id: str, req: CreateBatchRequest, runs: List[Dict[str, Any]],
+                             workspace_id: Optional[str] = None, priority: int = 0):
+    """
+    Chuẩn bị một batch (scenario trên nhiều agent / nhiều lần lặp): scenario và agent config chỉ fetch một lần,
+    graph compile một lần, lưu vào batch hash cho các lane dùng chung.
+    Mỗi campaign chạy như một job riêng của scheduler (một slot mỗi campaign, chịu giới hạn workspace / global);
+    `req.concurrency` lane chạy song song: lane k chạy lần lượt campaign k, k + lanes, k + 2 * lanes...
+    """
+    redis = resources.redis_client
+    scenario_data = await fetch_scenario(req.scenario_id)
+    try:
+        build_dynamic_graph(scenario_data) # Warm the compiled-graph cache once
+    except ExpressionError as e:
+        logger.warning("Invalid scenario for batch %s: %s", batch_id, e)
+        await redis.hset(batch_key(batch_id), mapping={"status": "failed", "error": str(e)})
+        for run in runs:
+            await update_campaign_status(run["campaign_id"], "failed", metrics={"error": str(e)})
+        return
+
+    agent_infos = {}
+    for agent_id in dict.fromkeys(req.agent_ids):
+        agent_infos[agent_id] = await fetch_agent_target_config(agent_id)
+
+    await redis.hset(batch_key(batch_id), mapping={
+        "status": "running",
+        "request": req.model_dump_json(),
+        "scenario": json.dumps(scenario_data),
+        "agents": json.dumps(agent_infos),
+    })
+
+    lanes = min(req.concurrency, len(runs))
+    for index in range(lanes):
+        await enqueue_batch_run(batch_id, runs, index, lanes, workspace_id, priority)
+    logger.info("Batch %s prepared (%d campaigns, %d lanes)", batch_id, len(runs), lanes)
+
+async def enqueue_batch_run(batch_id: str, runs: List[Dict[str, Any]], index: int, lanes: int,
+                            workspace_id: Optional[str], priority: int):
+    # Job mang campaign_id của run: recovery thấy campaign đang có job, không resume trùng
+    await campaign_scheduler.enqueue(
+        BATCH_RUN_JOB_KIND, runs[index]["campaign_id"], {"batch_id": batch_id, "index": index, "lanes": lanes},
+        workspace_id=workspace_id, priority=priority
+    )
+
+async def run_batch_lane(batch_id: str, index: int, lanes: int, workspace_id: Optional[str] = None, priority: int = 0):
+    """
+    Chạy campaign thứ `index` của batch rồi đưa campaign `index + lanes` của lane vào scheduler
+    (nhả slot giữa các campaign). Job bị requeue sau restart chạy lại đúng campaign đó, tiếp tục từ checkpoint.
+    """
+    redis = resources.redis_client
+    runs_json, req_json, scenario_json, agents_json = await redis.hmget(
+        batch_key(batch_id), ["runs", "request", "scenario", "agents"]
+    )
+    runs = json.loads(runs_json or "[]")
+    if index >= len(runs):
+        return
+    run = runs[index]
+    req = CreateBatchRequest.model_validate_json(req_json)
+    scenario_data = json.loads(scenario_json or "null")
+    agent_infos = json.loads(agents_json or "{}")
+
+    campaign_req = CreateCampaignRequest(
+        scenario_id=req.scenario_id,
+        scenario_name=req.scenario_name,
+        agent_id=run["agent_id"],
+        language=req.language,
+        metadata={
+            **copy.deepcopy(req.metadata),
+            "batch_id": batch_id,
+            "repetition": run["repetition"]
+        }
+    )
+    apply_agent_config(campaign_req, agent_infos.get(run["agent_id"]))
+
+    try:
+        final_state = await execute_campaign(run["campaign_id"], campaign_req, scenario_data)
+    except Exception as e:
+        logger.exception("Batch %s: campaign %s failed: %s", batch_id, run["campaign_id"], e)
+        await update_campaign_status(run["campaign_id"], "failed", metrics={"error": str(e)})
+        final_state = {"status": "failed"}
+    try:
+        await record_batch_result(batch_id, run["campaign_id"], run["agent_id"], run["repetition"], final_state)
+        status = await refresh_batch_status(batch_id)
+        if status != "running":
+            logger.info("Batch %s finished (status=%s)", batch_id, status)
+    finally:
+        if index + lanes < len(runs):
+            await enqueue_batch_run(batch_id, runs, index + lanes, lanes, workspace_id, priority)
+
+async def run_batch_job(job: dict):
+    payload = job["payload"]
+    await run_campaign_batch(job["campaign_id"], CreateBatchRequest(**payload["request"]), payload["runs"],
+                             workspace_id=job.get("workspace_id"), priority=job.get("priority", 0))
+
+async def run_batch_lane_job(job: dict):
+    payload = job["payload"]
+    await run_batch_lane(payload["batch_id"], payload["index"], payload["lanes"],
+                         workspace_id=job.get("workspace_id"), priority=job.get("priority", 0))
+
+campaign_scheduler.register("batch", run_batch_job)
+campaign_scheduler.register(BATCH_RUN_JOB_KIND, run_batch_lane_job)
+
+@router.post("/campaigns/batch")
+async def create_campaign_batch(
+    req: CreateBatchRequest,
+    workspace_id: str = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Chạy một Scenario trên N agents x R lần lặp (fan-out) với concurrency giới hạn.
+    """
+    if not req.agent_ids:
+        raise HTTPException(status_code=400, detail="agent_ids must not be empty")
+
+    runs_count = len(req.agent_ids) * req.repetitions
+    await check_workspace_quota(workspace_id, runs=runs_count)
+
+    batch_id = str(uuid.uuid4())
+    runs = []
+    for agent_id in req.agent_ids:
+        for repetition in range(req.repetitions):
+            campaign_id = str(uuid.uuid4())
+            runs.append({"campaign_id": campaign_id, "agent_id": agent_id, "repetition": repetition})
+            await register_campaign(
+                db,
+                campaign_id,
+                CreateCampaignRequest(
+                    scenario_id=req.scenario_id,
+                    scenario_name=req.scenario_name,
+                    agent_id=agent_id,
+                    language=req.language,
+                    metadata={**req.metadata, "batch_id": batch_id, "repetition": repetition}
+                ),
+                extra_meta={"batch_id": batch_id},
+                workspace_id=workspace_id
+            )
+
+    await resources.redis_client.hset(batch_key(batch_id), mapping={
+        "status": "queued",
+        "scenario_id": req.scenario_id,
+        "scenario_name": req.scenario_name or "Untitled",
+        "total": len(runs),
+        "created_at": datetime.now().isoformat(),
+        "runs": json.dumps(runs)
+    })
+
+    await campaign_scheduler.enqueue(
+        "batch", batch_id, {"request": req.model_dump(), "runs": runs},
+        workspace_id=workspace_id, priority=req.priority
+    )
+
+    return {
+        "batch_id": batch_id,
+        "status": "queued",
+        "total": len(runs),
+        "campaign_ids": [run["campaign_id"] for run in runs]
+    }
+
+def summarize_batch_results(runs: List[Dict[str, Any]], results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Tổng hợp điểm theo agent (mean/stdev trên các lần lặp đã hoàn thành).
+    """
+    per_agent: Dict[str, Dict[str, Any]] = {}
+    for run in runs:
+        agent = per_agent.setdefault(run["agent_id"], {"runs": 0, "completed": 0, "failed": 0, "scores": []})
+        agent["runs"] += 1
+        result = results.get(run["campaign_id"])
+        if not result:
+            continue
+        if result.get("status") == "completed" and result.get("score") is not None:
+            agent["completed"] += 1
+            agent["scores"].append(float(result["score"]))
+        else:
+            agent["failed"] += 1
+
+    for agent in per_agent.values():
+        scores = agent.pop("scores")
+        agent["mean_score"] = round(statistics.mean(scores), 4) if scores else None
+        agent["stdev_score"] = round(statistics.stdev(scores), 4) if len(scores) > 1 else (0.0 if scores else None)
+    return per_agent
+
+@router.get("/campaigns/batch/{batch_id}")
+async def get_campaign_batch(batch_id: str):
+    """
+    Tiến độ tổng hợp và kết quả (mean/stdev theo agent) của một batch.
+    """
+    redis = resources.redis_client
+    meta = await redis.hgetall(batch_key(batch_id))
+    if not meta:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    runs = json.loads(meta.get("runs", "[]"))
+    raw_results = await redis.hgetall(f"{batch_key(batch_id)}:results")
+    results = {cid: json.loads(raw) for cid, raw in raw_results.items()}
+
+    total = int(meta.get("total", len(runs)))
+    return {
+        "batch_id": batch_id,
+        "status": meta.get("status"),
+        "error": meta.get("error"),
+        "scenario_id": meta.get("scenario_id"),
+        "scenario_name": meta.get("scenario_name"),
+        "created_at": meta.get("created_at"),
+        "progress": {
+            "total": total,
+            "finished": len(results),
+            "percent": int(len(results) / total * 100) if total else 0
+        },
+        "agents": summarize_batch_results(runs, results),
+        "campaigns": [{**run, **results.get(run["campaign_id"], {"status": "pending"})} for run in runs]
+    }
+
+@router.get("/scheduler/stats")
+async def get_scheduler_stats():
+    """
+    Thống kê hàng đợi Campaign (queued/running theo workspace).
+    """
+    return await campaign_scheduler.stats()
+
+@router.get("/code-executor/stats")
+async def get_code_executor_stats():
+    """
+    Metrics của Code Node executor (queue time, exec time, timeouts).
+    """
+    return code_executor.stats()
+
+@router.get("/kafka/producer/stats")
+async def get_kafka_producer_stats():
+    """
+    Metrics của Kafka producer (record size, queue time, số record mỗi batch).
+    """
+    return kafka_producer.stats()
+
+@router.get("/node-memo/stats")
+async def get_node_memo_stats():
+    """
+    Metrics của node-result memoization (hit rate, số entry lưu / bị evict).
+    """
+    return node_memo.stats()
+
+@router.get("/node-dispatch/stats")
+async def get_node_dispatch_stats():
+    """
+    Metrics gọi worker: số lần thử / retry / hedge (và số lần hedge thắng), timeout, latency p50/p95.
+    """
+    return node_dispatcher.stats()
+
 @router.get("/campaigns")
-async def list_campaigns(limit: int = 20, offset: int = 0):
-    redis = get_redis_client()
-    # Redis List: 0 is start, -1 is end
-    items = await redis.lrange("campaigns:list", offset, offset + limit - 1)
-    
-    # Enrich with live status from Checkpointer
-    # This allows us to see real-time status and score in the list view
-    app = build_dynamic_graph()
-    
-    result = []
-    for item in items:
-        try:
-            meta = json.loads(item)
-            campaign_id = meta.get("id")
-            
-            # Query checkpointer for latest state
-            config = {"configurable": {"thread_id": campaign_id}}
-            state_snapshot = await app.aget_state(config)
-            
-            if state_snapshot.values:
-                current_values = state_snapshot.values
-                # Override/Enrich meta
-                meta["status"] = current_values.get("status", meta.get("status", "unknown"))
-                meta["current_score"] = current_values.get("current_score", 0.0)
-                # Add updated_at from state snapshot timestamp
-                if state_snapshot.created_at:
-                    meta["updated_at"] = state_snapshot.created_at
-                # Can add more summary fields here
-        except Exception as e:
-            # Fallback to stored meta if checkpointer query fails
-            print(f"Failed to fetch live state for {meta.get('id')}: {e}")
-            pass
-            
-        result.append(meta)
-        
-    return result
+async def list_campaigns(
+    response: Response,
+    limit: int = 20,
+    offset: int = 0,
+    status: Optional[str] = None,
+    workspace_id: str = Header(None)
+):
+    """
+    Danh sách campaign (mới nhất trước) đọc từ campaign index: một round trip Redis,
+    không query checkpointer cho từng campaign. Status/score được node handlers cập nhật.
+    """
+    total, items = await campaign_index.list(workspace_id=workspace_id, status=status, offset=offset, limit=limit)
+    response.headers["X-Total-Count"] = str(total)
+    return items
 
 @router.get("/campaigns/{id}")
 async def get_campaign(id: str):
@@ -306,6 +685,37 @@ async def get_campaign(id: str):
     """
     return await get_campaign_state(id)
 
+@router.get("/campaigns/{id}/events")
+async def stream_campaign_events(id: str, request: Request, last_event_id: Optional[int] = Header(None)):
+    """
+    Server-Sent Events: node_start/node_end/message/score/status/end của campaign.
+    Reconnect với header Last-Event-ID để chỉ nhận event còn thiếu.
+    """
+    async def event_source():
+        async for event in event_stream.subscribe(id, last_event_id=last_event_id):
+            if await request.is_disconnected():
+                break
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/campaigns/{id}/ws")
+async def campaign_events_ws(websocket: WebSocket, id: str, last_event_id: Optional[int] = None):
+    """
+    WebSocket: cùng luồng event như /campaigns/{id}/events.
+    """
+    await websocket.accept()
+    try:
+        async for event in event_stream.subscribe(id, last_event_id=last_event_id):
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 @router.get("/campaigns/{id}/state")
 async def get_campaign_state(id: str):
     """
@@ -373,7 +783,7 @@ async def get_campaign_state(id: str):
              "values": response_values
         }
     except Exception as e:
-         print(f"Error fetching state for {id}: {e}")
+         logger.error("Error fetching state for %s: %s", id, e)
          
          # Robust Fallback: Try to fetch metadata from Redis if Checkpointer failed
          try:
@@ -396,57 +806,34 @@ async def get_campaign_state(id: str):
                      }
                  }
          except Exception as fallback_err:
-             print(f"Fallback failed: {fallback_err}")
+             logger.error("Fallback failed: %s", fallback_err)
              
          return {"status": "error", "msg": str(e)}
 
 # --- Red Teaming Endpoints ---
 
-from app.services.red_teaming_workflow import build_red_teaming_graph
+from app.services.red_teaming_workflow import build_red_teaming_graph, is_parallel
 
 async def run_red_teaming_background(campaign_id: str, req: CreateCampaignRequest):
-    print(f"DEBUG: run_red_teaming_background started for {campaign_id}", flush=True)
+    set_campaign_id(campaign_id)
+    logger.debug("run_red_teaming_background started")
     try:
         # Fetch Agent Data if agent_id is present
         agent_id = req.agent_id or req.metadata.get("agent_id")
         target_config = {}
         if agent_id:
-            try:
-                import httpx
-                from app.core.security import decrypt_value
-                
-                url = f"http://resource-service:8000/resource/agents/{agent_id}"
-                print(f"DEBUG: Fetching Agent for RT from: {url}")
-                
-                async with httpx.AsyncClient() as client:
-                    resp = await client.get(url, timeout=10)
-                    if resp.status_code == 200:
-                        agent_data = resp.json()
-                        print(f"DEBUG: Loaded Agent for RT: {agent_data.get('name')}")
-                        
-                        api_key = decrypt_value(agent_data.get("api_key_encrypted"))
-                        lf_secret_key = decrypt_value(agent_data.get("langfuse_secret_key_encrypted"))
-                        target_config = {
-                            "api_key": api_key,
-                            "base_url": agent_data.get("endpoint_url"),
-                            "model": agent_data.get("meta_data", {}).get("model"),
-                            "provider": agent_data.get("meta_data", {}).get("provider", "DeepSeek"),
-                            "langfuse_public_key": agent_data.get("langfuse_public_key"),
-                            "langfuse_secret_key": lf_secret_key,
-                            "langfuse_host": agent_data.get("langfuse_host"),
-                            "langfuse_project_id": agent_data.get("langfuse_project_id")
-                        }
-                    else:
-                        print(f"WARNING: Failed to fetch agent {agent_id}: {resp.status_code}")
-            except Exception as e:
-                print(f"ERROR fetching agent for RT: {e}")
+            agent_info = await fetch_agent_target_config(agent_id)
+            if agent_info:
+                target_config = agent_info["target_config"]
+            else:
+                logger.warning("Failed to fetch agent %s for RT", agent_id)
 
         # --- RESTORE GRAPH INIT ---
-        from app.services.red_teaming_workflow import build_red_teaming_graph
-        app = build_red_teaming_graph()
+        # Chế độ song song (metadata["parallel"]): probe chạy theo wave, mỗi wave `concurrency` probe
+        app = build_red_teaming_graph(is_parallel(req.metadata))
         
         if hasattr(app, 'checkpointer') and app.checkpointer:
-            await app.checkpointer.asetup()
+            await ensure_checkpointer_setup(app.checkpointer)
             
         config = {
             "configurable": {
@@ -471,6 +858,7 @@ async def run_red_teaming_background(campaign_id: str, req: CreateCampaignReques
             "low_count": 0,
             "messages": [],
             "logs": [],
+            "reported_logs": 0,
             "metadata": {
                 **req.metadata,
                 "strategy": req.metadata.get("strategy", "jailbreak"),
@@ -479,19 +867,26 @@ async def run_red_teaming_background(campaign_id: str, req: CreateCampaignReques
             }
         }
         
-        print(f"Invoking Red Teaming Graph for {campaign_id}...")
-        await app.ainvoke(initial_state, config=config)
-        print(f"Finished Red Teaming Graph for {campaign_id}")
+        logger.info("Invoking red teaming graph for %s", campaign_id)
+        graph_input, final_state = await resume_point(app, config, initial_state)
+        if final_state is not None:
+            logger.info("Red teaming %s already finished, skipping re-execution", campaign_id)
+            return
+        final_state = await event_stream.run_graph(app, graph_input, config, campaign_id)
+        logger.info("Finished red teaming graph for %s", campaign_id)
+        await apply_retention(campaign_id, final_state, kind="red_teaming")
         
     except Exception as e:
-        print(f"Red Teaming Graph Execution Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Red teaming graph execution error: %s", e)
+
+async def run_red_teaming_job(job: dict):
+    await run_red_teaming_background(job["campaign_id"], CreateCampaignRequest(**job["payload"]))
+
+campaign_scheduler.register("red_teaming", run_red_teaming_job)
 
 @router.post("/red-teaming", response_model=CampaignResponse)
 async def create_red_teaming_campaign(
     req: CreateCampaignRequest,
-    background_tasks: BackgroundTasks,
     workspace_id: str = Header(None)
 ):
     """
@@ -506,8 +901,8 @@ async def create_red_teaming_campaign(
     # sau đó gọi Orchestrator để trigger.
     campaign_id = req.metadata.get("campaign_id") or str(uuid.uuid4())
     
-    # Trigger background
-    background_tasks.add_task(run_red_teaming_background, campaign_id, req)
+    # Enqueue for the Campaign Scheduler
+    await campaign_scheduler.enqueue("red_teaming", campaign_id, req.model_dump(), workspace_id=workspace_id, priority=req.priority)
     
     return {
         "campaign_id": campaign_id,
@@ -520,38 +915,32 @@ async def list_red_teaming_campaigns(page: int = 1, size: int = 20):
     """
     Proxy request lấy danh sách lịch sử Red Teaming và làm giàu tên Agent.
     """
-    import httpx
-    async with httpx.AsyncClient() as client:
-        try:
-            # 1. Lấy danh sách campaigns
-            url_campaigns = f"http://resource-service:8000/resource/red-teaming/campaigns?page={page}&size={size}"
-            resp_campaigns = await client.get(url_campaigns, timeout=10)
-            data = resp_campaigns.json() if resp_campaigns.status_code == 200 else {"items": []}
-            
-            # 2. Lấy danh sách agents để map tên
-            url_agents = "http://resource-service:8000/resource/agents"
-            resp_agents = await client.get(url_agents, timeout=10)
-            
-            # Parse agents response - có thể là list hoặc dict
-            agents_data = resp_agents.json() if resp_agents.status_code == 200 else []
-            
-            # Xử lý cả trường hợp list và dict
-            if isinstance(agents_data, list):
-                agents = agents_data
-            elif isinstance(agents_data, dict) and "items" in agents_data:
-                agents = agents_data["items"]
-            else:
-                agents = []
-            
-            agent_map = {a["id"]: a["name"] for a in agents if isinstance(a, dict)}
+    client = get_http_client()
+    try:
+        # 1. Lấy danh sách campaigns và 2. danh sách agents (song song) để map tên
+        url_campaigns = f"http://resource-service:8000/resource/red-teaming/campaigns?page={page}&size={size}"
+        url_agents = "http://resource-service:8000/resource/agents"
+        resp_campaigns, resp_agents = await asyncio.gather(client.get(url_campaigns), client.get(url_agents))
+        data = resp_campaigns.json() if resp_campaigns.status_code == 200 else {"items": []}
+        
+        # Parse agents response - có thể là list hoặc dict
+        agents_data = resp_agents.json() if resp_agents.status_code == 200 else []
+        
+        # Xử lý cả trường hợp list và dict
+        if isinstance(agents_data, list):
+            agents = agents_data
+        elif isinstance(agents_data, dict) and "items" in agents_data:
+            agents = agents_data["items"]
+        else:
+            agents = []
+        
+        agent_map = {a["id"]: a["name"] for a in agents if isinstance(a, dict)}
+        
+        # 3. Enrich
+        for item in data.get("items", []):
+            item["agent_name"] = agent_map.get(item.get("agent_id"), "Unknown Agent")
             
-            # 3. Enrich
-            for item in data.get("items", []):
-                item["agent_name"] = agent_map.get(item.get("agent_id"), "Unknown Agent")
-                
-            return data
-        except Exception as e:
-            print(f"Error proxying enriched RT campaigns: {e}")
-            import traceback
-            traceback.print_exc()
-            return {"items": [], "total": 0, "page": page, "size": size, "pages": 0}
+        return data
+    except Exception as e:
+        logger.exception("Error proxying enriched RT campaigns: %s", e)
+        return {"items": [], "total": 0, "page": page, "size": size, "pages": 0}
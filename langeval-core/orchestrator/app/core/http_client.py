@@ -0,0 +1,67 @@
+import os
+import logging
+from typing import Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Profiles: mỗi upstream một client (pool riêng) => giới hạn kết nối theo host.
+# Mọi giá trị có thể override qua env, vd: HTTP_RESOURCE_MAX_CONNECTIONS=200, HTTP_EXTERNAL_TIMEOUT=60
+HTTP_PROFILES: Dict[str, Dict[str, float]] = {
+    # Resource Service (agents, models, scenarios, results)
+    "resource": {"timeout": 10, "max_connections": 100, "max_keepalive": 20},
+    # Billing Service (quota)
+    "billing": {"timeout": 5, "max_connections": 20, "max_keepalive": 5},
+    # Tool nodes, OpenAI... (host tùy ý)
+    "external": {"timeout": 30, "max_connections": 100, "max_keepalive": 20},
+}
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Chỉ retry lỗi kết nối (an toàn cho cả POST), không retry response lỗi
+CONNECT_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+def _setting(profile: str, name: str) -> float:
+    default = HTTP_PROFILES[profile][name]
+    return float(os.getenv(f"HTTP_{profile.upper()}_{name.upper()}", default))
+
+def _create_client(profile: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=int(_setting(profile, "max_connections")),
+        max_keepalive_connections=int(_setting(profile, "max_keepalive")),
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(_setting(profile, "timeout"), connect=CONNECT_TIMEOUT),
+        limits=limits,
+        transport=httpx.AsyncHTTPTransport(retries=CONNECT_RETRIES, limits=limits),
+    )
+
+def get_http_client(profile: str = "resource") -> httpx.AsyncClient:
+    """
+    Trả về client dùng chung (keep-alive, connection pool) cho profile.
+    Không dùng `async with` trên client này: vòng đời do app lifespan quản lý.
+    """
+    if profile not in HTTP_PROFILES:
+        raise ValueError(f"Unknown HTTP client profile: {profile}")
+    client = _clients.get(profile)
+    if client is None or client.is_closed:
+        # Tạo lazy nếu được gọi ngoài lifespan (script, worker test...)
+        client = _clients[profile] = _create_client(profile)
+    return client
+
+async def init_http_clients():
+    for profile in HTTP_PROFILES:
+        get_http_client(profile)
+    logger.info("HTTP clients initialized: %s", ', '.join(_clients))
+
+async def close_http_clients():
+    for profile, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error("Error closing HTTP client '%s': %s", profile, e)
+    _clients.clear()
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Set, Tuple
+
+from aiokafka.codec import has_gzip, has_lz4, has_snappy, has_zstd
+
+import app.core.resources as resources
+from app.core import wire
+
+logger = logging.getLogger(__name__)
+
+# Producer Config from Environment
+# lz4: nén nhanh, tỉ lệ tốt cho JSON; "none" để tắt
+KAFKA_COMPRESSION_TYPE = os.getenv("KAFKA_COMPRESSION_TYPE", "lz4").lower()
+# Chờ tối đa linger_ms để gom nhiều record vào một batch (một round trip broker)
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "10"))
+KAFKA_MAX_BATCH_SIZE = int(os.getenv("KAFKA_MAX_BATCH_SIZE", str(256 * 1024)))
+KAFKA_MAX_REQUEST_SIZE = int(os.getenv("KAFKA_MAX_REQUEST_SIZE", str(1024 * 1024)))
+
+_CODECS = {"gzip": has_gzip, "lz4": has_lz4, "zstd": has_zstd, "snappy": has_snappy}
+
+@lru_cache(maxsize=None)
+def resolve_compression(requested: str = KAFKA_COMPRESSION_TYPE) -> Optional[str]:
+    """
+    Codec thực sự dùng được: thiếu thư viện (cramjam) thì tắt nén thay vì lỗi lúc khởi động.
+    """
+    if requested in ("", "none"):
+        return None
+    check = _CODECS.get(requested)
+    if check is None:
+        raise ValueError(f"Unknown Kafka compression type: {requested}")
+    if not check():
+        logger.warning("Kafka compression '%s' is not available (install aiokafka[%s]), sending uncompressed", requested, requested)
+        return None
+    return requested
+
+def producer_options() -> Dict[str, Any]:
+    """
+    Tham số cho AIOKafkaProducer (batching + compression).
+    """
+    return {
+        "compression_type": resolve_compression(),
+        "linger_ms": KAFKA_LINGER_MS,
+        "max_batch_size": KAFKA_MAX_BATCH_SIZE,
+        "max_request_size": max(KAFKA_MAX_REQUEST_SIZE, KAFKA_MAX_BATCH_SIZE),
+    }
+
+class KafkaProducer:
+    """
+    Lớp mỏng trên AIOKafkaProducer dùng chung (resources.producer).
+    - send(): fire-and-track, trả về delivery future ngay khi record vào batch (không chờ broker).
+    - send_and_wait(): giữ ngữ nghĩa cũ cho node cần chắc chắn đã gửi.
+    - Metrics: record size, queue time (send -> broker ack), số record mỗi batch.
+    """
+
+    def __init__(self):
+        self._metrics = {
+            "sent": 0, "delivered": 0, "failed": 0, "in_flight": 0,
+            "bytes_total": 0, "record_bytes_max": 0,
+            "queue_ms_total": 0.0, "queue_ms_max": 0.0,
+            "batches": 0, "batch_records_max": 0,
+        }
+        # Record của cùng một batch được ack trong cùng một lượt event loop
+        self._burst: Dict[Tuple[str, int], int] = {}
+        self._burst_scheduled = False
+
+    async def send(self, topic: str, value: Any, key: Optional[bytes] = None,
+                   partition: Optional[int] = None) -> asyncio.Future:
+        """
+        Đưa record vào batch của producer, trả về future RecordMetadata (ack của broker).
+        Chỉ chờ khi buffer của producer đầy. `value` được encode theo wire format (msgpack/JSON).
+        """
+        data, headers = wire.encode(value)
+        m = self._metrics
+        m["sent"] += 1
+        m["in_flight"] += 1
+        m["bytes_total"] += len(data)
+        m["record_bytes_max"] = max(m["record_bytes_max"], len(data))
+        started = time.monotonic()
+        try:
+            extra = {"partition": partition} if partition is not None else {}
+            future = await resources.producer.send(topic, data, key=key, headers=headers, **extra)
+        except Exception:
+            m["in_flight"] -= 1
+            m["failed"] += 1
+            raise
+        future.add_done_callback(lambda f: self._on_delivery(f, started))
+        return future
+
+    async def send_and_wait(self, topic: str, value: Any, key: Optional[bytes] = None,
+                            partition: Optional[int] = None):
+        future = await self.send(topic, value, key=key, partition=partition)
+        return await future
+
+    async def partitions_for(self, topic: str) -> Set[int]:
+        if not resources.producer:
+            return set()
+        return await resources.producer.partitions_for(topic)
+
+    async def flush(self):
+        if resources.producer:
+            await resources.producer.flush()
+
+    def _on_delivery(self, future: asyncio.Future, started: float):
+        m = self._metrics
+        m["in_flight"] -= 1
+        if future.cancelled() or future.exception() is not None:
+            m["failed"] += 1
+            return
+        m["delivered"] += 1
+        queue_ms = (time.monotonic() - started) * 1000
+        m["queue_ms_total"] += queue_ms
+        m["queue_ms_max"] = max(m["queue_ms_max"], queue_ms)
+
+        metadata = future.result()
+        if metadata is not None:
+            tp = (metadata.topic, metadata.partition)
+            self._burst[tp] = self._burst.get(tp, 0) + 1
+            if not self._burst_scheduled:
+                self._burst_scheduled = True
+                asyncio.get_running_loop().call_soon(self._close_burst)
+
+    def _close_burst(self):
+        m = self._metrics
+        for records in self._burst.values():
+            m["batches"] += 1
+            m["batch_records_max"] = max(m["batch_records_max"], records)
+        self._burst.clear()
+        self._burst_scheduled = False
+
+    def stats(self) -> Dict[str, Any]:
+        m = self._metrics
+        delivered = max(1, m["delivered"])
+        return {
+            **m,
+            "record_bytes_avg": m["bytes_total"] / max(1, m["sent"]),
+            "queue_ms_avg": m["queue_ms_total"] / delivered,
+            "batch_records_avg": m["delivered"] / max(1, m["batches"]),
+            "config": {
+                "compression_type": resolve_compression() or "none",
+                "linger_ms": KAFKA_LINGER_MS,
+                "max_batch_size": KAFKA_MAX_BATCH_SIZE,
+                "content_type": wire.content_type(),
+            },
+        }
+
+kafka_producer = KafkaProducer()
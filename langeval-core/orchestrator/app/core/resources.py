@@ -2,6 +2,10 @@ from aiokafka import AIOKafkaProducer
 from redis.asyncio import Redis
 import os
 import asyncio
+import logging
+from app.core.http_client import init_http_clients, close_http_clients
+
+logger = logging.getLogger(__name__)
 
 producer: AIOKafkaProducer = None
 redis_client: Redis = None
@@ -9,15 +13,18 @@ redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
 kafka_bootstrap = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:29092")
 
 async def wait_for_kafka(bootstrap_servers, retries=10, delay=2):
+    from app.core.kafka_producer import producer_options
+    options = producer_options()
     for i in range(retries):
         try:
-            print(f"Attempting to connect to Kafka ({bootstrap_servers}) - Attempt {i+1}/{retries}...")
-            producer = AIOKafkaProducer(bootstrap_servers=bootstrap_servers)
+            logger.info("Attempting to connect to Kafka (%s) - Attempt %d/%d...", bootstrap_servers, i + 1, retries)
+            producer = AIOKafkaProducer(bootstrap_servers=bootstrap_servers, **options)
             await producer.start()
-            print("Successfully connected to Kafka.")
+            logger.info("Successfully connected to Kafka (compression=%s, linger_ms=%s).",
+                        options["compression_type"], options["linger_ms"])
             return producer
         except Exception as e:
-            print(f"Failed to connect to Kafka: {e}")
+            logger.error("Failed to connect to Kafka: %s", e)
             if i < retries - 1:
                 await asyncio.sleep(delay)
                 delay = min(delay * 2, 30)  # Exponential backoff, cap at 30s
@@ -26,14 +33,16 @@ async def wait_for_kafka(bootstrap_servers, retries=10, delay=2):
 
 async def init_resources():
     global producer, redis_client
-    print(f"Initializing Resources... Kafka={kafka_bootstrap}, Redis={redis_url}")
+    logger.info("Initializing Resources... Kafka=%s, Redis=%s", kafka_bootstrap, redis_url)
     
     # Retry logic for Kafka
     producer = await wait_for_kafka(kafka_bootstrap)
     
     redis_client = Redis.from_url(redis_url, decode_responses=True)
+    await init_http_clients()
 
 async def close_resources():
     global producer, redis_client
     if producer: await producer.stop()
     if redis_client: await redis_client.close()
+    await close_http_clients()
@@ -1,7 +1,11 @@
 
 import os
+import logging
+from functools import lru_cache
 from cryptography.fernet import Fernet
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = os.getenv("ENCRYPTION_KEY")
 cipher_suite = Fernet(SECRET_KEY.encode()) if SECRET_KEY else None
 
@@ -12,9 +16,14 @@ def decrypt_value(encrypted_value: str) -> str:
     """
     if not encrypted_value or not cipher_suite:
         return encrypted_value
+    return _decrypt_cached(encrypted_value)
+
+@lru_cache(maxsize=int(os.getenv("SECRET_CACHE_SIZE", "1024")))
+def _decrypt_cached(encrypted_value: str) -> str:
+    # Key theo ciphertext: secret đổi thì ciphertext đổi, entry cũ tự bị đẩy ra (LRU)
     try:
         decrypted_bytes = cipher_suite.decrypt(encrypted_value.encode())
         return decrypted_bytes.decode()
     except Exception as e:
-        print(f"Decryption failed: {e}")
+        logger.warning("Decryption failed: %s", e)
         return encrypted_value
@@ -22,3 +22,11 @@ class Campaign(Base):
     metadata_info = Column(JSON, default={}) # Renamed to avoid reserved word conflict if any
     metrics = Column(JSON, default={})
     created_by = Column(JSON, default={}) 
+
+class CampaignStateArchive(Base):
+    __tablename__ = "campaign_state_archive"
+
+    campaign_id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False, default="campaign") # campaign | red_teaming | battle
+    final_state = Column(JSON, default={})
+    archived_at = Column(DateTime, default=datetime.utcnow)
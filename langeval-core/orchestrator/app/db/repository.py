@@ -1,8 +1,9 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.db.models import Campaign
+from app.db.models import Campaign, CampaignStateArchive
 import json
+from datetime import datetime
 
 class CampaignRepository:
     def __init__(self, session: AsyncSession):
@@ -32,3 +33,12 @@ class CampaignRepository:
             await self.session.commit()
             await self.session.refresh(campaign)
         return campaign
+
+    async def archive_state(self, campaign_id: str, kind: str, final_state: dict) -> CampaignStateArchive:
+        archive = CampaignStateArchive(
+            campaign_id=campaign_id, kind=kind, final_state=final_state, archived_at=datetime.utcnow()
+        )
+        # merge: chạy lại campaign (resume) thì ghi đè bản archive cũ
+        archive = await self.session.merge(archive)
+        await self.session.commit()
+        return archive
@@ -2,11 +2,35 @@ from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from app.api.routes import campaigns, battle, benchmarks
 from app.core.resources import init_resources, close_resources
+from app.services.result_dispatcher import result_dispatcher
+from app.services.campaign_scheduler import campaign_scheduler
+from app.services.config_cache import config_cache
+from app.services.code_executor import code_executor
+from app.services.event_stream import event_stream
+from app.services.campaign_recovery import campaign_recovery
+from app.services.durable_timers import durable_timers
+from app.core.log import setup_logging
+
+setup_logging("orchestrator")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_resources()
+    await result_dispatcher.start()
+    await config_cache.start()
+    await code_executor.start()
+    await event_stream.start()
+    await campaign_scheduler.start()
+    await campaign_recovery.start()
+    await durable_timers.start()
     yield
+    await durable_timers.stop()
+    await campaign_recovery.stop()
+    await campaign_scheduler.stop()
+    await event_stream.stop()
+    await code_executor.stop()
+    await config_cache.stop()
+    await result_dispatcher.stop()
     await close_resources()
 
 app = FastAPI(
@@ -1,7 +1,7 @@
 import operator
 from typing import Annotated, TypedDict, List, Dict, Any, Literal, Optional
 from langchain_core.messages import BaseMessage
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 def merge_metrics(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
     res = left.copy()
@@ -63,6 +63,8 @@ class RedTeamingState(TypedDict):
     # Dữ liệu hội thoại và logs (tích lũy)
     messages: Annotated[List[Any], operator.add]
     logs: Annotated[List[Dict[str, Any]], operator.add]
+    # Số log đã gửi về Resource Service (progress chỉ gửi phần mới)
+    reported_logs: int
     
     metadata: Dict[str, Any]
     metrics: Annotated[Dict[str, float], merge_metrics]
@@ -73,6 +75,7 @@ class CreateCampaignRequest(BaseModel):
     scenario_name: Optional[str] = "Untitled"
     agent_id: Optional[str] = None
     language: str = "en"
+    priority: int = 0 # 0 (thấp) .. 10 (cao), dùng bởi Campaign Scheduler
     metadata: Dict[str, Any] = {}
 
     model_config = {
@@ -87,6 +90,33 @@ class CreateCampaignRequest(BaseModel):
         }
     }
 
+# Giới hạn fan-out của một batch (mỗi campaign vẫn chiếm một slot scheduler, chịu giới hạn workspace / global)
+BATCH_MAX_REPETITIONS = 100
+BATCH_MAX_CONCURRENCY = 50
+
+class CreateBatchRequest(BaseModel):
+    scenario_id: str
+    scenario_name: Optional[str] = "Untitled"
+    agent_ids: List[str]
+    repetitions: int = Field(1, ge=1, le=BATCH_MAX_REPETITIONS) # Số lần lặp cho mỗi agent
+    concurrency: int = Field(5, ge=1, le=BATCH_MAX_CONCURRENCY) # Số lane (campaign đồng thời) tối đa của batch
+    language: str = "en"
+    priority: int = 0
+    metadata: Dict[str, Any] = {}
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "scenario_id": "scen-123",
+                "scenario_name": "Login Flow Test",
+                "agent_ids": ["agent-1", "agent-2"],
+                "repetitions": 3,
+                "concurrency": 4,
+                "language": "en"
+            }
+        }
+    }
+
 class CampaignResponse(BaseModel):
     campaign_id: str
     status: str
@@ -157,6 +187,7 @@ class CreateBattleRequest(BaseModel):
     scenario_id: Optional[str] = None
     language: str = "en"
     max_turns: int = 10
+    priority: int = 0
     metadata: Dict[str, Any] = {}
 
     model_config = {
@@ -171,3 +202,26 @@ class CreateBattleRequest(BaseModel):
             }
         }
     }
+
+class CreateTournamentRequest(BaseModel):
+    tournament_id: str
+    agent_ids: List[str]
+    prompts: List[str]
+    format: str = "round_robin" # "round_robin" hoặc "swiss"
+    rounds: Optional[int] = None # swiss: số vòng (mặc định ceil(log2(N)))
+    concurrency: Optional[int] = None # số lời gọi worker đồng thời tối đa
+    language: str = "en"
+    priority: int = 0
+    metadata: Dict[str, Any] = {}
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "tournament_id": "tournament-xyz",
+                "agent_ids": ["agent-1", "agent-2", "agent-3", "agent-4"],
+                "prompts": ["Tôi muốn đổi trả đơn hàng", "How do I reset my password?"],
+                "format": "swiss",
+                "rounds": 3
+            }
+        }
+    }
@@ -1,14 +1,18 @@
 from langgraph.graph import StateGraph, END
 from typing import Annotated, Dict, Any, List, Optional
 import asyncio
+from functools import lru_cache
 import json
 import logging
 
 from app.models.schemas import BattleArenaState
 import app.core.resources as resources
+from app.core import wire
 from app.services.checkpointer import get_checkpointer
 from app.services.workflow import SIMULATION_TOPIC, EVALUATION_TOPIC
 from app.services.resource_client import update_battle_data, add_battle_turn
+from app.services.node_dispatch import dispatch_and_wait, resolve_policy, result_key
+from app.services.history_store import history_store
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +20,7 @@ logger = logging.getLogger(__name__)
 
 async def node_battle_start(state: BattleArenaState):
     campaign_id = state['campaign_id']
-    logger.info(f"--- BATTLE ARENA START (ADVERSARIAL): {campaign_id} ---")
+    logger.info("--- BATTLE ARENA START (ADVERSARIAL): %s ---", campaign_id)
     await update_battle_data(campaign_id, {"status": "running"})
     return {"status": "running"}
 
@@ -37,19 +41,20 @@ async def node_simulator_turn(state: BattleArenaState):
         "node_id": "battle_sim",
         "simulator_id": simulator_id,
         "instruction": instruction,
-        "history": history
+        **await history_store.payload_fields(campaign_id, history)
     }
-    await resources.producer.send_and_wait(SIMULATION_TOPIC, json.dumps(payload).encode('utf-8'))
-    
-    result_raw = await resources.redis_client.blpop(f"campaign:{campaign_id}:node:battle_sim:result", timeout=60)
+    result_raw = await dispatch_and_wait(
+        SIMULATION_TOPIC, payload, result_key(campaign_id, "battle_sim"),
+        resolve_policy("battle", state.get("metadata", {}))
+    )
     if not result_raw:
         return {"user_message": "Timeout Sim", "status": "failed", "error": "Simulator Timeout"}
     
-    result_data = json.loads(result_raw[1])
+    result_data = wire.loads(result_raw)
     user_msg = result_data.get("new_messages", [])[-1].get("content", "")
     
     if result_data.get("status") == "error":
-        logger.error(f"Simulator error for campaign {campaign_id}: {user_msg}")
+        logger.error("Simulator error for campaign %s: %s", campaign_id, user_msg)
         return {"user_message": user_msg, "status": "failed", "error": user_msg}
     
     return {"user_message": user_msg}
@@ -66,7 +71,7 @@ async def node_agent_turn(state: BattleArenaState):
     # Nếu có ghi đè ở lượt đầu tiên (lượt 0 trong state hiện tại)
     current_turn = state.get("current_turn", 0)
     if current_turn == 0 and override:
-        logger.info(f"Using response override for campaign {campaign_id}")
+        logger.info("Using response override for campaign %s", campaign_id)
         return {"agent_response": override}
     
     payload = {
@@ -74,19 +79,20 @@ async def node_agent_turn(state: BattleArenaState):
         "node_id": "battle_agent",
         "agent_id": agent_id,
         "instruction": user_msg,
-        "history": history
+        **await history_store.payload_fields(campaign_id, history)
     }
-    await resources.producer.send_and_wait(SIMULATION_TOPIC, json.dumps(payload).encode('utf-8'))
-    
-    result_raw = await resources.redis_client.blpop(f"campaign:{campaign_id}:node:battle_agent:result", timeout=60)
+    result_raw = await dispatch_and_wait(
+        SIMULATION_TOPIC, payload, result_key(campaign_id, "battle_agent"),
+        resolve_policy("battle", state.get("metadata", {}))
+    )
     if not result_raw:
         return {"agent_response": "Timeout Agent", "status": "failed", "error": "Agent Timeout"}
     
-    result_data = json.loads(result_raw[1])
+    result_data = wire.loads(result_raw)
     agent_resp = result_data.get("new_messages", [])[-1].get("content", "")
     
     if result_data.get("status") == "error":
-        logger.error(f"Agent simulation error for campaign {campaign_id}: {agent_resp}")
+        logger.error("Agent simulation error for campaign %s: %s", campaign_id, agent_resp)
         return {"agent_response": agent_resp, "status": "failed", "error": agent_resp}
     
     return {"agent_response": agent_resp}
@@ -107,11 +113,12 @@ async def node_judge_turn(state: BattleArenaState):
         ],
         "metrics_config": [{"id": "quality"}]
     }
-    await resources.producer.send_and_wait(EVALUATION_TOPIC, json.dumps(payload).encode('utf-8'))
-    
-    result_raw = await resources.redis_client.blpop(f"campaign:{campaign_id}:node:battle_judge:result", timeout=60)
-    score = json.loads(result_raw[1]).get("total_score", 0) if result_raw else 0
-    reason = json.loads(result_raw[1]).get("reason", "Timeout") if result_raw else "Timeout"
+    result_raw = await dispatch_and_wait(
+        EVALUATION_TOPIC, payload, result_key(campaign_id, "battle_judge"),
+        resolve_policy("battle", state.get("metadata", {}))
+    )
+    score = wire.loads(result_raw).get("total_score", 0) if result_raw else 0
+    reason = wire.loads(result_raw).get("reason", "Timeout") if result_raw else "Timeout"
     
     return {"score_sum": score, "turn_score": score, "judge_reasoning": reason}
 
@@ -150,6 +157,7 @@ async def node_battle_end(state: BattleArenaState):
     await update_battle_data(state['campaign_id'], {"status": status})
     return {"status": status}
 
+@lru_cache(maxsize=1)
 def build_adversarial_graph():
     workflow = StateGraph(BattleArenaState)
     workflow.add_node("start", node_battle_start)
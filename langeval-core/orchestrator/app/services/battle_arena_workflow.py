@@ -1,70 +1,98 @@
 from langgraph.graph import StateGraph, END
 from typing import Annotated, Dict, Any, List, Optional
 import asyncio
+from functools import lru_cache
 import json
 import operator
 import logging
+import os
 
 from app.models.schemas import BattleArenaState
 import app.core.resources as resources
+from app.core import wire
 from app.services.checkpointer import get_checkpointer
 from app.services.workflow import SIMULATION_TOPIC, EVALUATION_TOPIC
 from app.services.resource_client import update_battle_data, add_battle_turn
+from app.services.node_dispatch import dispatch_and_wait, resolve_policy, result_key
 
 logger = logging.getLogger(__name__)
 
+# Pipelined comparison: sinh câu trả lời lượt sau trong lúc judge lượt hiện tại.
+# metadata["pipelined"], metadata["lookahead"], metadata["pipeline_wave"] ghi đè env.
+BATTLE_PIPELINED = os.getenv("BATTLE_PIPELINED", "false").lower() == "true"
+BATTLE_LOOKAHEAD = int(os.getenv("BATTLE_LOOKAHEAD", "1"))
+# Số lượt mỗi node wave (mỗi wave là một checkpoint)
+BATTLE_PIPELINE_WAVE = int(os.getenv("BATTLE_PIPELINE_WAVE", "8"))
+
+def is_pipelined(metadata: Dict[str, Any]) -> bool:
+    return bool(metadata.get("pipelined", BATTLE_PIPELINED))
+
+def pipeline_lookahead(metadata: Dict[str, Any]) -> int:
+    value = metadata.get("lookahead")
+    return max(0, int(value if value is not None else BATTLE_LOOKAHEAD))
+
+def pipeline_wave_size(metadata: Dict[str, Any]) -> int:
+    return max(1, int(metadata.get("pipeline_wave") or BATTLE_PIPELINE_WAVE))
+
+def _turn_node_id(node_id: str, turn: Optional[int]) -> str:
+    # Các lượt chạy chồng nhau cần result key riêng
+    return node_id if turn is None else f"{node_id}_t{turn}"
+
+def turn_id(campaign_id: str, turn_number: int) -> str:
+    # Id xác định: lượt được gửi lại (wave chạy lại sau restart) không tạo bản ghi trùng ở Resource Service
+    return f"{campaign_id}:turn:{turn_number}"
+
+def _turn_input(metadata: Dict[str, Any]) -> str:
+    # Ưu tiên lấy từ metadata (instruction_injection) hoặc default; không phụ thuộc kết quả judge
+    return metadata.get("instruction_injection") or "Hãy giải thích về AI bằng tiếng Việt đơn giản."
+
 # --- Comparison Mode Nodes (Bot A vs Bot B) ---
 
 async def node_battle_start(state: BattleArenaState):
     campaign_id = state['campaign_id']
-    logger.info(f"--- BATTLE ARENA START (COMPARISON): {campaign_id} ---")
+    logger.info("--- BATTLE ARENA START (COMPARISON): %s ---", campaign_id)
     await update_battle_data(campaign_id, {"status": "running"})
     return {"status": "running"}
 
 async def node_get_input(state: BattleArenaState):
     """Lấy input của người dùng hoặc kịch bản cho lượt này."""
     campaign_id = state['campaign_id']
-    metadata = state.get("metadata", {})
-    # Ưu tiên lấy từ metadata (instruction_injection) hoặc default
-    user_input = metadata.get("instruction_injection") or "Hãy giải thích về AI bằng tiếng Việt đơn giản."
-    
-    logger.info(f"--- BATTLE TURN INPUT (Campaign: {campaign_id}): {user_input[:50]}... ---")
+    user_input = _turn_input(state.get("metadata", {}))
+
+    logger.info("--- BATTLE TURN INPUT (Campaign: %s): %s... ---", campaign_id, user_input[:50])
     return {"user_message": user_input}
 
-async def node_fork_simulation(state: BattleArenaState):
+async def node_fork_simulation(state: BattleArenaState, turn: Optional[int] = None):
     """Gửi yêu cầu song song tới Bot A và Bot B."""
     campaign_id = state['campaign_id']
     agent_a_id = state['agent_a_id']
     agent_b_id = state['agent_b_id']
     user_msg = state['user_message']
     metadata = state.get("metadata", {})
+    node_a, node_b = _turn_node_id("agent_a", turn), _turn_node_id("agent_b", turn)
     injection = metadata.get("instruction_injection", "")
 
-    logger.info(f"Forking simulation for A({agent_a_id}) and B({agent_b_id})")
+    logger.info("Forking simulation for A(%s) and B(%s)", agent_a_id, agent_b_id)
     
     instruction = user_msg
     if injection:
         instruction = f"{user_msg}\n\nAdditional Instruction: {injection}"
     
-    payload_a = {"campaign_id": campaign_id, "node_id": "agent_a", "agent_id": agent_a_id, "instruction": instruction}
-    payload_b = {"campaign_id": campaign_id, "node_id": "agent_b", "agent_id": agent_b_id, "instruction": instruction}
-    
-    await asyncio.gather(
-        resources.producer.send_and_wait(SIMULATION_TOPIC, json.dumps(payload_a).encode('utf-8')),
-        resources.producer.send_and_wait(SIMULATION_TOPIC, json.dumps(payload_b).encode('utf-8'))
-    )
+    payload_a = {"campaign_id": campaign_id, "node_id": node_a, "agent_id": agent_a_id, "instruction": instruction}
+    payload_b = {"campaign_id": campaign_id, "node_id": node_b, "agent_id": agent_b_id, "instruction": instruction}
     
-    # Đợi kết quả từ Redis
+    # Gửi song song (hai record vẫn vào cùng batch của producer) và đợi kết quả từ Redis
+    policy = resolve_policy("battle", metadata)
     results = await asyncio.gather(
-        resources.redis_client.blpop(f"campaign:{campaign_id}:node:agent_a:result", timeout=60),
-        resources.redis_client.blpop(f"campaign:{campaign_id}:node:agent_b:result", timeout=60)
+        dispatch_and_wait(SIMULATION_TOPIC, payload_a, result_key(campaign_id, node_a), policy),
+        dispatch_and_wait(SIMULATION_TOPIC, payload_b, result_key(campaign_id, node_b), policy)
     )
     
     if not results[0] or not results[1]:
         return {"agent_a_response": "Timeout", "agent_b_response": "Timeout", "status": "failed", "error": "Agent Timeout"}
     
-    data_a = json.loads(results[0][1])
-    data_b = json.loads(results[1][1])
+    data_a = wire.loads(results[0])
+    data_b = wire.loads(results[1])
     
     resp_a = data_a.get("new_messages", [])[-1].get("content", "")
     resp_b = data_b.get("new_messages", [])[-1].get("content", "")
@@ -72,33 +100,35 @@ async def node_fork_simulation(state: BattleArenaState):
     # Check for errors
     if data_a.get("status") == "error" or data_b.get("status") == "error":
         err_msg = data_a.get("new_messages", [])[-1].get("content", "") if data_a.get("status") == "error" else data_b.get("new_messages", [])[-1].get("content", "")
-        logger.error(f"Agent simulation error in comparison mode for campaign {campaign_id}: {err_msg}")
+        logger.error("Agent simulation error in comparison mode for campaign %s: %s", campaign_id, err_msg)
         return {"agent_a_response": resp_a, "agent_b_response": resp_b, "status": "failed", "error": err_msg}
     
     return {"agent_a_response": resp_a, "agent_b_response": resp_b}
 
-async def node_judge_turn(state: BattleArenaState):
+async def node_judge_turn(state: BattleArenaState, turn: Optional[int] = None):
     """Gọi AI Judge để chấm điểm xem A hay B thắng."""
     if state.get("status") == "failed":
         return {"agent_a_wins": 0, "agent_b_wins": 0, "ties": 0, "judge_reasoning": state.get("error", "Agent failed")}
     
     campaign_id = state['campaign_id']
+    node_id = _turn_node_id("battle_judge", turn)
     
     payload = {
         "campaign_id": campaign_id,
-        "node_id": "battle_judge",
+        "node_id": node_id,
         "user_input": state['user_message'],
         "response_a": state['agent_a_response'],
         "response_b": state['agent_b_response']
     }
     
-    await resources.producer.send_and_wait(EVALUATION_TOPIC, json.dumps(payload).encode('utf-8'))
-    
-    result_raw = await resources.redis_client.blpop(f"campaign:{campaign_id}:node:battle_judge:result", timeout=60)
+    result_raw = await dispatch_and_wait(
+        EVALUATION_TOPIC, payload, result_key(campaign_id, node_id),
+        resolve_policy("battle", state.get("metadata", {}))
+    )
     if not result_raw:
         return {"error": "Judge Timeout"}
         
-    res = json.loads(result_raw[1])
+    res = wire.loads(result_raw)
     winner = res.get("winner", "tie")
     
     updates = {"agent_a_wins": 0, "agent_b_wins": 0, "ties": 0}
@@ -112,6 +142,7 @@ async def node_battle_progress(state: BattleArenaState):
     """Lưu dữ liệu lượt đấu vào DB."""
     current_turn = state.get("current_turn", 0) + 1
     turn_data = {
+        "id": turn_id(state['campaign_id'], current_turn),
         "campaign_id": state['campaign_id'],
         "turn_number": current_turn,
         "user_message": state['user_message'],
@@ -124,6 +155,68 @@ async def node_battle_progress(state: BattleArenaState):
     await add_battle_turn(turn_data)
     return {"current_turn": 1}
 
+def _turn_winner(verdict: Dict[str, Any]) -> str:
+    if verdict.get("agent_a_wins"):
+        return "agent_a"
+    if verdict.get("agent_b_wins"):
+        return "agent_b"
+    return "tie"
+
+async def node_pipeline_wave(state: BattleArenaState):
+    """
+    Chạy một wave lượt đấu dạng pipeline: input của comparison không phụ thuộc verdict, nên câu trả lời
+    của tối đa `lookahead` lượt sau được sinh trong lúc judge lượt hiện tại. Judge và lưu lượt vẫn theo thứ tự.
+    """
+    campaign_id = state['campaign_id']
+    metadata = state.get("metadata", {})
+    first = state.get("current_turn", 0)
+    last = min(state['max_turns'], first + pipeline_wave_size(metadata))
+    lookahead = pipeline_lookahead(metadata)
+    user_msg = _turn_input(metadata)
+    turn_state = {**state, "user_message": user_msg}
+
+    generations: Dict[int, asyncio.Task] = {}
+
+    def launch(turn: int):
+        if turn < last and turn not in generations:
+            generations[turn] = asyncio.ensure_future(node_fork_simulation(turn_state, turn))
+
+    for turn in range(first, min(last, first + lookahead + 1)):
+        launch(turn)
+
+    totals = {"agent_a_wins": 0, "agent_b_wins": 0, "ties": 0}
+    update: Dict[str, Any] = {}
+    done = 0
+    try:
+        for turn in range(first, last):
+            generated = await generations.pop(turn)
+            verdict = await node_judge_turn({**turn_state, **generated}, turn)
+            # Lượt tiếp theo bắt đầu sinh ngay khi một chỗ trong cửa sổ look-ahead trống
+            launch(turn + lookahead + 1)
+            for key in totals:
+                totals[key] += verdict.get(key, 0)
+            await add_battle_turn({
+                "id": turn_id(campaign_id, turn + 1),
+                "campaign_id": campaign_id,
+                "turn_number": turn + 1,
+                "user_message": user_msg,
+                "agent_a_response": generated.get("agent_a_response"),
+                "agent_b_response": generated.get("agent_b_response"),
+                "winner": _turn_winner(verdict),
+                "confidence": 0.9,
+                "judge_reasoning": verdict.get("judge_reasoning")
+            })
+            done += 1
+            update = {**generated, "judge_reasoning": verdict.get("judge_reasoning")}
+            if generated.get("status") == "failed":
+                break
+    finally:
+        for task in generations.values():
+            task.cancel()
+
+    logger.info("Battle %s: pipelined turns %d-%d done (lookahead=%d)", campaign_id, first + 1, first + done, lookahead)
+    return {**update, **totals, "user_message": user_msg, "current_turn": done}
+
 def should_continue(state: BattleArenaState):
     if state.get('status') == "failed":
         return "end"
@@ -136,8 +229,19 @@ async def node_battle_end(state: BattleArenaState):
     await update_battle_data(state['campaign_id'], {"status": status})
     return {"status": status}
 
-def build_comparison_graph():
+@lru_cache(maxsize=2)
+def build_comparison_graph(pipelined: bool = False):
     workflow = StateGraph(BattleArenaState)
+    if pipelined:
+        workflow.add_node("start", node_battle_start)
+        workflow.add_node("wave", node_pipeline_wave)
+        workflow.add_node("end", node_battle_end)
+        workflow.set_entry_point("start")
+        workflow.add_edge("start", "wave")
+        workflow.add_conditional_edges("wave", should_continue, {"continue": "wave", "end": "end"})
+        workflow.add_edge("end", END)
+        return workflow.compile(checkpointer=get_checkpointer())
+
     workflow.add_node("start", node_battle_start)
     workflow.add_node("get_input", node_get_input)
     workflow.add_node("fork_simulation", node_fork_simulation)
@@ -2,11 +2,14 @@ import json
 import random
 import asyncio
 import os
-import httpx
+import logging
+from app.core.http_client import get_http_client
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from uuid import uuid4
 
+logger = logging.getLogger(__name__)
+
 class BenchmarkService:
     def __init__(self):
         self.resource_service_url = os.getenv("RESOURCE_SERVICE_URL", "http://resource-service:8000")
@@ -55,29 +58,29 @@ class BenchmarkService:
         """
         url = f"{self.resource_service_url}/resource/benchmarks"
         try:
-            async with httpx.AsyncClient() as client:
-                # Transform data to match BenchmarkResultCreate schema
-                payload = {
-                    "benchmark_id": result_data["benchmark_id"],
-                    "model_id": result_data["model_id"],
-                    "score": result_data["score"],
-                    "total_items": result_data["total_items"],
-                    "correct_items": result_data["correct_items"],
-                    "details": result_data["results"],
-                    "status": "completed",
-                    "meta_data": {
-                        "run_id": result_data["run_id"],
-                        "completed_at": result_data["completed_at"]
-                    }
+            client = get_http_client()
+            # Transform data to match BenchmarkResultCreate schema
+            payload = {
+                "benchmark_id": result_data["benchmark_id"],
+                "model_id": result_data["model_id"],
+                "score": result_data["score"],
+                "total_items": result_data["total_items"],
+                "correct_items": result_data["correct_items"],
+                "details": result_data["results"],
+                "status": "completed",
+                "meta_data": {
+                    "run_id": result_data["run_id"],
+                    "completed_at": result_data["completed_at"]
                 }
-                print(f"Saving benchmark result to {url}...", flush=True)
-                resp = await client.post(url, json=payload, timeout=10)
-                if resp.status_code == 200:
-                    print("Benchmark result saved successfully.", flush=True)
-                else:
-                    print(f"Failed to save benchmark result: {resp.status_code} - {resp.text}", flush=True)
+            }
+            logger.info("Saving benchmark result to %s...", url)
+            resp = await client.post(url, json=payload)
+            if resp.status_code == 200:
+                logger.info("Benchmark result saved successfully.")
+            else:
+                logger.error("Failed to save benchmark result: %s - %s", resp.status_code, resp.text)
         except Exception as e:
-            print(f"Error saving benchmark result: {e}", flush=True)
+            logger.error("Error saving benchmark result: %s", e)
 
     async def generate_questions(self, topic: str, count: int = 5, generator_model_id: str = "gpt-4o") -> List[Dict[str, Any]]:
         """
@@ -85,10 +88,10 @@ class BenchmarkService:
         """
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
-            print("OPENAI_API_KEY not found. Using static samples.", flush=True)
+            logger.warning("OPENAI_API_KEY not found. Using static samples.")
             return self.mmlu_samples[:count]
 
-        print(f"Generating {count} questions for topic '{topic}' using OpenAI...", flush=True)
+        logger.info("Generating %d questions for topic '%s' using OpenAI...", count, topic)
         
         prompt = f"""
         Generate {count} multiple-choice questions about "{topic}" in the style of the MMLU benchmark.
@@ -107,55 +110,54 @@ class BenchmarkService:
         """
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={
-                        "model": generator_model_id,
-                        "messages": [
-                            {"role": "system", "content": "You are a helpful assistant that generates benchmark questions in JSON format."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": 0.7,
-                        "response_format": { "type": "json_object" }
-                    },
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                
-                # Parse JSON
-                try:
-                    # Handle potential wrapping in "questions" key or raw list
-                    parsed = json.loads(content)
-                    if isinstance(parsed, dict) and "questions" in parsed:
-                        questions = parsed["questions"]
-                    elif isinstance(parsed, list):
-                        questions = parsed
-                    else:
-                        # Fallback if json_object mode returns something else
-                        # Try to find list in values?
-                        questions = next((v for v in parsed.values() if isinstance(v, list)), self.mmlu_samples[:count])
-                        
-                    # Validate structure
-                    items = []
-                    for i, q in enumerate(questions):
-                        items.append({
-                            "id": f"gen_{topic}_{i}_{str(uuid4())[:8]}",
-                            "question": q.get("question", "Unknown Question"),
-                            "options": q.get("options", []),
-                            "answer": q.get("answer", "A").replace(")", "").strip(), # Clean answer A) -> A
-                            "explanation": q.get("explanation", "")
-                        })
-                    return items
-                except json.JSONDecodeError:
-                    print(f"Failed to parse JSON from OpenAI: {content}", flush=True)
-                    return self.mmlu_samples[:count]
+            client = get_http_client("external")
+            response = await client.post(
+                "https://api.openai.com/v1/chat/completions",
+                headers={"Authorization": f"Bearer {api_key}"},
+                json={
+                    "model": generator_model_id,
+                    "messages": [
+                        {"role": "system", "content": "You are a helpful assistant that generates benchmark questions in JSON format."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": 0.7,
+                    "response_format": { "type": "json_object" }
+                }
+            )
+            response.raise_for_status()
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+            
+            # Parse JSON
+            try:
+                # Handle potential wrapping in "questions" key or raw list
+                parsed = json.loads(content)
+                if isinstance(parsed, dict) and "questions" in parsed:
+                    questions = parsed["questions"]
+                elif isinstance(parsed, list):
+                    questions = parsed
+                else:
+                    # Fallback if json_object mode returns something else
+                    # Try to find list in values?
+                    questions = next((v for v in parsed.values() if isinstance(v, list)), self.mmlu_samples[:count])
                     
+                # Validate structure
+                items = []
+                for i, q in enumerate(questions):
+                    items.append({
+                        "id": f"gen_{topic}_{i}_{str(uuid4())[:8]}",
+                        "question": q.get("question", "Unknown Question"),
+                        "options": q.get("options", []),
+                        "answer": q.get("answer", "A").replace(")", "").strip(), # Clean answer A) -> A
+                        "explanation": q.get("explanation", "")
+                    })
+                return items
+            except json.JSONDecodeError:
+                logger.error("Failed to parse JSON from OpenAI: %s", content)
+                return self.mmlu_samples[:count]
+                
         except Exception as e:
-            print(f"Error generating questions: {e}", flush=True)
+            logger.error("Error generating questions: %s", e)
             return self.mmlu_samples[:count]
 
     async def run_benchmark(self, benchmark_id: str, model_id: str = None, agent_id: str = None, generator_model_id: str = "gpt-4o", openai_key: str = None) -> Dict[str, Any]:
@@ -179,7 +181,7 @@ class BenchmarkService:
                 # For MVP, we assume Agent has a linked model_id or we use a default
                 target_model_id = agent_config.get("model_id")
                 if not target_model_id:
-                     print(f"Warning: Agent {agent_id} has no model_id. Using default.", flush=True)
+                     logger.warning("Agent %s has no model_id. Using default.", agent_id)
 
         if not target_model_id and not agent_id:
              return {"error": "Must provide either model_id or agent_id"}
@@ -188,7 +190,8 @@ class BenchmarkService:
         items = await self.generate_questions(topic=benchmark_id, count=5, generator_model_id=generator_model_id)
         total_items = len(items)
 
-        print(f"Starting benchmark {benchmark_id} for {subject_name} (Model: {target_model_id}) with {total_items} items...", flush=True)
+        logger.info("Starting benchmark %s for %s (Model: %s) with %d items...",
+                    benchmark_id, subject_name, target_model_id, total_items)
 
         # Simulate processing time and model response
         for item in items:
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import app.core.resources as resources
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = os.getenv("CAMPAIGN_INDEX_PREFIX", "campaigns:index:")
+ALL_SCOPE = "_all"
+DEFAULT_WORKSPACE = "default"
+LEGACY_LIST_KEY = "campaigns:list"
+LEGACY_BACKFILL_LOCK_SECONDS = int(os.getenv("CAMPAIGN_INDEX_BACKFILL_LOCK_SECONDS", "300"))
+
+# Field lưu dạng JSON trong summary hash
+_JSON_FIELDS = ("created_by",)
+_FLOAT_FIELDS = ("current_score",)
+
+# Redis layout:
+#   campaign:{id}:summary                      HASH  summary hiển thị ở list view
+#   campaigns:index:{scope}                    ZSET  id -> created_ts (scope = _all | workspace)
+#   campaigns:index:{scope}:status:{status}    ZSET  id -> created_ts
+
+# Cập nhật summary + chuyển campaign giữa các status index (atomic)
+UPDATE_SCRIPT = """
+local hkey = KEYS[1]
+local id = ARGV[1]
+local prefix = ARGV[2]
+local all_scope = ARGV[3]
+local new_status = ARGV[4]
+if redis.call('EXISTS', hkey) == 0 then
+    return 0
+end
+for i = 5, #ARGV, 2 do
+    redis.call('HSET', hkey, ARGV[i], ARGV[i + 1])
+end
+if new_status ~= '' then
+    local old_status = redis.call('HGET', hkey, 'status')
+    if old_status ~= new_status then
+        local ws = redis.call('HGET', hkey, 'workspace_id')
+        local created = redis.call('HGET', hkey, 'created_ts')
+        redis.call('HSET', hkey, 'status', new_status)
+        for _, scope in ipairs({all_scope, ws}) do
+            if old_status then
+                redis.call('ZREM', prefix .. scope .. ':status:' .. old_status, id)
+            end
+            redis.call('ZADD', prefix .. scope .. ':status:' .. new_status, created, id)
+        end
+    end
+end
+return 1
+"""
+
+# Một round trip: total + summaries của một trang (mới nhất trước)
+LIST_SCRIPT = """
+local index_key = KEYS[1]
+local offset = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local result = {redis.call('ZCARD', index_key)}
+if limit <= 0 then
+    return result
+end
+local ids = redis.call('ZREVRANGE', index_key, offset, offset + limit - 1)
+for _, id in ipairs(ids) do
+    table.insert(result, redis.call('HGETALL', 'campaign:' .. id .. ':summary'))
+end
+return result
+"""
+
+def summary_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:summary"
+
+def index_key(workspace_id: Optional[str] = None, status: Optional[str] = None) -> str:
+    key = f"{KEY_PREFIX}{workspace_id or ALL_SCOPE}"
+    return f"{key}:status:{status}" if status else key
+
+def _encode(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return "" if value is None else str(value)
+
+def _decode_summary(flat: List[str]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = dict(zip(flat[::2], flat[1::2]))
+    for field in _JSON_FIELDS:
+        raw = summary.get(field)
+        summary[field] = json.loads(raw) if raw else None
+    for field in _FLOAT_FIELDS:
+        summary[field] = float(summary[field]) if summary.get(field) else 0.0
+    summary.pop("created_ts", None)
+    return summary
+
+class CampaignIndex:
+    """
+    Index summary campaign trong Redis cho list view: không cần aget_state từng campaign.
+    Node handlers cập nhật status/score dần dần qua update().
+    """
+
+    def __init__(self):
+        self._update = None
+        self._list = None
+
+    def _scripts(self) -> Tuple[Any, Any]:
+        if self._update is None:
+            self._update = resources.redis_client.register_script(UPDATE_SCRIPT)
+            self._list = resources.redis_client.register_script(LIST_SCRIPT)
+        return self._update, self._list
+
+    async def register(self, meta: Dict[str, Any], workspace_id: Optional[str] = None):
+        redis = resources.redis_client
+        campaign_id = meta["id"]
+        workspace = str(workspace_id) if workspace_id else DEFAULT_WORKSPACE
+        status = meta.get("status", "queued")
+        created_ts = meta.get("created_ts") or time.time()
+        summary = {
+            **{k: _encode(v) for k, v in meta.items()},
+            "workspace_id": workspace,
+            "status": status,
+            "current_score": _encode(meta.get("current_score", 0.0)),
+            "updated_at": meta.get("updated_at") or meta.get("created_at") or datetime.now().isoformat(),
+            "created_ts": created_ts,
+        }
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(summary_key(campaign_id), mapping=summary)
+            for scope in (ALL_SCOPE, workspace):
+                pipe.zadd(index_key(scope), {campaign_id: created_ts})
+                pipe.zadd(index_key(scope, status), {campaign_id: created_ts})
+            await pipe.execute()
+
+    async def update(self, campaign_id: str, status: Optional[str] = None,
+                     current_score: Optional[float] = None, **fields: Any) -> bool:
+        """
+        Cập nhật status/score (bỏ qua nếu campaign chưa có trong index, vd: battle).
+        """
+        if not resources.redis_client:
+            return False
+        if current_score is not None:
+            fields["current_score"] = current_score
+        fields["updated_at"] = datetime.now().isoformat()
+        args = [campaign_id, KEY_PREFIX, ALL_SCOPE, status or ""]
+        for name, value in fields.items():
+            args += [name, _encode(value)]
+        update, _ = self._scripts()
+        return bool(await update(keys=[summary_key(campaign_id)], args=args))
+
+    async def list(self, workspace_id: Optional[str] = None, status: Optional[str] = None,
+                   offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Trả về (total, summaries) mới nhất trước, lọc theo workspace/status.
+        """
+        await self._backfill_legacy()
+        _, list_script = self._scripts()
+        result = await list_script(keys=[index_key(workspace_id, status)], args=[max(0, offset), max(0, limit)])
+        total, pages = result[0], result[1:]
+        return int(total), [_decode_summary(flat) for flat in pages if flat]
+
+    async def _backfill_legacy(self):
+        """
+        Campaign tạo trước khi có index chỉ nằm trong list 'campaigns:list': index một lần,
+        với status / score thật lấy từ checkpointer (meta lúc tạo luôn là "queued", score 0).
+        Cờ hoàn tất chỉ được đặt sau khi chạy hết list: lỗi giữa chừng thì lần list sau chạy tiếp.
+        """
+        redis = resources.redis_client
+        done_key = f"{KEY_PREFIX}legacy_backfilled"
+        if await redis.exists(done_key):
+            return
+        # Một replica backfill tại một thời điểm; lock hết hạn nếu replica đó chết giữa chừng
+        if not await redis.set(f"{done_key}:lock", "1", nx=True, ex=LEGACY_BACKFILL_LOCK_SECONDS):
+            return
+        from app.services.workflow import build_dynamic_graph
+        graph = build_dynamic_graph()
+        items = await redis.lrange(LEGACY_LIST_KEY, 0, -1)
+        for item in reversed(items):
+            try:
+                meta = json.loads(item)
+                if await redis.exists(summary_key(meta["id"])):
+                    continue
+                created_at = meta.get("created_at")
+                meta["created_ts"] = datetime.fromisoformat(created_at).timestamp() if created_at else time.time()
+                await self.register({**meta, **await self._live_state(graph, meta["id"])})
+            except Exception as e:
+                logger.warning("Skipping legacy campaign entry: %s", e)
+        await redis.set(done_key, "1")
+        await redis.delete(f"{done_key}:lock")
+        if items:
+            logger.info("Backfilled %d legacy campaigns into the campaign index", len(items))
+
+    async def _live_state(self, graph, campaign_id: str) -> Dict[str, Any]:
+        try:
+            snapshot = await graph.aget_state({"configurable": {"thread_id": campaign_id}})
+        except Exception as e:
+            logger.warning("Failed to fetch live state for legacy campaign %s: %s", campaign_id, e)
+            return {}
+        values = snapshot.values or {}
+        live = {key: values[key] for key in ("status", "current_score") if values.get(key) is not None}
+        if live and snapshot.created_at:
+            live["updated_at"] = snapshot.created_at
+        return live
+
+campaign_index = CampaignIndex()
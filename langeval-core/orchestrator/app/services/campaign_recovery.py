@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langgraph.types import Command
+
+import app.core.resources as resources
+from app.services.campaign_index import index_key, summary_key
+from app.services.campaign_scheduler import campaign_scheduler
+from app.services.durable_timers import durable_timers, wait_deadline, RESUME_JOB_KIND
+
+logger = logging.getLogger(__name__)
+
+# Recovery Config from Environment
+RECOVERY_ENABLED = os.getenv("CAMPAIGN_RECOVERY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Chờ một chút sau startup để scheduler/các replica khác ổn định trước khi quét
+RECOVERY_DELAY = float(os.getenv("CAMPAIGN_RECOVERY_DELAY", "5"))
+# Chỉ một replica quét trong mỗi khoảng này (nhiều replica restart cùng lúc khi deploy)
+RECOVERY_LOCK_SECONDS = int(os.getenv("CAMPAIGN_RECOVERY_LOCK_SECONDS", "300"))
+RECOVERY_LOCK_KEY = "campaigns:recovery:lock"
+RECOVERY_JOB_KIND = RESUME_JOB_KIND
+
+async def resume_point(graph, config: Dict[str, Any], initial_state: Dict[str, Any]) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Xác định cách chạy graph cho thread trong `config` dựa trên checkpoint mới nhất.
+    Trả về (graph_input, final_state):
+    - chưa có checkpoint         -> (initial_state, None): chạy từ đầu
+    - checkpoint còn node chờ    -> (None, None): astream(None) tiếp tục từ node đã hoàn thành cuối cùng
+    - Wait Node đã đến hạn       -> (Command(resume=...), None)
+    - Wait Node chưa đến hạn     -> (None, values + "__interrupt__"): chưa có gì để chạy
+    - checkpoint đã kết thúc     -> (None, values): campaign đã xong, không chạy lại
+    """
+    if not getattr(graph, "checkpointer", None):
+        return initial_state, None
+    snapshot = await graph.aget_state(config)
+    if not snapshot.values:
+        return initial_state, None
+    if not snapshot.next:
+        return None, dict(snapshot.values)
+
+    thread_id = config["configurable"]["thread_id"]
+    waiting = {**snapshot.values, "__interrupt__": [i.value for i in snapshot.interrupts]}
+    resume_at = wait_deadline(waiting)
+    if resume_at is not None:
+        if resume_at > time.time():
+            return None, waiting
+        logger.info("Resuming %s after wait (due %.0f)", thread_id, resume_at)
+        return Command(resume=resume_at), None
+    logger.info("Resuming %s from checkpoint (next: %s)", thread_id, list(snapshot.next))
+    return None, None
+
+class CampaignRecovery:
+    """
+    Sau khi Orchestrator restart, tìm campaign còn `running` (hoặc `waiting` nhưng mất timer)
+    trong campaign index mà không còn job nào trong Campaign Scheduler (job đang chạy / chờ lease
+    hết hạn sẽ được scheduler requeue) và đưa vào scheduler một job "resume". Job resume chạy tiếp graph
+    từ checkpoint nên các lượt LLM đã xong không bị gọi lại.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.recovered: List[str] = []
+
+    async def start(self):
+        if not RECOVERY_ENABLED or not resources.redis_client or self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        try:
+            await asyncio.sleep(RECOVERY_DELAY)
+            await self.recover()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Campaign recovery failed: %s", e)
+
+    async def recover(self) -> List[str]:
+        """
+        Quét một lần; trả về danh sách campaign đã được enqueue để resume.
+        """
+        redis = resources.redis_client
+        if not await redis.set(RECOVERY_LOCK_KEY, "1", ex=RECOVERY_LOCK_SECONDS, nx=True):
+            logger.info("Campaign recovery skipped: another replica holds the lock")
+            return []
+
+        running = await redis.zrange(index_key(status="running"), 0, -1)
+        waiting = await redis.zrange(index_key(status="waiting"), 0, -1)
+        if not running and not waiting:
+            return []
+        active = await campaign_scheduler.active_campaign_ids()
+
+        waiting_ids = set(waiting)
+        recovered = []
+        for campaign_id in running + waiting:
+            if campaign_id in active:
+                continue
+            if campaign_id in waiting_ids and await durable_timers.pending(campaign_id) is not None:
+                continue
+            workspace_id = await redis.hget(summary_key(campaign_id), "workspace_id")
+            await campaign_scheduler.enqueue(RECOVERY_JOB_KIND, campaign_id, {}, workspace_id=workspace_id)
+            recovered.append(campaign_id)
+
+        self.recovered = recovered
+        if recovered:
+            logger.info("Campaign recovery: re-enqueued %d interrupted campaigns", len(recovered))
+        return recovered
+
+campaign_recovery = CampaignRecovery()
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import app.core.resources as resources
+
+logger = logging.getLogger(__name__)
+
+# Scheduler Config from Environment
+GLOBAL_CONCURRENCY = int(os.getenv("SCHEDULER_GLOBAL_CONCURRENCY", "50"))
+WORKSPACE_CONCURRENCY = int(os.getenv("SCHEDULER_WORKSPACE_CONCURRENCY", "5"))
+REPLICA_CONCURRENCY = int(os.getenv("SCHEDULER_REPLICA_CONCURRENCY", "20"))
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "60"))
+POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", "1.0"))
+KEY_PREFIX = os.getenv("SCHEDULER_KEY_PREFIX", "scheduler:")
+
+DEFAULT_WORKSPACE = "default"
+MAX_PRIORITY = 10
+
+# Redis layout (prefix "scheduler:"):
+#   jobs                 HASH  job_id -> job json
+#   queue:{workspace}    ZSET  job_id -> (MAX_PRIORITY - priority) * 1e10 + enqueued_at
+#   workspaces           ZSET  workspace -> last served ts (only workspaces with queued jobs)
+#   running              ZSET  job_id -> lease expiry ts (global concurrency)
+#   running:{workspace}  SET   job_ids (per-workspace concurrency)
+
+# Atomically pick the least recently served workspace that has queued work and
+# free capacity, then move its highest-priority job to running.
+CLAIM_SCRIPT = """
+local prefix = ARGV[1]
+local global_limit = tonumber(ARGV[2])
+local ws_limit = tonumber(ARGV[3])
+local now = ARGV[4]
+local lease_expiry = ARGV[5]
+if redis.call('ZCARD', prefix .. 'running') >= global_limit then
+    return nil
+end
+local workspaces = redis.call('ZRANGE', prefix .. 'workspaces', 0, -1)
+for _, ws in ipairs(workspaces) do
+    local qkey = prefix .. 'queue:' .. ws
+    local rkey = prefix .. 'running:' .. ws
+    if redis.call('ZCARD', qkey) == 0 then
+        redis.call('ZREM', prefix .. 'workspaces', ws)
+    elseif redis.call('SCARD', rkey) < ws_limit then
+        local job_id = redis.call('ZPOPMIN', qkey)[1]
+        redis.call('ZADD', prefix .. 'running', lease_expiry, job_id)
+        redis.call('SADD', rkey, job_id)
+        if redis.call('ZCARD', qkey) == 0 then
+            redis.call('ZREM', prefix .. 'workspaces', ws)
+        else
+            redis.call('ZADD', prefix .. 'workspaces', now, ws)
+        end
+        return {job_id, redis.call('HGET', prefix .. 'jobs', job_id)}
+    end
+end
+return nil
+"""
+
+# Requeue jobs whose lease expired (replica crashed or restarted mid-run).
+REAP_SCRIPT = """
+local prefix = ARGV[1]
+local now = ARGV[2]
+local expired = redis.call('ZRANGEBYSCORE', prefix .. 'running', '-inf', now)
+for _, job_id in ipairs(expired) do
+    redis.call('ZREM', prefix .. 'running', job_id)
+    local raw = redis.call('HGET', prefix .. 'jobs', job_id)
+    if raw then
+        local job = cjson.decode(raw)
+        local ws = job['workspace_id']
+        redis.call('SREM', prefix .. 'running:' .. ws, job_id)
+        redis.call('ZADD', prefix .. 'queue:' .. ws, job['score'], job_id)
+        redis.call('ZADD', prefix .. 'workspaces', 'NX', now, ws)
+    end
+end
+return #expired
+"""
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class CampaignScheduler:
+    """
+    Hàng đợi Campaign bền vững (Redis) thay cho FastAPI BackgroundTasks.
+    - Giới hạn concurrency toàn cục và theo workspace.
+    - Ưu tiên (priority) trong cùng workspace, fair-share (round-robin) giữa các workspace.
+    - Nhiều replica Orchestrator cùng lấy job; job có lease, replica chết thì job được requeue.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._claim = None
+        self._reap = None
+        self._last_renew = 0.0
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    async def start(self):
+        if self.running or not resources.redis_client:
+            return
+        self._claim = resources.redis_client.register_script(CLAIM_SCRIPT)
+        self._reap = resources.redis_client.register_script(REAP_SCRIPT)
+        self._loop_task = asyncio.create_task(self._run())
+        logger.info(
+            "Campaign scheduler started (global=%d, workspace=%d, replica=%d)",
+            GLOBAL_CONCURRENCY, WORKSPACE_CONCURRENCY, REPLICA_CONCURRENCY
+        )
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        # In-flight jobs keep their lease until it expires, then another replica requeues them
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    async def enqueue(self, kind: str, campaign_id: str, payload: Dict[str, Any],
+                      workspace_id: Optional[str] = None, priority: int = 0) -> str:
+        """
+        Đưa job vào hàng đợi. priority: 0 (thấp) .. 10 (cao).
+        """
+        priority = max(0, min(MAX_PRIORITY, int(priority or 0)))
+        now = time.time()
+        job_id = str(uuid.uuid4())
+        workspace = str(workspace_id) if workspace_id else DEFAULT_WORKSPACE
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "campaign_id": campaign_id,
+            "workspace_id": workspace,
+            "priority": priority,
+            "score": (MAX_PRIORITY - priority) * 1e10 + now,
+            "enqueued_at": now,
+            "payload": payload
+        }
+
+        redis = resources.redis_client
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(f"{KEY_PREFIX}jobs", job_id, json.dumps(job, default=str))
+            pipe.zadd(f"{KEY_PREFIX}queue:{workspace}", {job_id: job["score"]})
+            pipe.zadd(f"{KEY_PREFIX}workspaces", {workspace: now}, nx=True)
+            await pipe.execute()
+
+        self._wakeup.set()
+        return job_id
+
+    async def stats(self) -> Dict[str, Any]:
+        redis = resources.redis_client
+        workspaces = await redis.zrange(f"{KEY_PREFIX}workspaces", 0, -1)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zcard(f"{KEY_PREFIX}running")
+            for ws in workspaces:
+                pipe.zcard(f"{KEY_PREFIX}queue:{ws}")
+            counts = await pipe.execute()
+        return {
+            "running": counts[0],
+            "queued": sum(counts[1:]),
+            "queued_by_workspace": dict(zip(workspaces, counts[1:])),
+            "local_running": len(self._tasks),
+            "limits": {
+                "global": GLOBAL_CONCURRENCY,
+                "workspace": WORKSPACE_CONCURRENCY,
+                "replica": REPLICA_CONCURRENCY
+            }
+        }
+
+    async def active_campaign_ids(self) -> Set[str]:
+        """
+        Campaign còn job trong scheduler (queued, running hoặc chờ lease hết hạn để requeue).
+        Job batch chứa nhiều campaign trong payload["runs"].
+        """
+        active = set()
+        for raw in await resources.redis_client.hvals(f"{KEY_PREFIX}jobs"):
+            job = json.loads(raw)
+            active.add(job["campaign_id"])
+            for run in (job.get("payload") or {}).get("runs") or []:
+                active.add(run["campaign_id"])
+        return active
+
+    async def _run(self):
+        while True:
+            try:
+                now = time.time()
+                await self._reap(args=[KEY_PREFIX, now])
+                await self._renew_leases(now)
+
+                while len(self._tasks) < REPLICA_CONCURRENCY:
+                    claimed = await self._claim(args=[
+                        KEY_PREFIX, GLOBAL_CONCURRENCY, WORKSPACE_CONCURRENCY,
+                        time.time(), time.time() + LEASE_SECONDS
+                    ])
+                    if not claimed:
+                        break
+                    job_id, raw = claimed
+                    self._spawn(job_id, raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Campaign scheduler loop error: %s", e)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _renew_leases(self, now: float):
+        if not self._tasks or now - self._last_renew < LEASE_SECONDS / 3:
+            return
+        self._last_renew = now
+        await resources.redis_client.zadd(
+            f"{KEY_PREFIX}running",
+            {job_id: now + LEASE_SECONDS for job_id in self._tasks},
+            xx=True
+        )
+
+    def _spawn(self, job_id: str, raw: Optional[str]):
+        job = json.loads(raw) if raw else None
+        self._tasks[job_id] = asyncio.create_task(self._execute(job_id, job))
+
+    async def _execute(self, job_id: str, job: Optional[Dict[str, Any]]):
+        cancelled = False
+        try:
+            handler = self._handlers.get(job["kind"]) if job else None
+            if not handler:
+                logger.error("No handler for scheduled job %s (%s)", job_id, job and job.get('kind'))
+                return
+            queue_time = time.time() - job.get("enqueued_at", time.time())
+            logger.info("Running %s job for campaign %s (queued %.1fs)", job['kind'], job['campaign_id'], queue_time)
+            await handler(job)
+        except asyncio.CancelledError:
+            # Shutdown: keep the lease so the job is requeued after expiry
+            cancelled = True
+            raise
+        except Exception as e:
+            logger.error("Scheduled job %s failed: %s", job_id, e)
+        finally:
+            if not cancelled:
+                await self._release(job_id, job)
+            self._tasks.pop(job_id, None)
+            self._wakeup.set()
+
+    async def _release(self, job_id: str, job: Optional[Dict[str, Any]]):
+        workspace = job.get("workspace_id", DEFAULT_WORKSPACE) if job else DEFAULT_WORKSPACE
+        try:
+            async with resources.redis_client.pipeline(transaction=True) as pipe:
+                pipe.zrem(f"{KEY_PREFIX}running", job_id)
+                pipe.srem(f"{KEY_PREFIX}running:{workspace}", job_id)
+                pipe.hdel(f"{KEY_PREFIX}jobs", job_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Failed to release scheduled job %s: %s", job_id, e)
+
+campaign_scheduler = CampaignScheduler()
@@ -1,7 +1,26 @@
 from langgraph.checkpoint.redis import AsyncRedisSaver
 from redis.asyncio import Redis, ConnectionPool
+from typing import Any, Dict, Optional
+import json
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+# Retention Config from Environment
+# "full": giữ mọi checkpoint (hành vi cũ) | "latest": chỉ giữ N checkpoint mới nhất mỗi thread khi campaign kết thúc
+CHECKPOINT_RETENTION = os.getenv("CHECKPOINT_RETENTION", "latest").lower()
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "1"))
+# TTL (phút) tính từ lần ghi cuối: campaign đã xong / bị bỏ dở sẽ tự hết hạn. 0 = không hết hạn
+CHECKPOINT_TTL_MINUTES = float(os.getenv("CHECKPOINT_TTL_MINUTES", "10080"))
+# Lưu final state vào Postgres trước khi Redis hết hạn
+CHECKPOINT_ARCHIVE = os.getenv("CHECKPOINT_ARCHIVE", "false").lower() in ("1", "true", "yes")
+
+# Process-wide checkpointer, shared by every compiled graph
+_checkpointer: Optional[AsyncRedisSaver] = None
+_checkpointer_ready = False
+_prune_unsupported_logged = False
+
 def get_redis_client() -> Redis:
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
     # Use connection pool for better performance and stability
@@ -12,6 +31,69 @@ def get_checkpointer() -> AsyncRedisSaver:
     """
     Trả về Async Redis Checkpointer để lưu trạng thái Graph.
     Key prefix: checkpoint:{thread_id}
+    Checkpointer được tạo một lần và dùng chung cho toàn bộ process.
+    """
+    global _checkpointer
+    if _checkpointer is None:
+        redis_client = get_redis_client()
+        # TTL được làm mới mỗi lần ghi, nên campaign đang chạy không bị hết hạn
+        ttl = {"default_ttl": CHECKPOINT_TTL_MINUTES} if CHECKPOINT_TTL_MINUTES > 0 else None
+        _checkpointer = AsyncRedisSaver(redis_client=redis_client, ttl=ttl)
+    return _checkpointer
+
+async def ensure_checkpointer_setup(checkpointer: Optional[AsyncRedisSaver] = None):
+    """
+    Tạo indices cho checkpointer (chỉ chạy một lần mỗi process).
     """
-    redis_client = get_redis_client()
-    return AsyncRedisSaver(redis_client=redis_client)
+    global _checkpointer_ready
+    checkpointer = checkpointer or get_checkpointer()
+    if checkpointer is _checkpointer and _checkpointer_ready:
+        return
+    await checkpointer.asetup()
+    if checkpointer is _checkpointer:
+        _checkpointer_ready = True
+
+def _to_jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "dict"):
+        return value.dict()
+    return str(value)
+
+async def archive_final_state(thread_id: str, kind: str, final_state: Dict[str, Any]):
+    """
+    Lưu final state của campaign vào Postgres (bảng campaign_state_archive).
+    """
+    from app.db.engine import AsyncSessionLocal
+    from app.db.repository import CampaignRepository
+
+    state = json.loads(json.dumps(final_state, default=_to_jsonable))
+    async with AsyncSessionLocal() as session:
+        await CampaignRepository(session).archive_state(thread_id, kind, state)
+
+async def apply_retention(thread_id: str, final_state: Optional[Dict[str, Any]] = None, kind: str = "campaign"):
+    """
+    Gọi khi một campaign kết thúc: archive final state (tùy chọn) rồi xóa checkpoint cũ,
+    chỉ giữ CHECKPOINT_KEEP_LAST checkpoint mới nhất (vẫn đủ cho aget_state / resume).
+    """
+    if CHECKPOINT_ARCHIVE and final_state:
+        try:
+            await archive_final_state(thread_id, kind, final_state)
+        except Exception as e:
+            logger.error("Checkpoint archive failed for %s: %s", thread_id, e)
+
+    if CHECKPOINT_RETENTION != "latest":
+        return
+    global _prune_unsupported_logged
+    checkpointer = get_checkpointer()
+    if not hasattr(checkpointer, "aprune"):
+        # langgraph-checkpoint-redis cũ chưa có aprune: chỉ còn TTL
+        if not _prune_unsupported_logged:
+            _prune_unsupported_logged = True
+            logger.warning("CHECKPOINT_RETENTION=latest needs langgraph-checkpoint-redis with aprune; "
+                           "old checkpoints are only removed by TTL")
+        return
+    try:
+        await checkpointer.aprune([thread_id], keep_last=max(1, CHECKPOINT_KEEP_LAST))
+    except Exception as e:
+        logger.error("Checkpoint prune failed for %s: %s", thread_id, e)
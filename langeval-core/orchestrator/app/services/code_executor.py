@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import time
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: không có rlimit, chỉ còn timeout phía Orchestrator
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Code Executor Config from Environment
+EXECUTOR_WORKERS = int(os.getenv("CODE_EXECUTOR_WORKERS", "2"))
+DEFAULT_TIMEOUT = float(os.getenv("CODE_EXECUTOR_TIMEOUT", "5"))
+MAX_TIMEOUT = float(os.getenv("CODE_EXECUTOR_MAX_TIMEOUT", "30"))
+MEMORY_LIMIT_MB = int(os.getenv("CODE_EXECUTOR_MEMORY_MB", "256"))
+# Thời gian tối đa chờ một worker rảnh trước khi bỏ cuộc
+QUEUE_TIMEOUT = float(os.getenv("CODE_EXECUTOR_QUEUE_TIMEOUT", "30"))
+# Worker tự ngắt ở `timeout`; quá timeout + grace mới coi là worker bị kẹt và restart pool
+EXEC_GRACE = float(os.getenv("CODE_EXECUTOR_GRACE", "2"))
+START_METHOD = os.getenv("CODE_EXECUTOR_START_METHOD", "forkserver")
+
+# Builtins được phép trong Code Node (không có __import__, open, eval, exec...)
+SAFE_BUILTINS = {
+    name: __builtins__[name] if isinstance(__builtins__, dict) else getattr(__builtins__, name)
+    for name in (
+        "abs", "all", "any", "bool", "dict", "enumerate", "filter", "float", "int", "isinstance",
+        "len", "list", "map", "max", "min", "print", "range", "reversed", "round", "set",
+        "sorted", "str", "sum", "tuple", "zip", "Exception", "ValueError", "KeyError", "TypeError",
+    )
+}
+
+# Chỉ expose loads/dumps (module json thật cho phép đi tiếp tới json.codecs.open...)
+SAFE_JSON = SimpleNamespace(loads=json.loads, dumps=json.dumps)
+
+class CodeTimeout(BaseException):
+    # BaseException: `except Exception` trong code người dùng không nuốt được timeout
+    pass
+
+# --- Worker process side ---
+
+_armed = False
+
+def _on_limit(signum, frame):
+    if _armed:
+        raise CodeTimeout("CPU time limit exceeded" if signum == getattr(signal, "SIGXCPU", None) else "Wall-clock limit exceeded")
+
+def _init_worker(memory_limit_mb: int):
+    # Chạy một lần khi worker process khởi động
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_limit)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_limit)
+    if resource and memory_limit_mb > 0:
+        try:
+            # Địa chỉ ảo hiện tại + hạn mức cho code người dùng
+            with open("/proc/self/statm") as f:
+                base = int(f.read().split()[0]) * resource.getpagesize()
+        except OSError:
+            base = 0
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = base + memory_limit_mb * 1024 * 1024
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _warmup() -> int:
+    return os.getpid()
+
+def _arm(timeout: float):
+    global _armed
+    _armed = True
+    if hasattr(signal, "setitimer"):
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    if resource:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = math.ceil(usage.ru_utime + usage.ru_stime + timeout)
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _disarm():
+    global _armed
+    _armed = False
+    if hasattr(signal, "setitimer"):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    if resource:
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+def _to_json(value: Any) -> Any:
+    return json.loads(json.dumps(value, default=str))
+
+def _execute(code: str, context: Dict[str, Any], output_keys: List[str], timeout: float) -> Dict[str, Any]:
+    started = time.time()
+    result: Dict[str, Any] = {"ok": False, "outputs": {}, "error": None, "timeout": False}
+    try:
+        scope = {**context, "json": SAFE_JSON, "__builtins__": SAFE_BUILTINS}
+        _arm(timeout)
+        try:
+            exec(code, scope)
+        finally:
+            _disarm()
+        # Chỉ trả về dữ liệu JSON được (an toàn khi ghi vào state/checkpoint)
+        result["outputs"] = {k: _to_json(scope[k]) for k in output_keys if k in scope}
+        result["ok"] = True
+    except CodeTimeout as e:
+        result.update(error=str(e), timeout=True)
+    except MemoryError:
+        result["error"] = "Memory limit exceeded"
+    except BaseException as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["started_at"] = started
+    result["exec_ms"] = (time.time() - started) * 1000
+    return result
+
+# --- Orchestrator side ---
+
+class CodeExecutor:
+    """
+    Chạy Code Node trong pool process riêng (warm), thay vì exec() trên event loop.
+    - Giới hạn wall-clock (SIGALRM), CPU (RLIMIT_CPU) và bộ nhớ (RLIMIT_AS) trong worker.
+    - Chỉ submit khi có worker rảnh (semaphore): thời gian chờ hàng đợi và thời gian chạy được tính riêng.
+    - Worker bị treo quá hạn => pool được tạo lại, event loop Orchestrator không bị ảnh hưởng.
+    - Metrics: queue time, exec time, số lần timeout/lỗi.
+    """
+
+    def __init__(self, workers: int = EXECUTOR_WORKERS, memory_limit_mb: int = MEMORY_LIMIT_MB):
+        self.workers = workers
+        self.memory_limit_mb = memory_limit_mb
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(workers)
+        self._metrics = {
+            "submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "queue_timeouts": 0, "pool_restarts": 0,
+            "queue_ms_total": 0.0, "queue_ms_max": 0.0, "exec_ms_total": 0.0, "exec_ms_max": 0.0,
+        }
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(START_METHOD),
+            initializer=_init_worker,
+            initargs=(self.memory_limit_mb,),
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = self._create_pool()
+        return self._pool
+
+    async def start(self):
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        # Warm up: spawn đủ worker trước campaign đầu tiên
+        pids = await asyncio.gather(*[loop.run_in_executor(pool, _warmup) for _ in range(self.workers)])
+        logger.info("Code executor started (%d workers, memory=%sMB)", len(set(pids)), self.memory_limit_mb)
+
+    async def stop(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _restart_pool(self, pool: ProcessPoolExecutor):
+        # Nhiều task cùng thấy pool hỏng -> chỉ restart một lần
+        if self._pool is not pool:
+            return
+        self._pool = None
+        self._metrics["pool_restarts"] += 1
+        if pool:
+            # Kill worker đang treo (ProcessPoolExecutor không hỗ trợ hủy task đang chạy)
+            for process in list(getattr(pool, "_processes", {}).values()):
+                process.kill()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, code: str, context: Dict[str, Any], output_keys: List[str],
+                  timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Chạy `code` với biến trong `context`, trả về {"ok", "outputs", "error", "timeout", ...}.
+        """
+        timeout = min(float(timeout or DEFAULT_TIMEOUT), MAX_TIMEOUT)
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self._metrics["submitted"] += 1
+        # Chờ worker rảnh ở đây thay vì trong hàng đợi của pool: hết hạn chờ chỉ trả lỗi, không đụng tới pool
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._metrics["queue_timeouts"] += 1
+            result = {"ok": False, "outputs": {}, "error": "Code executor is busy (queue timeout)", "timeout": False}
+            self._record(result, submitted)
+            return result
+
+        try:
+            pool = self._get_pool()
+            future = loop.run_in_executor(pool, _execute, code, context, output_keys, timeout)
+            try:
+                # Backstop chỉ tính thời gian chạy: quá hạn nghĩa là worker bị kẹt (C code...) -> restart pool
+                result = await asyncio.wait_for(future, timeout=timeout + EXEC_GRACE)
+            except asyncio.TimeoutError:
+                self._restart_pool(pool)
+                result = {"ok": False, "outputs": {}, "error": "Code execution timed out", "timeout": True}
+            except BrokenProcessPool:
+                # Worker chết (vượt hard limit, bị kill...) -> tạo pool mới cho lần sau
+                self._restart_pool(pool)
+                result = {"ok": False, "outputs": {}, "error": "Code worker crashed", "timeout": False}
+        finally:
+            self._slots.release()
+
+        self._record(result, submitted)
+        return result
+
+    def _record(self, result: Dict[str, Any], submitted: float):
+        m = self._metrics
+        if result.get("ok"):
+            m["completed"] += 1
+        else:
+            m["failed"] += 1
+        if result.get("timeout"):
+            m["timeouts"] += 1
+        if "started_at" in result:
+            queue_ms = max(0.0, (result["started_at"] - submitted) * 1000)
+            result["queue_ms"] = queue_ms
+            m["queue_ms_total"] += queue_ms
+            m["queue_ms_max"] = max(m["queue_ms_max"], queue_ms)
+            m["exec_ms_total"] += result["exec_ms"]
+            m["exec_ms_max"] = max(m["exec_ms_max"], result["exec_ms"])
+
+    def stats(self) -> Dict[str, Any]:
+        m = self._metrics
+        finished = max(1, m["completed"] + m["failed"])
+        return {
+            **m,
+            "queue_ms_avg": m["queue_ms_total"] / finished,
+            "exec_ms_avg": m["exec_ms_total"] / finished,
+            "workers": self.workers,
+            "limits": {"timeout": DEFAULT_TIMEOUT, "max_timeout": MAX_TIMEOUT, "memory_mb": self.memory_limit_mb}
+        }
+
+code_executor = CodeExecutor()
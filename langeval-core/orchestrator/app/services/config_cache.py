@@ -0,0 +1,135 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import app.core.resources as resources
+
+logger = logging.getLogger(__name__)
+
+# TTL (giây) cho Agent/Model config lấy từ Resource Service
+CONFIG_CACHE_TTL = float(os.getenv("CONFIG_CACHE_TTL", "300"))
+CONFIG_CACHE_SIZE = int(os.getenv("CONFIG_CACHE_SIZE", "1024"))
+# Resource Service PUBLISH {"type": "agent"|"model", "id": ...} khi update/delete
+RESOURCE_EVENTS_CHANNEL = os.getenv("RESOURCE_EVENTS_CHANNEL", "resource:invalidate")
+
+Loader = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+class ConfigCache:
+    """
+    Cache in-process cho config Agent/Model (key dạng "agent:{id}", "model:{id}").
+    - TTL để tự làm mới, kể cả khi mất sự kiện invalidation.
+    - Coalescing: nhiều node cùng miss một key chỉ gọi HTTP một lần.
+    - Lắng nghe Redis Pub/Sub từ Resource Service để xóa entry ngay khi resource thay đổi.
+    """
+
+    def __init__(self, ttl: float = CONFIG_CACHE_TTL, max_size: int = CONFIG_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def get(self, key: str, loader: Loader) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return copy.deepcopy(entry[1])
+
+        inflight = self._inflight.get(key)
+        if inflight:
+            value = await asyncio.shield(inflight)
+            return copy.deepcopy(value)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await loader()
+            # Không cache lỗi/None để lần sau thử lại
+            if value is not None and self._inflight.get(key) is fut:
+                self._store(key, value)
+            fut.set_result(value)
+        except BaseException as e:
+            fut.set_exception(e)
+            # Tránh warning "exception was never retrieved" khi không có ai chờ
+            fut.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+        return copy.deepcopy(value)
+
+    def _store(self, key: str, value: Dict[str, Any]):
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            now = time.monotonic()
+            for k in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+                del self._entries[k]
+            if len(self._entries) >= self.max_size:
+                # Bỏ entry sắp hết hạn nhất
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._entries.clear()
+            self._inflight.clear()
+            return
+        self._entries.pop(key, None)
+        # Request đang bay có thể trả về dữ liệu cũ -> không lưu kết quả đó
+        self._inflight.pop(key, None)
+
+    async def start(self):
+        if self.running or not resources.redis_client:
+            return
+        self._pubsub = resources.redis_client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(RESOURCE_EVENTS_CHANNEL)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Config cache subscribed to '%s'", RESOURCE_EVENTS_CHANNEL)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub:
+            try:
+                await self._pubsub.unsubscribe(RESOURCE_EVENTS_CHANNEL)
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.error("Error closing config cache pubsub: %s", e)
+            self._pubsub = None
+
+    def handle_event(self, data: Any):
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        try:
+            event = json.loads(data)
+            self.invalidate(f"{event['type']}:{event['id']}")
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed resource event: %r", data)
+
+    async def _run(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    self.handle_event(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Config cache listener error: %s", e)
+                # Có thể đã lỡ sự kiện -> xóa toàn bộ cho an toàn
+                self.invalidate()
+                await asyncio.sleep(1)
+
+config_cache = ConfigCache()
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import app.core.resources as resources
+from app.services.campaign_index import summary_key
+from app.services.campaign_scheduler import campaign_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Timer Config from Environment
+TIMER_KEY = os.getenv("CAMPAIGN_TIMER_KEY", "timers:campaigns")
+TIMER_POLL_INTERVAL = float(os.getenv("CAMPAIGN_TIMER_POLL_INTERVAL", "1.0"))
+TIMER_BATCH_SIZE = int(os.getenv("CAMPAIGN_TIMER_BATCH_SIZE", "100"))
+
+# Giá trị interrupt() của Wait Node
+WAIT_INTERRUPT = "wait"
+# Job scheduler chạy tiếp campaign (dùng chung với campaign recovery)
+RESUME_JOB_KIND = "resume"
+
+# Redis layout:
+#   timers:campaigns   ZSET  campaign_id -> resume_at ts
+
+# Lấy và xóa các timer đã đến hạn (atomic: nhiều replica không resume trùng)
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+def wait_deadline(state: Optional[Dict[str, Any]]) -> Optional[float]:
+    """
+    Thời điểm resume nếu graph đang dừng ở Wait Node (state có "__interrupt__"), ngược lại None.
+    """
+    for value in (state or {}).get("__interrupt__") or []:
+        if isinstance(value, dict) and value.get("type") == WAIT_INTERRUPT:
+            return float(value["resume_at"])
+    return None
+
+class DurableTimers:
+    """
+    Timer bền vững (Redis ZSET) cho Wait Node: graph dừng bằng interrupt(), campaign nhả
+    coroutine và slot scheduler trong lúc chờ. Khi đến hạn, timer được chuyển thành job
+    "resume" trong Campaign Scheduler để chạy tiếp thread từ checkpoint.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._claim = None
+        self.fired = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running or not resources.redis_client:
+            return
+        self._claim = resources.redis_client.register_script(CLAIM_SCRIPT)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Durable timers started (key=%s)", TIMER_KEY)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def schedule(self, campaign_id: str, resume_at: float):
+        # Idempotent: campaign chạy lại trước hạn chỉ ghi đè cùng member
+        await resources.redis_client.zadd(TIMER_KEY, {campaign_id: resume_at})
+
+    async def pending(self, campaign_id: str) -> Optional[float]:
+        return await resources.redis_client.zscore(TIMER_KEY, campaign_id)
+
+    async def fire_due(self, now: Optional[float] = None) -> List[str]:
+        """
+        Enqueue job resume cho các timer đã đến hạn. Trả về danh sách campaign_id.
+        """
+        redis = resources.redis_client
+        if self._claim is None:
+            self._claim = redis.register_script(CLAIM_SCRIPT)
+        now = now or time.time()
+        due = await self._claim(keys=[TIMER_KEY], args=[now, TIMER_BATCH_SIZE])
+        fired = []
+        for campaign_id in due:
+            try:
+                workspace_id = await redis.hget(summary_key(campaign_id), "workspace_id")
+                await campaign_scheduler.enqueue(RESUME_JOB_KIND, campaign_id, {}, workspace_id=workspace_id)
+                fired.append(campaign_id)
+            except Exception as e:
+                logger.error("Failed to enqueue resume for %s: %s", campaign_id, e)
+                await redis.zadd(TIMER_KEY, {campaign_id: now})
+        self.fired += len(fired)
+        return fired
+
+    async def _run(self):
+        while True:
+            try:
+                fired = await self.fire_due()
+                if len(fired) >= TIMER_BATCH_SIZE:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Durable timer loop error: %s", e)
+            await asyncio.sleep(TIMER_POLL_INTERVAL)
+
+durable_timers = DurableTimers()
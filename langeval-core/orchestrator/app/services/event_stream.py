@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import app.core.resources as resources
+from app.services.history_store import serialize_message
+
+logger = logging.getLogger(__name__)
+
+# Số event gần nhất giữ lại để viewer vào sau (hoặc reconnect) xem lại
+EVENT_REPLAY_SIZE = int(os.getenv("CAMPAIGN_EVENT_REPLAY_SIZE", "200"))
+EVENT_REPLAY_TTL = int(os.getenv("CAMPAIGN_EVENT_REPLAY_TTL", "86400"))
+# Buffer mỗi viewer; viewer chậm bị bỏ event cũ nhất thay vì làm nghẽn hub
+EVENT_QUEUE_SIZE = int(os.getenv("CAMPAIGN_EVENT_QUEUE_SIZE", "500"))
+# Kênh điều khiển để pubsub luôn có ít nhất một subscription
+HUB_CHANNEL = "campaign:events:_hub"
+
+# Field trong state update được đẩy thành event "score"
+SCORE_FIELDS = (
+    "current_score", "score_sum", "progress", "successful_attacks", "blocked_attacks",
+    "agent_a_wins", "agent_b_wins", "ties",
+)
+TERMINAL_EVENTS = ("end", "error")
+
+def events_channel(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:events"
+
+def replay_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:events:log"
+
+class CampaignEventStream:
+    """
+    Fan-out event của campaign (node_start, node_end, message, score, status, end) qua Redis Pub/Sub.
+    - Runner PUBLISH event + giữ replay log ngắn (một pipeline mỗi event).
+    - Mỗi process Orchestrator có một kết nối pubsub; subscribe theo campaign khi có viewer đầu tiên,
+      nhiều viewer cùng campaign dùng chung subscription. Không đọc checkpoint.
+    """
+
+    def __init__(self):
+        self._viewers: Dict[str, Set[asyncio.Queue]] = {}
+        self._last_ids: Dict[str, int] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def viewers(self) -> int:
+        return sum(len(v) for v in self._viewers.values())
+
+    async def start(self):
+        if self.running or not resources.redis_client:
+            return
+        self._pubsub = resources.redis_client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(HUB_CHANNEL)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Campaign event stream started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub:
+            try:
+                await self._pubsub.unsubscribe()
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.error("Error closing event stream pubsub: %s", e)
+            self._pubsub = None
+        self._viewers.clear()
+
+    # --- Publisher side ---
+
+    def _next_id(self, campaign_id: str) -> int:
+        # Microseconds: tăng dần cả khi campaign được chạy lại trên process khác
+        event_id = max(time.time_ns() // 1000, self._last_ids.get(campaign_id, 0) + 1)
+        self._last_ids[campaign_id] = event_id
+        return event_id
+
+    async def publish(self, campaign_id: str, event_type: str, data: Dict[str, Any] = None):
+        """
+        Gửi event cho mọi viewer của campaign. Lỗi Redis không làm hỏng campaign.
+        """
+        redis = resources.redis_client
+        if not redis:
+            return
+        event = {
+            "id": self._next_id(campaign_id),
+            "type": event_type,
+            "campaign_id": campaign_id,
+            "ts": time.time(),
+            "data": data or {},
+        }
+        if event_type in TERMINAL_EVENTS:
+            self._last_ids.pop(campaign_id, None)
+        payload = json.dumps(event, default=str)
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.publish(events_channel(campaign_id), payload)
+                pipe.rpush(replay_key(campaign_id), payload)
+                pipe.ltrim(replay_key(campaign_id), -EVENT_REPLAY_SIZE, -1)
+                pipe.expire(replay_key(campaign_id), EVENT_REPLAY_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to publish '%s' event for %s: %s", event_type, campaign_id, e)
+
+    async def _publish_update(self, campaign_id: str, node: str, update: Dict[str, Any]):
+        for message in update.get("messages") or []:
+            await self.publish(campaign_id, "message", {"node": node, "message": serialize_message(message)})
+        scores = {k: update[k] for k in SCORE_FIELDS if k in update}
+        if scores:
+            await self.publish(campaign_id, "score", {"node": node, **scores})
+        if "status" in update:
+            await self.publish(campaign_id, "status", {"node": node, "status": update["status"]})
+
+    async def run_graph(self, graph, initial_state: Dict[str, Any], config: Dict[str, Any],
+                        campaign_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Chạy graph bằng astream (thay cho ainvoke), publish event theo từng node.
+        Trả về final state như ainvoke; exception của graph được raise lại sau event "error".
+        Graph dừng bằng interrupt() (vd: Wait Node): final state có "__interrupt__" (list giá trị
+        interrupt) và event "status" waiting thay cho "end" (viewer vẫn giữ kết nối).
+        """
+        final_state = None
+        interrupts = None
+        try:
+            async for mode, chunk in graph.astream(initial_state, config=config, stream_mode=["debug", "values"]):
+                if mode == "values":
+                    if "__interrupt__" in chunk:
+                        interrupts = [getattr(i, "value", i) for i in chunk["__interrupt__"]]
+                        chunk = {k: v for k, v in chunk.items() if k != "__interrupt__"}
+                    final_state = chunk
+                    continue
+                payload = chunk.get("payload") or {}
+                node = payload.get("name")
+                if not node or node.startswith("__"):
+                    continue
+                if chunk.get("type") == "task":
+                    await self.publish(campaign_id, "node_start", {"node": node, "step": chunk.get("step")})
+                elif chunk.get("type") == "task_result":
+                    update = payload.get("result") or {}
+                    # Bản cũ của LangGraph trả về list (channel, value)
+                    update = dict(update) if not isinstance(update, dict) else update
+                    await self.publish(campaign_id, "node_end", {
+                        "node": node, "step": chunk.get("step"), "error": payload.get("error"),
+                    })
+                    await self._publish_update(campaign_id, node, update)
+        except Exception as e:
+            await self.publish(campaign_id, "error", {"error": str(e)})
+            raise
+        final_state = final_state or {}
+        if interrupts:
+            await self.publish(campaign_id, "status", {"status": "waiting", "interrupts": interrupts})
+            return {**final_state, "__interrupt__": interrupts}
+        await self.publish(campaign_id, "end", {
+            "status": final_state.get("status"),
+            **{k: final_state[k] for k in SCORE_FIELDS if k in final_state},
+        })
+        return final_state
+
+    # --- Viewer side ---
+
+    async def subscribe(self, campaign_id: str, last_event_id: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async iterator event của campaign: replay log (sau `last_event_id`) rồi event live.
+        Kết thúc sau event "end"/"error".
+        """
+        if not self.running:
+            await self.start()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        channel = events_channel(campaign_id)
+        viewers = self._viewers.setdefault(channel, set())
+        viewers.add(queue)
+        try:
+            if len(viewers) == 1:
+                await self._pubsub.subscribe(channel)
+
+            # Subscribe trước, đọc replay sau -> không mất event ở giữa; trùng thì lọc theo id
+            last_id = last_event_id or 0
+            for raw in await resources.redis_client.lrange(replay_key(campaign_id), 0, -1):
+                event = json.loads(raw)
+                if event["id"] <= last_id:
+                    continue
+                last_id = event["id"]
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+
+            while True:
+                event = await queue.get()
+                if event["id"] <= last_id:
+                    continue
+                last_id = event["id"]
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            viewers.discard(queue)
+            if not viewers and self._viewers.get(channel) is viewers:
+                del self._viewers[channel]
+                if self._pubsub:
+                    try:
+                        await self._pubsub.unsubscribe(channel)
+                    except Exception as e:
+                        logger.warning("Failed to unsubscribe %s: %s", channel, e)
+
+    def _dispatch(self, channel: str, raw: Any):
+        viewers = self._viewers.get(channel)
+        if not viewers:
+            return
+        event = json.loads(raw)
+        for queue in viewers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _run(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    channel = message.get("channel")
+                    if isinstance(channel, bytes):
+                        channel = channel.decode("utf-8")
+                    self._dispatch(channel, message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Event stream listener error: %s", e)
+                await asyncio.sleep(1)
+
+event_stream = CampaignEventStream()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import app.core.resources as resources
+from app.core import wire
+
+# Gửi history theo tham chiếu (Redis list) thay vì nhúng toàn bộ vào Kafka payload.
+# Tắt (false) nếu worker chưa hỗ trợ `history_ref`.
+HISTORY_BY_REFERENCE = os.getenv("HISTORY_BY_REFERENCE", "true").lower() in ("1", "true", "yes")
+HISTORY_TTL = int(os.getenv("HISTORY_TTL_SECONDS", "86400"))
+# Số campaign được nhớ độ dài history (tránh LLEN mỗi lần gửi)
+HISTORY_TRACKED_CAMPAIGNS = int(os.getenv("HISTORY_TRACKED_CAMPAIGNS", "10000"))
+
+def history_key(campaign_id: str) -> str:
+    return f"campaign:{campaign_id}:history"
+
+def epoch_key(key: str) -> str:
+    # Epoch đổi mỗi lần list bị ghi lại từ đầu -> worker không dùng lại prefix đã cache của bản cũ
+    return f"{key}:epoch"
+
+def serialize_message(message: Any) -> Dict[str, Any]:
+    return message.dict() if hasattr(message, 'dict') else message
+
+class HistoryStore:
+    """
+    History hội thoại của campaign lưu một lần trong Redis (append-only list).
+    Payload Kafka chỉ mang {"key", "length", "epoch"}; mỗi lần gửi chỉ RPUSH phần message mới.
+    """
+
+    def __init__(self):
+        self._lengths: "OrderedDict[str, int]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _remember(self, key: str, length: int):
+        self._lengths[key] = length
+        self._lengths.move_to_end(key)
+        while len(self._lengths) > HISTORY_TRACKED_CAMPAIGNS:
+            old_key, _ = self._lengths.popitem(last=False)
+            self._locks.pop(old_key, None)
+
+    async def _rewrite(self, redis, key: str, messages: List[Any]) -> str:
+        epoch = uuid.uuid4().hex[:12]
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if messages:
+                pipe.rpush(key, *[wire.dumps(serialize_message(m)) for m in messages])
+                pipe.expire(key, HISTORY_TTL)
+            pipe.set(epoch_key(key), epoch, ex=HISTORY_TTL)
+            await pipe.execute()
+        return epoch
+
+    async def sync(self, campaign_id: str, messages: List[Any]) -> Dict[str, Any]:
+        """
+        Đảm bảo Redis list chứa đủ `messages`, trả về history reference.
+        Độ dài nhớ trong process chỉ để chọn phần đuôi cần RPUSH; độ dài thực trong Redis
+        (kết quả RPUSH / LLEN) luôn được đối chiếu, lệch thì ghi lại cả list và đổi epoch.
+        """
+        redis = resources.redis_client
+        key = history_key(campaign_id)
+        total = len(messages)
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            known = self._lengths.get(key)
+            if known is None:
+                # Replica khác (hoặc restart) đã ghi trước đó
+                known = await redis.llen(key)
+            length, epoch = None, None
+            if known <= total:
+                async with redis.pipeline(transaction=True) as pipe:
+                    if total > known:
+                        pipe.rpush(key, *[wire.dumps(serialize_message(m)) for m in messages[known:]])
+                    else:
+                        pipe.llen(key)
+                    pipe.expire(key, HISTORY_TTL)
+                    pipe.expire(epoch_key(key), HISTORY_TTL)
+                    pipe.get(epoch_key(key))
+                    length, _, _, epoch = await pipe.execute()
+            if length != total:
+                # State bị tua lại (resume từ checkpoint cũ), replica khác đã ghi thêm,
+                # hoặc key hết hạn / bị evict -> ghi lại từ đầu
+                epoch = await self._rewrite(redis, key, messages)
+            self._remember(key, total)
+
+        ref = {"key": key, "length": total}
+        if epoch:
+            ref["epoch"] = epoch
+        return ref
+
+    async def payload_fields(self, campaign_id: str, messages: List[Any]) -> Dict[str, Any]:
+        """
+        Trường history cho Kafka payload: {"history_ref": ...} hoặc {"history": [...]} (fallback).
+        """
+        if HISTORY_BY_REFERENCE and resources.redis_client:
+            return {"history_ref": await self.sync(campaign_id, messages)}
+        return {"history": [serialize_message(m) for m in messages]}
+
+history_store = HistoryStore()
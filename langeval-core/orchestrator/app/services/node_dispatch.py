@@ -0,0 +1,270 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Union
+
+import app.core.resources as resources
+from app.core import wire
+from app.core.kafka_producer import kafka_producer
+from app.services.result_dispatcher import result_dispatcher
+from app.services.node_memo import node_memo
+
+logger = logging.getLogger(__name__)
+
+# Policy gọi worker cho mỗi loại node (task, expectation, red_teaming, battle).
+# Thứ tự ghi đè: DEFAULT_POLICY < NODE_POLICIES (env JSON, theo loại hoặc "default")
+#   < scenario["meta_data"]["node_policies"] (theo loại hoặc "default") < data của node.
+DEFAULT_POLICY = {
+    "timeout": 60.0,          # giây cho mỗi lần thử
+    "retries": 0,             # số lần thử lại khi timeout / worker trả failed
+    "backoff": 1.0,           # giây trước lần thử lại đầu tiên, nhân đôi mỗi lần
+    "backoff_max": 30.0,
+    "hedge_percentile": 0.0,  # vd 95: gửi bản sao khi chờ lâu hơn p95 latency; 0 = tắt
+    "hedge_min_delay": 5.0,   # không hedge sớm hơn; dùng khi chưa đủ mẫu latency
+    "max_hedges": 1,
+}
+_INT_FIELDS = ("retries", "max_hedges")
+NODE_POLICIES: Dict[str, Dict[str, Any]] = json.loads(os.getenv("NODE_POLICIES", "{}"))
+# Cửa sổ latency (mỗi loại node) để tính percentile cho hedging
+LATENCY_WINDOW = int(os.getenv("NODE_LATENCY_WINDOW", "200"))
+LATENCY_MIN_SAMPLES = int(os.getenv("NODE_LATENCY_MIN_SAMPLES", "20"))
+# Marker request đang chờ worker sống thêm khoảng này sau timeout của node
+PENDING_GRACE_SECONDS = int(os.getenv("NODE_PENDING_GRACE_SECONDS", "30"))
+
+def result_key(campaign_id: str, node_id: str) -> str:
+    return f"campaign:{campaign_id}:node:{node_id}:result"
+
+def attempt_node_id(node_id: str, attempt: int) -> str:
+    # Bản sao (hedge / retry) có node_id riêng -> worker trả kết quả về key riêng,
+    # kết quả đến muộn không lẫn vào lần chạy sau của cùng node
+    return node_id if attempt == 0 else f"{node_id}~{attempt}"
+
+def scenario_policies(scenario: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Scenario từ resource-service (ScenarioRef) giữ policy trong meta_data.node_policies;
+    # metadata của campaign (red teaming, battle) dùng trực tiếp key node_policies
+    scenario = scenario or {}
+    return scenario.get("node_policies") or (scenario.get("meta_data") or {}).get("node_policies") or {}
+
+def resolve_policy(node_type: str, scenario: Optional[Dict[str, Any]] = None,
+                   node_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    overrides = scenario_policies(scenario)
+    policy = dict(DEFAULT_POLICY)
+    for source in (NODE_POLICIES.get("default"), NODE_POLICIES.get(node_type),
+                   overrides.get("default"), overrides.get(node_type), node_data):
+        for field in DEFAULT_POLICY:
+            value = (source or {}).get(field)
+            if value is not None and value != "":
+                policy[field] = int(value) if field in _INT_FIELDS else float(value)
+    policy["name"] = node_type
+    return policy
+
+def _failed(raw: Optional[str]) -> bool:
+    if raw is None:
+        return True
+    try:
+        result = wire.loads(raw)
+    except ValueError:
+        return True
+    return isinstance(result, dict) and result.get("status") in ("failed", "error")
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, name: str, seconds: float):
+        self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(name)
+        if not samples or len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"samples": len(samples), "p50": self.percentile(name, 50), "p95": self.percentile(name, 95)}
+            for name, samples in self._samples.items()
+        }
+
+class NodeDispatcher:
+    """
+    Gửi request cho worker (Kafka) và chờ kết quả (Redis) theo policy của node:
+    timeout mỗi lần thử, retry với backoff, hedged request (bản sao sang partition khác
+    khi chờ lâu hơn percentile latency; kết quả đến trước thắng).
+    """
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self._metrics = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "reattached": 0}
+
+    async def call(self, topic: str, payload: Dict[str, Any], redis_key: str,
+                   policy: Union[float, Dict[str, Any]], memo_key: str = None, replay: bool = False) -> Optional[str]:
+        """
+        Trả về raw result của worker (hoặc None nếu mọi lần thử đều timeout).
+        policy: dict từ resolve_policy() hoặc chỉ timeout (giây).
+        Khi node chạy lại sau restart (resume từ checkpoint) mà request cũ vẫn còn marker pending,
+        không gửi lại (không trả tiền LLM lần nữa) mà chờ tiếp kết quả worker đang/đã xử lý.
+        memo_key: campaign bật memoization -> lưu kết quả; replay=True thì dùng kết quả đã lưu nếu có.
+        """
+        if not isinstance(policy, dict):
+            policy = {**DEFAULT_POLICY, "timeout": float(policy), "name": "default"}
+        if memo_key and replay:
+            cached = await node_memo.get(memo_key)
+            if cached is not None:
+                logger.debug("Replaying memoized result for %s", redis_key)
+                return cached
+
+        self._metrics["calls"] += 1
+        redis = resources.redis_client
+        pending_key = f"{redis_key}:pending"
+        result_raw = None
+        outstanding = await redis.get(pending_key)
+        if outstanding:
+            keys = json.loads(outstanding)
+            keys = keys if isinstance(keys, list) else [redis_key]
+            logger.info("Re-attaching to outstanding request %s", redis_key)
+            self._metrics["reattached"] += 1
+            result_raw = await self._first_result(keys, policy["timeout"])
+        if result_raw is None:
+            try:
+                result_raw = await self._run(topic, payload, redis_key, pending_key, policy)
+            except Exception:
+                await redis.delete(pending_key)
+                raise
+
+        # Giữ marker nếu bị cancel (shutdown) để lần resume sau vẫn re-attach được
+        await redis.delete(pending_key)
+        if memo_key:
+            await node_memo.put(memo_key, result_raw)
+        return result_raw
+
+    async def _first_result(self, keys: List[str], timeout: float) -> Optional[str]:
+        waits = [asyncio.ensure_future(result_dispatcher.wait(key, timeout=timeout)) for key in keys]
+        failed_raw = None
+        try:
+            for fut in asyncio.as_completed(waits):
+                raw = await fut
+                if not _failed(raw):
+                    return raw
+                failed_raw = raw or failed_raw
+        finally:
+            for fut in waits:
+                fut.cancel()
+        return failed_raw
+
+    async def _run(self, topic: str, payload: Dict[str, Any], redis_key: str, pending_key: str,
+                   policy: Dict[str, Any]) -> Optional[str]:
+        attempts = itertools.count()
+        sent_keys: List[str] = []
+        result_raw = None
+        for retry in range(policy["retries"] + 1):
+            if retry:
+                self._metrics["retries"] += 1
+                delay = min(policy["backoff_max"], policy["backoff"] * (2 ** (retry - 1)))
+                logger.info("Retrying %s in %.1fs (attempt %d/%d)", redis_key, delay, retry + 1, policy["retries"] + 1)
+                await asyncio.sleep(delay)
+            raw = await self._hedged_attempt(topic, payload, redis_key, pending_key, policy, attempts, sent_keys)
+            if not _failed(raw):
+                return raw
+            result_raw = raw or result_raw
+        return result_raw
+
+    async def _send(self, topic: str, payload: Dict[str, Any], redis_key: str, pending_key: str,
+                    attempt: int, timeout: float, sent_keys: List[str], partition: Optional[int] = None):
+        node_id = payload.get("node_id")
+        key = redis_key if attempt == 0 else redis_key[:-len(":result")] + f"~{attempt}:result"
+        body = payload if attempt == 0 else {**payload, "node_id": attempt_node_id(node_id, attempt)}
+        sent_keys.append(key)
+        async with resources.redis_client.pipeline(transaction=True) as pipe:
+            # Bỏ kết quả đến muộn của lần chạy trước (đã timeout) trên cùng key
+            pipe.delete(key)
+            # Marker ghi trước khi gửi: process chết sau khi gửi vẫn re-attach được
+            pipe.set(pending_key, json.dumps(sent_keys), ex=int(timeout) + PENDING_GRACE_SECONDS)
+            await pipe.execute()
+        self._metrics["attempts"] += 1
+        metadata = await kafka_producer.send_and_wait(topic, body, partition=partition)
+        return key, metadata
+
+    def _hedge_delay(self, policy: Dict[str, Any]) -> Optional[float]:
+        if not policy["hedge_percentile"] or policy["max_hedges"] <= 0:
+            return None
+        observed = self.latency.percentile(policy["name"], policy["hedge_percentile"])
+        return max(policy["hedge_min_delay"], observed or 0.0)
+
+    async def _hedge_partition(self, topic: str, metadata: Any) -> Optional[int]:
+        # Bản sao đi partition kế tiếp -> nhiều khả năng được consumer khác xử lý
+        if metadata is None or getattr(metadata, "partition", None) is None:
+            return None
+        partitions = sorted(await kafka_producer.partitions_for(topic) or [])
+        if len(partitions) < 2:
+            return None
+        index = partitions.index(metadata.partition) if metadata.partition in partitions else -1
+        return partitions[(index + 1) % len(partitions)]
+
+    async def _hedged_attempt(self, topic: str, payload: Dict[str, Any], redis_key: str, pending_key: str,
+                              policy: Dict[str, Any], attempts, sent_keys: List[str]) -> Optional[str]:
+        timeout = policy["timeout"]
+        started = time.monotonic()
+        deadline = started + timeout
+        primary_key, metadata = await self._send(topic, payload, redis_key, pending_key, next(attempts), timeout, sent_keys)
+        waits = {asyncio.ensure_future(result_dispatcher.wait(primary_key, timeout=timeout)): (primary_key, started)}
+
+        hedge_delay = self._hedge_delay(policy)
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+        hedges = 0
+        failed_raw = None
+        try:
+            while waits:
+                wake = min(deadline, hedge_at) if hedge_at else deadline
+                done, _ = await asyncio.wait(list(waits), timeout=max(0.0, wake - time.monotonic()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    key, sent_at = waits.pop(fut)
+                    raw = fut.result()
+                    if raw is None:
+                        continue
+                    if _failed(raw):
+                        failed_raw = raw
+                        continue
+                    self.latency.record(policy["name"], time.monotonic() - sent_at)
+                    if key != primary_key:
+                        self._metrics["hedge_wins"] += 1
+                    return raw
+
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if hedge_at and now >= hedge_at and waits:
+                    hedges += 1
+                    self._metrics["hedges"] += 1
+                    hedge_at = now + hedge_delay if hedges < policy["max_hedges"] else None
+                    logger.info("Hedging %s after %.1fs", redis_key, now - started)
+                    try:
+                        partition = await self._hedge_partition(topic, metadata)
+                        key, _ = await self._send(topic, payload, redis_key, pending_key, next(attempts),
+                                                  deadline - now, sent_keys, partition=partition)
+                        waits[asyncio.ensure_future(result_dispatcher.wait(key, timeout=deadline - now))] = (key, now)
+                    except Exception as e:
+                        logger.warning("Hedged request for %s failed to send: %s", redis_key, e)
+        finally:
+            for fut in waits:
+                fut.cancel()
+
+        if failed_raw is None:
+            self._metrics["timeouts"] += 1
+        return failed_raw
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._metrics, "latency": self.latency.summary(), "default_policy": DEFAULT_POLICY}
+
+node_dispatcher = NodeDispatcher()
+
+async def dispatch_and_wait(topic: str, payload: Dict[str, Any], redis_key: str,
+                            policy: Union[float, Dict[str, Any]], memo_key: str = None, replay: bool = False) -> Optional[str]:
+    return await node_dispatcher.call(topic, payload, redis_key, policy, memo_key=memo_key, replay=replay)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import app.core.resources as resources
+from app.core import wire
+from app.services.history_store import serialize_message
+
+logger = logging.getLogger(__name__)
+
+# Memo Config from Environment
+# Mode mặc định khi campaign không chỉ định metadata["memoize"]: off | record | replay
+NODE_MEMO_DEFAULT_MODE = os.getenv("NODE_MEMO_DEFAULT_MODE", "off").lower()
+NODE_MEMO_TTL = int(os.getenv("NODE_MEMO_TTL_SECONDS", str(7 * 86400)))
+NODE_MEMO_MAX_ENTRIES = int(os.getenv("NODE_MEMO_MAX_ENTRIES", "50000"))
+KEY_PREFIX = os.getenv("NODE_MEMO_PREFIX", "nodememo:")
+
+MODES = ("off", "record", "replay")
+# Field không ảnh hưởng output của agent/judge (secret xoay vòng, tracing) -> không đưa vào key
+_IGNORED_CONFIG_FIELDS = {
+    "api_key", "api_key_encrypted", "langfuse_public_key", "langfuse_secret_key",
+    "langfuse_host", "langfuse_project_id",
+}
+
+# Redis layout (prefix "nodememo:"):
+#   {hash}   STRING  raw worker result (TTL NODE_MEMO_TTL)
+#   lru      ZSET    hash -> last used ts (eviction theo số lượng)
+
+# Xóa entry đã hết TTL khỏi LRU, rồi entry dùng lâu nhất khi vượt quá max entries
+EVICT_SCRIPT = """
+local lru = KEYS[1]
+local prefix = ARGV[1]
+local max_entries = tonumber(ARGV[2])
+local expired_before = ARGV[3]
+redis.call('ZREMRANGEBYSCORE', lru, '-inf', expired_before)
+local excess = redis.call('ZCARD', lru) - max_entries
+if excess <= 0 then
+    return 0
+end
+local victims = redis.call('ZRANGE', lru, 0, excess - 1)
+for _, h in ipairs(victims) do
+    redis.call('DEL', prefix .. h)
+end
+redis.call('ZREMRANGEBYRANK', lru, 0, excess - 1)
+return #victims
+"""
+
+def _stable_config(config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not config:
+        return None
+    return {k: v for k, v in config.items() if k not in _IGNORED_CONFIG_FIELDS}
+
+def history_hash(messages: List[Any]) -> str:
+    canonical = json.dumps([serialize_message(m) for m in messages], sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class NodeMemo:
+    """
+    Memo kết quả worker (simulation/evaluation) cho regression run lặp lại cùng scenario + agent build.
+    Opt-in theo campaign qua metadata["memoize"]:
+    - "record": luôn gọi worker, lưu kết quả
+    - "replay": trả kết quả đã lưu nếu có (không gửi Kafka, không gọi LLM); miss thì gọi worker rồi lưu
+    Key = hash(kind, agent version, model/target config, instruction hoặc eval config, history).
+    """
+
+    def __init__(self):
+        self._evict = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def mode(self, metadata: Dict[str, Any]) -> str:
+        mode = str(metadata.get("memoize") or NODE_MEMO_DEFAULT_MODE).lower()
+        return mode if mode in MODES else "off"
+
+    def key(self, metadata: Dict[str, Any], kind: str, messages: List[Any], **parts: Any) -> Optional[str]:
+        """
+        Memo key của một lần gọi worker, None nếu campaign không bật memoization.
+        """
+        if self.mode(metadata) == "off":
+            return None
+        identity = {
+            "kind": kind,
+            "agent_id": metadata.get("agent_id"),
+            "agent_version": metadata.get("agent_version"),
+            "history": history_hash(messages),
+            **{
+                name: _stable_config(value) if name.endswith("_config") else value
+                for name, value in parts.items()
+            },
+        }
+        canonical = json.dumps(identity, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(self, memo_key: str) -> Optional[str]:
+        redis = resources.redis_client
+        raw = await redis.get(f"{KEY_PREFIX}{memo_key}")
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        await redis.zadd(f"{KEY_PREFIX}lru", {memo_key: time.time()})
+        return raw
+
+    async def put(self, memo_key: str, raw: Optional[str]):
+        """
+        Lưu raw result; bỏ qua kết quả lỗi / timeout để lần sau gọi lại worker.
+        """
+        if not raw:
+            return
+        try:
+            result = wire.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(result, dict) or result.get("status") == "failed" or result.get("error"):
+            return
+
+        redis = resources.redis_client
+        now = time.time()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"{KEY_PREFIX}{memo_key}", raw, ex=NODE_MEMO_TTL)
+            pipe.zadd(f"{KEY_PREFIX}lru", {memo_key: now})
+            await pipe.execute()
+        self.stores += 1
+
+        if self._evict is None:
+            self._evict = redis.register_script(EVICT_SCRIPT)
+        self.evictions += int(await self._evict(
+            keys=[f"{KEY_PREFIX}lru"], args=[KEY_PREFIX, NODE_MEMO_MAX_ENTRIES, now - NODE_MEMO_TTL]
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "default_mode": NODE_MEMO_DEFAULT_MODE,
+            "max_entries": NODE_MEMO_MAX_ENTRIES,
+            "ttl_seconds": NODE_MEMO_TTL,
+        }
+
+node_memo = NodeMemo()
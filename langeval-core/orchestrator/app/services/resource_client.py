@@ -1,8 +1,10 @@
 
-import httpx
 import os
 import logging
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+from app.core.security import decrypt_value
+from app.services.config_cache import config_cache
+from app.core.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -10,36 +12,40 @@ RESOURCE_SERVICE_URL = os.getenv("RESOURCE_SERVICE_URL", "http://resource-servic
 
 async def get_model_config(model_id: str) -> Optional[Dict]:
     """
-    Fetches ModelRef from Resource Service and decrypts the API Key.
+    Fetches ModelRef from Resource Service (cached, see config_cache).
     """
+    return await config_cache.get(f"model:{model_id}", lambda: _fetch_model_config(model_id))
+
+async def _fetch_model_config(model_id: str) -> Optional[Dict]:
     url = f"{RESOURCE_SERVICE_URL}/resource/models/{model_id}"
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, timeout=10)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                logger.error(f"Failed to fetch model {model_id}: {resp.status_code}")
-                return None
+        resp = await get_http_client().get(url)
+        if resp.status_code == 200:
+            return resp.json()
+        else:
+            logger.error("Failed to fetch model %s: %s", model_id, resp.status_code)
+            return None
     except Exception as e:
-        logger.error(f"Error fetching model config: {e}")
+        logger.error("Error fetching model config: %s", e)
     return None
 
 async def get_agent_config(agent_id: str) -> Optional[Dict]:
     """
-    Fetches Agent config from Resource Service.
+    Fetches Agent config from Resource Service (cached, see config_cache).
     """
+    return await config_cache.get(f"agent:{agent_id}", lambda: _fetch_agent_config(agent_id))
+
+async def _fetch_agent_config(agent_id: str) -> Optional[Dict]:
     url = f"{RESOURCE_SERVICE_URL}/resource/agents/{agent_id}"
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, timeout=10)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                logger.error(f"Failed to fetch agent {agent_id}: {resp.status_code}")
-                return None
+        resp = await get_http_client().get(url)
+        if resp.status_code == 200:
+            return resp.json()
+        else:
+            logger.error("Failed to fetch agent %s: %s", agent_id, resp.status_code)
+            return None
     except Exception as e:
-        logger.error(f"Error fetching agent config: {e}")
+        logger.error("Error fetching agent config: %s", e)
     return None
 
 async def get_adversarial_prompt(strategy: str) -> str:
@@ -67,13 +73,28 @@ async def update_red_teaming_data(campaign_id: str, data: dict):
     """
     url = f"{RESOURCE_SERVICE_URL}/resource/red-teaming/campaigns/{campaign_id}"
     try:
-        async with httpx.AsyncClient() as client:
-            # Resource Service uses PATCH/PUT for updates
-            resp = await client.patch(url, json=data, timeout=10)
-            if resp.status_code != 200:
-                logger.error(f"Failed to update Red Teaming data: {resp.status_code} - {resp.text}")
+        # Resource Service uses PATCH/PUT for updates
+        resp = await get_http_client().patch(url, json=data)
+        if resp.status_code != 200:
+            logger.error("Failed to update Red Teaming data: %s - %s", resp.status_code, resp.text)
     except Exception as e:
-        logger.error(f"Error updating red teaming data: {e}")
+        logger.error("Error updating red teaming data: %s", e)
+
+async def append_red_teaming_progress(campaign_id: str, delta: dict) -> bool:
+    """
+    Gửi delta tiến độ Red Teaming (chỉ log mới + giá trị tuyệt đối) về Resource Service.
+    Trả về True khi Resource Service đã nhận (200); False thì caller gửi lại các log đó ở lần sau.
+    """
+    url = f"{RESOURCE_SERVICE_URL}/resource/red-teaming/campaigns/{campaign_id}/progress"
+    try:
+        resp = await get_http_client().post(url, json=delta)
+        if resp.status_code != 200:
+            logger.error("Failed to append Red Teaming progress: %s - %s", resp.status_code, resp.text)
+            return False
+        return True
+    except Exception as e:
+        logger.error("Error appending red teaming progress: %s", e)
+    return False
 
 async def update_battle_data(campaign_id: str, data: dict):
     """
@@ -81,12 +102,11 @@ async def update_battle_data(campaign_id: str, data: dict):
     """
     url = f"{RESOURCE_SERVICE_URL}/resource/battle/campaigns/{campaign_id}"
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.patch(url, json=data, timeout=10)
-            if resp.status_code != 200:
-                logger.error(f"Failed to update Battle data: {resp.status_code} - {resp.text}")
+        resp = await get_http_client().patch(url, json=data)
+        if resp.status_code != 200:
+            logger.error("Failed to update Battle data: %s - %s", resp.status_code, resp.text)
     except Exception as e:
-        logger.error(f"Error updating battle data: {e}")
+        logger.error("Error updating battle data: %s", e)
 
 async def add_battle_turn(turn_data: dict):
     """
@@ -94,28 +114,57 @@ async def add_battle_turn(turn_data: dict):
     """
     url = f"{RESOURCE_SERVICE_URL}/resource/battle/turns"
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=turn_data, timeout=10)
-            if resp.status_code != 200:
-                logger.error(f"Failed to add battle turn: {resp.status_code} - {resp.text}")
-                return None
-            return resp.json()
+        resp = await get_http_client().post(url, json=turn_data)
+        if resp.status_code != 200:
+            logger.error("Failed to add battle turn: %s - %s", resp.status_code, resp.text)
+            return None
+        return resp.json()
     except Exception as e:
-        logger.error(f"Error adding battle turn: {e}")
+        logger.error("Error adding battle turn: %s", e)
     return None
 
-from cryptography.fernet import Fernet
-from app.core.security import decrypt_value # Added this import
+async def update_tournament_data(tournament_id: str, data: dict):
+    """
+    Cập nhật trạng thái giải đấu Battle Arena về Resource Service.
+    """
+    url = f"{RESOURCE_SERVICE_URL}/resource/battle/tournaments/{tournament_id}"
+    try:
+        resp = await get_http_client().patch(url, json=data)
+        if resp.status_code != 200:
+            logger.error("Failed to update tournament: %s - %s", resp.status_code, resp.text)
+    except Exception as e:
+        logger.error("Error updating tournament: %s", e)
 
-SECRET_KEY = os.getenv("ENCRYPTION_KEY")
-cipher_suite = Fernet(SECRET_KEY.encode()) if SECRET_KEY else None
+async def record_tournament_matches(tournament_id: str, batch: dict):
+    """
+    Gửi các trận mới hoàn thành của giải đấu; Resource Service cập nhật Elo.
+    """
+    url = f"{RESOURCE_SERVICE_URL}/resource/battle/tournaments/{tournament_id}/matches"
+    try:
+        resp = await get_http_client().post(url, json=batch)
+        if resp.status_code != 200:
+            logger.error("Failed to record tournament matches: %s - %s", resp.status_code, resp.text)
+            return None
+        return resp.json()
+    except Exception as e:
+        logger.error("Error recording tournament matches: %s", e)
+    return None
 
-def decrypt_key(encrypted_value: str) -> str:
-    if not encrypted_value or not cipher_suite:
-        return encrypted_value
+async def get_tournament_matches(tournament_id: str) -> Optional[List[Dict]]:
+    """
+    Các trận đã ghi nhận của giải đấu (để tiếp tục giải sau khi job chạy lại). None nếu lỗi.
+    """
+    url = f"{RESOURCE_SERVICE_URL}/resource/battle/tournaments/{tournament_id}/matches"
     try:
-        decrypted_bytes = cipher_suite.decrypt(encrypted_value.encode())
-        return decrypted_bytes.decode()
+        resp = await get_http_client().get(url)
+        if resp.status_code != 200:
+            logger.error("Failed to fetch tournament matches: %s - %s", resp.status_code, resp.text)
+            return None
+        return resp.json()
     except Exception as e:
-        logger.error(f"Decryption failed: {e}")
-        return encrypted_value
+        logger.error("Error fetching tournament matches: %s", e)
+    return None
+
+def decrypt_key(encrypted_value: str) -> str:
+    # Giải mã qua app.core.security (có cache kết quả, tránh Fernet decrypt ở mỗi node)
+    return decrypt_value(encrypted_value)
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import app.core.resources as resources
+
+logger = logging.getLogger(__name__)
+
+# Workers PUBLISH the result key here right after RPUSH-ing the result
+RESULT_CHANNEL = os.getenv("REDIS_RESULT_CHANNEL", "campaign:results")
+# Safety net for lost pub/sub notifications (or workers that do not publish yet)
+SWEEP_INTERVAL = float(os.getenv("RESULT_SWEEP_INTERVAL", "5"))
+
+class ResultDispatcher:
+    """
+    Một subscriber Redis Pub/Sub duy nhất cho mỗi process Orchestrator.
+    Các node đăng ký future theo result key (campaign:{id}:node:{node}:result)
+    thay vì giữ một kết nối BLPOP riêng cho mỗi node đang chờ.
+    """
+
+    def __init__(self):
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+    async def start(self):
+        if self.running or not resources.redis_client:
+            return
+        self._pubsub = resources.redis_client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(RESULT_CHANNEL)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Result dispatcher subscribed to '%s'", RESULT_CHANNEL)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub:
+            try:
+                await self._pubsub.unsubscribe(RESULT_CHANNEL)
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.error("Error closing result dispatcher pubsub: %s", e)
+            self._pubsub = None
+        for waiters in self._waiters.values():
+            for fut in waiters:
+                fut.cancel()
+        self._waiters.clear()
+
+    async def wait(self, redis_key: str, timeout: float) -> Optional[str]:
+        """
+        Chờ kết quả trên redis_key tối đa `timeout` giây.
+        Trả về raw payload (str) hoặc None nếu hết hạn.
+        """
+        if not self.running:
+            # Dispatcher chưa chạy (vd: script/test) -> fallback BLPOP
+            result = await resources.redis_client.blpop(redis_key, timeout=timeout)
+            return result[1] if result else None
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(redis_key, []).append(fut)
+        try:
+            # Result may have been pushed before we registered
+            await self._deliver(redis_key)
+            return await asyncio.wait_for(fut, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._discard(redis_key, fut)
+
+    def _discard(self, redis_key: str, fut: asyncio.Future):
+        waiters = self._waiters.get(redis_key)
+        if waiters and fut in waiters:
+            waiters.remove(fut)
+        if not waiters:
+            self._waiters.pop(redis_key, None)
+
+    def _next_waiter(self, redis_key: str) -> Optional[asyncio.Future]:
+        waiters = self._waiters.get(redis_key)
+        while waiters and waiters[0].done():
+            waiters.pop(0)
+        return waiters[0] if waiters else None
+
+    async def _deliver(self, redis_key: str):
+        if not self._next_waiter(redis_key):
+            return
+        value = await resources.redis_client.lpop(redis_key)
+        if value is None:
+            return
+        fut = self._next_waiter(redis_key)
+        if fut:
+            self._waiters[redis_key].pop(0)
+            fut.set_result(value)
+        else:
+            # Waiter timed out while we were popping: put the result back
+            await resources.redis_client.lpush(redis_key, value)
+
+    async def _run(self):
+        last_sweep = time.monotonic()
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    redis_key = message.get("data")
+                    if isinstance(redis_key, bytes):
+                        redis_key = redis_key.decode("utf-8")
+                    if redis_key in self._waiters:
+                        await self._deliver(redis_key)
+
+                if time.monotonic() - last_sweep >= SWEEP_INTERVAL:
+                    last_sweep = time.monotonic()
+                    for redis_key in list(self._waiters):
+                        await self._deliver(redis_key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Result dispatcher error: %s", e)
+                await asyncio.sleep(1)
+
+result_dispatcher = ResultDispatcher()
@@ -0,0 +1,223 @@
+"""
+Tournament mode cho Battle Arena: N Agent x bộ prompt, xếp cặp round-robin hoặc swiss.
+
+Mỗi Agent chỉ sinh câu trả lời một lần cho mỗi prompt (ResponseCache), câu trả lời đó được dùng lại cho mọi
+cặp đấu của Agent -> N * P lời gọi simulation thay vì 2 * C(N, 2) * P. Judge chạy với số lời gọi worker
+đồng thời giới hạn; kết quả mỗi vòng được gửi về Resource Service, nơi rating Elo được cập nhật dần.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core import wire
+from app.models.schemas import CreateTournamentRequest
+from app.services.workflow import SIMULATION_TOPIC, EVALUATION_TOPIC
+from app.services.resource_client import record_tournament_matches, update_tournament_data, get_tournament_matches
+from app.services.node_dispatch import dispatch_and_wait, resolve_policy, result_key
+
+logger = logging.getLogger(__name__)
+
+TOURNAMENT_CONCURRENCY = int(os.getenv("TOURNAMENT_CONCURRENCY", "8"))
+# Gửi kết quả một vòng về Resource Service: số lần thử và độ trễ cơ sở (backoff lũy thừa)
+RECORD_ATTEMPTS = int(os.getenv("TOURNAMENT_RECORD_ATTEMPTS", "3"))
+RECORD_RETRY_DELAY = float(os.getenv("TOURNAMENT_RECORD_RETRY_DELAY", "1"))
+
+Pairing = Tuple[str, str]
+
+def round_robin_rounds(agent_ids: List[str]) -> List[List[Pairing]]:
+    """Lịch round-robin (circle method): mỗi cặp gặp nhau đúng một lần, mỗi Agent tối đa một trận mỗi vòng."""
+    players: List[Optional[str]] = list(agent_ids)
+    if len(players) % 2:
+        players.append(None)  # bye
+    half = len(players) // 2
+    rounds = []
+    for _ in range(len(players) - 1):
+        pairs = [(players[i], players[-1 - i]) for i in range(half)]
+        rounds.append([(a, b) for a, b in pairs if a is not None and b is not None])
+        players = [players[0], players[-1]] + players[1:-1]
+    return rounds
+
+def swiss_pairings(agent_ids: List[str], points: Dict[str, float], played: Set[frozenset]) -> List[Pairing]:
+    """
+    Một vòng swiss: xếp theo điểm (thứ tự seed khi bằng điểm), ghép mỗi Agent với đối thủ gần điểm nhất
+    chưa gặp. Số Agent lẻ: Agent cuối bảng chưa được ghép nhận bye.
+    """
+    seed = {agent_id: i for i, agent_id in enumerate(agent_ids)}
+    ranked = sorted(agent_ids, key=lambda a: (-points.get(a, 0.0), seed[a]))
+    pairs = []
+    while len(ranked) > 1:
+        first = ranked.pop(0)
+        # Hết đối thủ chưa gặp thì chấp nhận tái đấu với người gần điểm nhất
+        opponent = next((a for a in ranked if frozenset((first, a)) not in played), ranked[0])
+        ranked.remove(opponent)
+        pairs.append((first, opponent))
+    return pairs
+
+def match_id(tournament_id: str, round_index: int, pair: Pairing, prompt_index: int) -> str:
+    return f"{tournament_id}:r{round_index}:{pair[0]}:{pair[1]}:p{prompt_index}"
+
+class ResponseCache:
+    """Câu trả lời của mỗi (Agent, prompt) được sinh đúng một lần và dùng chung cho mọi cặp đấu."""
+
+    def __init__(self, tournament_id: str, prompts: List[str], semaphore: asyncio.Semaphore,
+                 policy: Dict[str, Any]):
+        self.tournament_id = tournament_id
+        self.prompts = prompts
+        self.semaphore = semaphore
+        self.policy = policy
+        self._tasks: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    def get(self, agent_id: str, prompt_index: int) -> "asyncio.Future[Optional[str]]":
+        key = (agent_id, prompt_index)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.ensure_future(self._generate(agent_id, prompt_index))
+        return self._tasks[key]
+
+    @property
+    def generated(self) -> int:
+        return len(self._tasks)
+
+    async def _generate(self, agent_id: str, prompt_index: int) -> Optional[str]:
+        node_id = f"gen_{agent_id}_p{prompt_index}"
+        payload = {
+            "campaign_id": self.tournament_id, "node_id": node_id, "agent_id": agent_id,
+            "instruction": self.prompts[prompt_index]
+        }
+        async with self.semaphore:
+            raw = await dispatch_and_wait(SIMULATION_TOPIC, payload, result_key(self.tournament_id, node_id), self.policy)
+        if not raw:
+            logger.warning("Tournament %s: agent %s timed out on prompt %d", self.tournament_id, agent_id, prompt_index)
+            return None
+        data = wire.loads(raw)
+        messages = data.get("new_messages") or [{}]
+        if data.get("status") == "error":
+            logger.warning("Tournament %s: agent %s failed on prompt %d: %s",
+                           self.tournament_id, agent_id, prompt_index, messages[-1].get("content"))
+            return None
+        return messages[-1].get("content", "")
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+async def play_match(tournament_id: str, round_index: int, pair: Pairing, prompt_index: int, prompt: str,
+                     cache: ResponseCache, semaphore: asyncio.Semaphore, policy: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Chấm một trận (cặp Agent x prompt). None nếu thiếu câu trả lời hoặc judge timeout (trận không được tính)."""
+    agent_a, agent_b = pair
+    response_a, response_b = await asyncio.gather(cache.get(agent_a, prompt_index), cache.get(agent_b, prompt_index))
+    if response_a is None or response_b is None:
+        return None
+
+    # Đảo vị trí A/B ở prompt lẻ để giảm thiên lệch vị trí của judge
+    swapped = prompt_index % 2 == 1
+    first, second = (response_b, response_a) if swapped else (response_a, response_b)
+    node_id = f"judge_r{round_index}_{agent_a}_{agent_b}_p{prompt_index}"
+    payload = {
+        "campaign_id": tournament_id, "node_id": node_id, "user_input": prompt,
+        "response_a": first, "response_b": second
+    }
+    async with semaphore:
+        raw = await dispatch_and_wait(EVALUATION_TOPIC, payload, result_key(tournament_id, node_id), policy)
+    if not raw:
+        logger.warning("Tournament %s: judge timed out for %s", tournament_id, node_id)
+        return None
+
+    verdict = wire.loads(raw)
+    winner = {"A": "agent_a", "B": "agent_b"}.get(verdict.get("winner"), "tie")
+    if swapped and winner != "tie":
+        winner = "agent_b" if winner == "agent_a" else "agent_a"
+    return {
+        "id": match_id(tournament_id, round_index, pair, prompt_index),
+        "round": round_index,
+        "agent_a_id": agent_a,
+        "agent_b_id": agent_b,
+        "prompt_index": prompt_index,
+        "response_a": response_a,
+        "response_b": response_b,
+        "winner": winner,
+        "judge_reasoning": verdict.get("reason", "No reason"),
+    }
+
+def apply_results(points: Dict[str, float], played: Set[frozenset], matches: List[Dict[str, Any]]):
+    """Cộng điểm swiss (thắng 1, hòa 0.5) và ghi nhận cặp đã gặp từ các trận."""
+    for m in matches:
+        score_a = {"agent_a": 1.0, "agent_b": 0.0}.get(m["winner"], 0.5)
+        points[m["agent_a_id"]] = points.get(m["agent_a_id"], 0.0) + score_a
+        points[m["agent_b_id"]] = points.get(m["agent_b_id"], 0.0) + 1.0 - score_a
+        played.add(frozenset((m["agent_a_id"], m["agent_b_id"])))
+
+async def record_round(tournament_id: str, round_index: int, matches: List[Dict[str, Any]]):
+    """
+    Gửi các trận của một vòng, thử lại khi lỗi (match id cố định nên gửi lại không cộng Elo hai lần).
+    Hết lượt thử thì raise: vòng chưa được ghi nhận không được tính là đã xong.
+    """
+    for attempt in range(RECORD_ATTEMPTS):
+        if await record_tournament_matches(tournament_id, {"matches": matches, "status": "running"}) is not None:
+            return
+        if attempt + 1 < RECORD_ATTEMPTS:
+            await asyncio.sleep(RECORD_RETRY_DELAY * 2 ** attempt)
+    raise RuntimeError(f"Tournament {tournament_id}: failed to record round {round_index}")
+
+def _swiss_rounds(req: CreateTournamentRequest) -> int:
+    return req.rounds or max(1, (len(req.agent_ids) - 1).bit_length())
+
+async def run_tournament(req: CreateTournamentRequest) -> Dict[str, Any]:
+    tournament_id = req.tournament_id
+    agent_ids = list(dict.fromkeys(req.agent_ids))
+    concurrency = max(1, int(req.concurrency or TOURNAMENT_CONCURRENCY))
+    policy = resolve_policy("battle", req.metadata)
+    semaphore = asyncio.Semaphore(concurrency)
+    cache = ResponseCache(tournament_id, req.prompts, semaphore, policy)
+
+    swiss = req.format == "swiss"
+    schedule = None if swiss else round_robin_rounds(agent_ids)
+    total_rounds = _swiss_rounds(req) if swiss else len(schedule)
+    points: Dict[str, float] = {agent_id: 0.0 for agent_id in agent_ids}
+    played: Set[frozenset] = set()
+    failed = 0
+
+    # Job chạy lại (restart / requeue): các vòng đã ghi nhận không chạy lại. Cặp đấu swiss của vòng sau
+    # phụ thuộc điểm của các vòng trước, nên điểm được dựng lại từ các trận đã lưu thay vì judge lại.
+    recorded = await get_tournament_matches(tournament_id) or []
+    finished_rounds = {m["round"] for m in recorded}
+    apply_results(points, played, recorded)
+    completed = len(recorded)
+    if finished_rounds:
+        logger.info("Tournament %s: resuming after rounds %s", tournament_id, sorted(finished_rounds))
+
+    logger.info("Tournament %s: %d agents, %d prompts, %s, %d rounds, concurrency=%d",
+                tournament_id, len(agent_ids), len(req.prompts), req.format, total_rounds, concurrency)
+    await update_tournament_data(tournament_id, {"status": "running"})
+    try:
+        for round_index in range(total_rounds):
+            if round_index in finished_rounds:
+                continue
+            pairs = swiss_pairings(agent_ids, points, played) if swiss else schedule[round_index]
+            results = await asyncio.gather(*[
+                play_match(tournament_id, round_index, pair, prompt_index, prompt, cache, semaphore, policy)
+                for pair in pairs
+                for prompt_index, prompt in enumerate(req.prompts)
+            ])
+            matches = [m for m in results if m]
+            failed += len(results) - len(matches)
+            completed += len(matches)
+            for pair in pairs:
+                played.add(frozenset(pair))
+            apply_results(points, played, matches)
+            await record_round(tournament_id, round_index, matches)
+            logger.info("Tournament %s: round %d/%d done (%d matches, %d failed)",
+                        tournament_id, round_index + 1, total_rounds, len(matches), len(results) - len(matches))
+    except Exception:
+        await update_tournament_data(tournament_id, {"status": "failed"})
+        raise
+    finally:
+        cache.close()
+
+    status = "completed" if completed else "failed"
+    await update_tournament_data(tournament_id, {
+        "status": status,
+        "meta_data": {**req.metadata, "failed_matches": failed, "generated_responses": cache.generated}
+    })
+    return {"status": status, "completed_matches": completed, "failed_matches": failed,
+            "generated_responses": cache.generated, "points": points}
@@ -1,20 +1,43 @@
 from langgraph.graph import StateGraph, END
+from langgraph.types import interrupt
 from typing import Annotated, Dict, Any, List
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 import asyncio
 import json
 import os
-import httpx
+from app.core.http_client import get_http_client
 from datetime import datetime
 import operator
+import hashlib
+import logging
+import time
+from collections import OrderedDict
 
 # Kafka Topics from Environment
 SIMULATION_TOPIC = os.getenv("KAFKA_TOPIC_SIMULATION_REQUESTS", "simulation.requests")
 EVALUATION_TOPIC = os.getenv("KAFKA_TOPIC_EVALUATION_REQUESTS", "evaluation.requests")
 
+# Compiled Graph Cache (LRU, keyed by scenario content hash)
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "128"))
+# Phiên bản execution plan của resource-service mà orchestrator hiểu (scenario_compiler.PLAN_VERSION)
+PLAN_VERSION = 1
+# Wait Node ngắn hơn ngưỡng này sleep trực tiếp; dài hơn thì dừng graph và dùng durable timer
+WAIT_INLINE_SECONDS = float(os.getenv("WAIT_INLINE_SECONDS", "5"))
+
 from app.models.schemas import CampaignState
 import app.core.resources as resources
+from app.core import wire
+from app.core.log import brief
 from app.services.checkpointer import get_checkpointer
+from app.services.expression import compile_expression, CompiledExpression, ExpressionError
+from app.services.code_executor import code_executor
+from app.services.history_store import history_store
+from app.services.campaign_index import campaign_index
+from app.services.node_memo import node_memo
+from app.services.durable_timers import WAIT_INTERRUPT
+from app.services.node_dispatch import dispatch_and_wait, resolve_policy, result_key, scenario_policies
+
+logger = logging.getLogger(__name__)
 
 # --- Helper Functions ---
 def substitute_template(text: str, variables: dict) -> str:
@@ -32,6 +55,11 @@ def substitute_template(text: str, variables: dict) -> str:
     return text
 
 async def update_campaign_status(campaign_id: str, status: str, score: float = None, metrics: dict = None):
+    try:
+        # List view đọc từ campaign index -> cập nhật trước (nhanh, không phụ thuộc DB)
+        await campaign_index.update(campaign_id, status=status, current_score=score)
+    except Exception as e:
+        logger.warning("Index update failed for %s: %s", campaign_id, e)
     try:
         from app.db.engine import AsyncSessionLocal
         from app.db.repository import CampaignRepository
@@ -39,21 +67,21 @@ async def update_campaign_status(campaign_id: str, status: str, score: float = N
         async with AsyncSessionLocal() as session:
             repo = CampaignRepository(session)
             await repo.update_status(campaign_id, status, score, metrics)
-            print(f"DB Updated: {campaign_id} -> {status}")
+            logger.info("DB updated: %s -> %s", campaign_id, status)
     except Exception as e:
-        print(f"DB Update Failed for {campaign_id}: {e}")
+        logger.error("DB update failed for %s: %s", campaign_id, e)
 
 # --- Node Handlers ---
 
 # 1. Start Node
 async def node_start(state: CampaignState):
-    print(f"--- START NODE: Campaign {state['campaign_id']} ---")
+    logger.info("Start node: campaign %s", state['campaign_id'])
     await update_campaign_status(state['campaign_id'], "running")
     return {"status": "running"}
 
 # 2. Persona Node (Send to Simulator to initialize context)
 async def node_persona(state: CampaignState, config: dict):
-    print(f"--- PERSONA NODE: {config.get('label', 'Unnamed')} ---")
+    logger.info("Persona node: %s", config.get('label', 'Unnamed'))
     
     # Store peronsa config in state for later tasks
     persona_data = config.get("data", {})
@@ -66,9 +94,9 @@ async def node_persona(state: CampaignState, config: dict):
     }
 
 # 3. Task Node (Send to Simulator)
-async def node_task(state: CampaignState, config: dict):
+async def node_task(state: CampaignState, config: dict, policy: dict = None):
     campaign_id = state['campaign_id']
-    print(f"--- TASK NODE: {config.get('label')} ---")
+    logger.info("Task node: %s", config.get('label'))
     
     if not resources.producer:
         return {"error": "Kafka Producer Not Ready"}
@@ -81,7 +109,7 @@ async def node_task(state: CampaignState, config: dict):
     # Config Data
     node_data = config.get("data", {})
     raw_instruction = node_data.get("instruction") or node_data.get("prompt", "")
-    timeout_seconds = int(node_data.get("timeout", 60))
+    policy = policy or resolve_policy("task", node_data=node_data)
     output_variable = node_data.get("output_variable")
     
     # Template Substitution
@@ -109,7 +137,7 @@ async def node_task(state: CampaignState, config: dict):
                 "base_url": model_ref.get("base_url") or "https://api.openai.com/v1",
                 "provider": model_ref.get("provider")
             }
-            print(f"DEBUG: Injected Dynamic Model: {model_config.get('model')}")
+            logger.debug("Injected dynamic model: %s", model_config.get('model'))
 
     # Fallback to defaults if no dynamic model
     if not model_config and not target_config.get("api_key") and agent_id:
@@ -125,26 +153,30 @@ async def node_task(state: CampaignState, config: dict):
         "instruction": instruction, # Current task (Substituted)
         "target_config": target_config,
         "model_config": model_config, # NEW FIELD
-        "history": [m.dict() if hasattr(m, 'dict') else m for m in state.get("messages", [])],
+        **await history_store.payload_fields(campaign_id, state.get("messages", [])),
         "language": language
     }
     
-    # Send to Kafka
-    print(f"DEBUG: Sending Task Payload to Kafka: {json.dumps(payload)}", flush=True)
-    await resources.producer.send_and_wait(SIMULATION_TOPIC, json.dumps(payload).encode('utf-8'))
-    
-    # Wait for Result (Sync block using Redis BLPOP)
-    redis_key = f"campaign:{campaign_id}:node:{config['id']}:result"
-    
     if not resources.redis_client:
          return {"error": "Redis Client Not Ready"}
 
-    result_raw = await resources.redis_client.blpop(redis_key, timeout=timeout_seconds)
+    # Send to Kafka, wait for Result (resolved by the shared result dispatcher)
+    logger.debug("Sending task payload to Kafka: %s", brief(payload))
+    redis_key = result_key(campaign_id, config['id'])
+    memo_key = node_memo.key(
+        metadata, "task", state.get("messages", []),
+        instruction=instruction, persona=persona_data, language=language,
+        target_config=target_config, model_config=model_config
+    )
+    result_raw = await dispatch_and_wait(
+        SIMULATION_TOPIC, payload, redis_key, policy,
+        memo_key=memo_key, replay=node_memo.mode(metadata) == "replay"
+    )
     
     if not result_raw:
         return {"error": "Task Timeout"}
         
-    result_data = json.loads(result_raw[1])
+    result_data = wire.loads(result_raw)
     
     # Update Messages in State
     new_messages = result_data.get("new_messages", [])
@@ -173,8 +205,8 @@ async def node_task(state: CampaignState, config: dict):
     return updates
 
 # 4. Condition Node
-async def node_condition(state: CampaignState, config: dict):
-    print(f"--- CONDITION NODE: {config.get('label')} ---")
+async def node_condition(state: CampaignState, config: dict, compiled: CompiledExpression = None):
+    logger.info("Condition node: %s", config.get('label'))
     data = config.get("data", {})
     logic_type = data.get("logicType", "keyword")
     
@@ -199,43 +231,39 @@ async def node_condition(state: CampaignState, config: dict):
             result = "true"
             
     elif logic_type == "expression":
-        expression = data.get("expression", "")
-        # Safe eval context
-        eval_context = {
-            "content": content,
-            "variables": variables,
-            "len": len,
-            "metadata": metadata
-        }
         try:
-            # WARNING: eval is dangerous. In production use simpleeval or similar.
-            # Allowing basic python expressions for demo.
-            if eval(expression, {"__builtins__": {}}, eval_context):
-                result = "true"
-            else:
-                result = "false"
+            # Đã compile lúc build graph; fallback compile (có cache) nếu gọi trực tiếp
+            expression = compiled or compile_expression(data.get("expression", ""))
+            result = "true" if expression.evaluate(content, variables, metadata) else "false"
         except Exception as e:
-            print(f"Expression Eval Failed: {e}")
+            logger.warning("Expression eval failed: %s", e)
             result = "error"
 
     # Allow other logic types here (LLM Judge etc)
     
-    print(f"Condition ({logic_type}): -> {result}")
+    logger.debug("Condition (%s): -> %s", logic_type, result)
     return {"_condition_result": result}
 
 # 5. Wait Node
 async def node_wait(state: CampaignState, config: dict):
-    print(f"--- WAIT NODE: {config.get('label')} ---")
+    logger.info("Wait node: %s", config.get('label'))
     data = config.get("data", {})
     duration = int(data.get("duration", 5))
-    print(f"Sleeping for {duration} seconds...")
-    await asyncio.sleep(duration)
+    if duration <= WAIT_INLINE_SECONDS:
+        logger.debug("Sleeping for %s seconds", duration)
+        await asyncio.sleep(duration)
+        return {}
+
+    # Wait dài: dừng graph, durable timer (Redis) resume thread khi đến hạn.
+    # Khi resume node chạy lại từ đầu, interrupt() trả về ngay giá trị resume.
+    resume_at = interrupt({"type": WAIT_INTERRUPT, "node": config.get("id"), "resume_at": time.time() + duration})
+    logger.debug("Wait node resumed (due %s)", resume_at)
     return {}
 
 # 6. Expectation Node
-async def node_expectation(state: CampaignState, config: dict):
+async def node_expectation(state: CampaignState, config: dict, policy: dict = None):
     campaign_id = state['campaign_id']
-    print(f"--- EXPECTATION NODE: {config.get('label')} ---")
+    logger.info("Expectation node: %s", config.get('label'))
     
     if not resources.producer:
          return {"error": "Kafka Producer Not Ready"}
@@ -261,24 +289,28 @@ async def node_expectation(state: CampaignState, config: dict):
     payload = {
         "campaign_id": campaign_id,
         "node_id": config.get("id"),
-        "history": [m.dict() if hasattr(m, 'dict') else m for m in state.get("messages", [])],
+        **await history_store.payload_fields(campaign_id, state.get("messages", [])),
         "eval_config": data, # Contains provider, metrics, criteria
         "model_config": model_config # NEW FIELD
     }
 
-    # Send to Kafka
-    await resources.producer.send_and_wait(EVALUATION_TOPIC, json.dumps(payload).encode('utf-8'))
+    # Send to Kafka, wait for Result
+    redis_key = result_key(campaign_id, config['id'])
+    logger.debug("Waiting for eval result on %s", redis_key)
     
-    # Wait for Result
-    redis_key = f"campaign:{campaign_id}:node:{config['id']}:result"
-    print(f"Waiting for Eval result on {redis_key}...")
-    
-    result_raw = await resources.redis_client.blpop(redis_key, timeout=60)
+    memo_key = node_memo.key(
+        metadata, "expectation", state.get("messages", []),
+        eval_config=data, model_config=model_config
+    )
+    result_raw = await dispatch_and_wait(
+        EVALUATION_TOPIC, payload, redis_key, policy or resolve_policy("expectation", node_data=data),
+        memo_key=memo_key, replay=node_memo.mode(metadata) == "replay"
+    )
     
     if not result_raw:
         return {"error": "Evaluation Timeout"}
         
-    result_data = json.loads(result_raw[1])
+    result_data = wire.loads(result_raw)
     # Handle key mismatch: EvaluationWorker uses 'total_score'
     score = result_data.get("total_score")
     if score is None:
@@ -292,6 +324,10 @@ async def node_expectation(state: CampaignState, config: dict):
     current_sum = prev_sum + float(score)
     count = state.get("expectations_count", 1)
     live_display_score = (current_sum / count) * 10.0
+    try:
+        await campaign_index.update(state['campaign_id'], current_score=live_display_score)
+    except Exception as e:
+        logger.warning("Index update failed for %s: %s", state['campaign_id'], e)
 
     # Results for state update (Reducers will handle summation/merging)
     return {
@@ -303,7 +339,7 @@ async def node_expectation(state: CampaignState, config: dict):
 
 # 7. Tool Node (HTTP Request)
 async def node_tool(state: CampaignState, config: dict):
-    print(f"--- TOOL NODE: {config.get('label')} ---")
+    logger.info("Tool node: %s", config.get('label'))
     data = config.get("data", {})
     
     # Context
@@ -322,41 +358,41 @@ async def node_tool(state: CampaignState, config: dict):
         headers = json.loads(headers_str) if headers_str else {}
         body = json.loads(body_str) if body_str else {}
     except json.JSONDecodeError as e:
-        print(f"Tool JSON Parse Error: {e}")
+        logger.warning("Tool JSON parse error: %s", e)
         return {"error": f"Invalid JSON in headers/body: {e}"}
 
-    print(f"Executing Tool: {method} {url}")
+    logger.debug("Executing tool: %s %s", method, url)
     
     try:
-        async with httpx.AsyncClient() as client:
-            if method == "GET":
-                resp = await client.get(url, headers=headers, timeout=30)
-            else:
-                resp = await client.post(url, headers=headers, json=body, timeout=30)
-                
-            resp.raise_for_status()
-            result = resp.json()
-            print(f"Tool Result: {str(result)[:100]}...")
+        client = get_http_client("external")
+        if method == "GET":
+            resp = await client.get(url, headers=headers)
+        else:
+            resp = await client.post(url, headers=headers, json=body)
             
-            updates = {}
-            if output_var:
-                updates["metadata"] = {
-                    **metadata,
-                    "variables": {
-                        **variables,
-                        output_var: result
-                    }
+        resp.raise_for_status()
+        result = resp.json()
+        logger.debug("Tool result: %s", brief(result, 100))
+        
+        updates = {}
+        if output_var:
+            updates["metadata"] = {
+                **metadata,
+                "variables": {
+                    **variables,
+                    output_var: result
                 }
-            return updates
+            }
+        return updates
 
     except Exception as e:
-        print(f"Tool Execution Warning: {e}")
+        logger.warning("Tool execution failed: %s", e)
         # Decide if we fail the node or just continue with error
         return {"error": str(e)}
 
 # 8. Code Node (Python Exec)
 async def node_code(state: CampaignState, config: dict):
-    print(f"--- CODE NODE: {config.get('label')} ---")
+    logger.info("Code node: %s", config.get('label'))
     data = config.get("data", {})
     code = data.get("code", "")
     input_vars = data.get("inputKeys", "").split(",")
@@ -366,12 +402,10 @@ async def node_code(state: CampaignState, config: dict):
     metadata = state.get("metadata", {})
     variables = metadata.get("variables", {})
     
-    # Prepare Execution Context
+    # Prepare Execution Context (chỉ dữ liệu, được pickle sang code worker process)
     exec_context = {
         "variables": variables,
-        "metadata": metadata,
-        "print": print,
-        "json": json
+        "metadata": metadata
     }
     
     # Add input variables to local scope for easier access
@@ -384,46 +418,43 @@ async def node_code(state: CampaignState, config: dict):
             exec_context[var] = variables[var]
         else:
             # Initialize to None if missing, to avoid NameError
-            print(f"Warning: Input variable '{var}' not found in state.")
+            logger.warning("Input variable '%s' not found in state", var)
             exec_context[var] = None
             
-    print(f"Executing Code: {code[:50]}...")
-    try:
-        # EXECUTION (WARNING: Unsafe)
-        exec(code, {"__builtins__": {}}, exec_context)
-        
-        # Extract Outputs
-        updates = {}
-        new_variables = {}
-        
-        for var in output_vars:
-            var = var.strip()
-            if var and var in exec_context:
-                new_variables[var] = exec_context[var]
-        
-        if new_variables:
-            updates["metadata"] = {
-                **metadata,
-                "variables": {
-                    **variables,
-                    **new_variables
-                }
+    logger.debug("Executing code: %s", brief(code, 50))
+    output_keys = [var.strip() for var in output_vars if var.strip()]
+    
+    # EXECUTION: isolated process pool (timeout + memory cap), không chặn event loop
+    result = await code_executor.run(code, exec_context, output_keys, timeout=data.get("timeout"))
+    logger.debug("Code executor: queue=%.1fms exec=%.1fms", result.get('queue_ms', 0), result.get('exec_ms', 0))
+    
+    if not result["ok"]:
+        logger.warning("Code execution failed: %s", result['error'])
+        return {"error": result["error"]}
+    
+    # Extract Outputs
+    updates = {}
+    new_variables = result["outputs"]
+    
+    if new_variables:
+        updates["metadata"] = {
+            **metadata,
+            "variables": {
+                **variables,
+                **new_variables
             }
-        
-        print(f"Code Result vars: {list(new_variables.keys())}")
-        return updates
-
-    except Exception as e:
-        print(f"Code Execution Failed: {e}")
-        return {"error": str(e)}
+        }
+    
+    logger.debug("Code result vars: %s", list(new_variables.keys()))
+    return updates
 
 # 9. Generic / Transform (Placeholder)
 async def node_generic(state: CampaignState, config: dict):
-    print(f"--- GENERIC NODE ({config.get('data', {}).get('category')}): {config.get('label')} ---")
+    logger.info("Generic node (%s): %s", config.get('data', {}).get('category'), config.get('label'))
     return {}
 
 async def node_end(state: CampaignState, config: dict):
-    print(f"--- END NODE ---")
+    logger.info("End node")
     
     # Calculate final scaled score (0.0 - 10.0)
     score_sum = state.get("raw_score_sum", 0.0)
@@ -435,7 +466,7 @@ async def node_end(state: CampaignState, config: dict):
     
     metrics = state.get("metrics")
     
-    print(f"Final Aggregated Score: {final_score}/10 (Sum: {score_sum}, Count: {expectations_count})")
+    logger.info("Final aggregated score: %s/10 (sum: %s, count: %s)", final_score, score_sum, expectations_count)
     
     # Pass final score and metrics to DB
     await update_campaign_status(state['campaign_id'], "completed", score=final_score, metrics=metrics)
@@ -453,15 +484,128 @@ def condition_router(state: CampaignState):
 
 # --- Graph Builder ---
 
+# UI-only ReactFlow fields that do not affect graph execution
+_LAYOUT_NODE_KEYS = {"position", "positionAbsolute", "width", "height", "selected", "dragging"}
+_LAYOUT_EDGE_KEYS = {"id", "type", "animated", "selected", "style", "label"}
+
+_graph_cache: "OrderedDict[str, Any]" = OrderedDict()
+
+def scenario_hash(scenario_config: dict = None) -> str:
+    """
+    Canonical content hash of a scenario's nodes/edges (layout fields ignored).
+    """
+    if not scenario_config:
+        return "default"
+
+    nodes = [
+        {k: v for k, v in n.items() if k not in _LAYOUT_NODE_KEYS}
+        for n in scenario_config.get("nodes", [])
+    ]
+    edges = [
+        {k: v for k, v in e.items() if k not in _LAYOUT_EDGE_KEYS}
+        for e in scenario_config.get("edges", [])
+    ]
+    nodes.sort(key=lambda n: str(n.get("id")))
+    edges.sort(key=lambda e: (str(e.get("source")), str(e.get("target")), str(e.get("sourceHandle"))))
+
+    canonical = json.dumps({"nodes": nodes, "edges": edges}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def clear_graph_cache():
+    _graph_cache.clear()
+
+def normalize_node_type(node: dict) -> str:
+    # Data might have 'category' or 'type' inside 'data', or top-level 'type' ('customNode' wrapper)
+    node_type = (node.get("data") or {}).get("category") or node.get("type") or "default"
+    return node_type.replace("customNode", "").lower()
+
+def execution_plan(scenario_config: dict = None) -> dict:
+    """
+    Execution plan của scenario: plan do resource-service biên dịch lúc lưu nếu có
+    (cùng PLAN_VERSION), ngược lại dựng plan tối thiểu từ nodes/edges (scenario cũ).
+    """
+    plan = (scenario_config or {}).get("execution_plan") or {}
+    if plan.get("version") == PLAN_VERSION and plan.get("hash"):
+        return plan
+
+    nodes = [
+        {"id": n["id"], "type": normalize_node_type(n), "data": n.get("data") or {}}
+        for n in (scenario_config or {}).get("nodes", [])
+    ]
+    return {
+        "version": PLAN_VERSION,
+        "hash": scenario_hash(scenario_config),
+        "entry": next((n["id"] for n in nodes if n["type"] == "start"), None),
+        "nodes": nodes,
+        "edges": [
+            {"source": e["source"], "target": e["target"], "handle": e.get("sourceHandle") or "default"}
+            for e in (scenario_config or {}).get("edges", [])
+        ],
+        "expectations_count": sum(1 for n in nodes if n["type"] == "expectation"),
+        "required_variables": [],
+    }
+
+def graph_cache_key(scenario_config: dict = None, plan: dict = None) -> str:
+    """
+    Cache key of a compiled graph: plan hash plus the scenario's node policies,
+    since policies are bound into the node handlers at build time.
+    """
+    key = plan["hash"] if plan else scenario_hash(scenario_config)
+    policies = scenario_policies(scenario_config)
+    if policies:
+        canonical = json.dumps(policies, sort_keys=True, separators=(",", ":"), default=str)
+        key += ":" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+    return key
+
 def build_dynamic_graph(scenario_config: dict = None):
     """
-    Builds a LangGraph StateGraph from the Scenario JSON structure.
+    Returns a compiled graph for the scenario, reusing a cached instance
+    when a scenario with identical nodes/edges and node policies was compiled before.
+    """
+    plan = execution_plan(scenario_config) if scenario_config else None
+    key = graph_cache_key(scenario_config, plan)
+    app = _graph_cache.get(key)
+    if app is not None:
+        _graph_cache.move_to_end(key)
+        return app
+
+    app = _compile_dynamic_graph(scenario_config, plan)
+
+    # Only cache graphs bound to the shared checkpointer
+    if getattr(app, "checkpointer", None):
+        _graph_cache[key] = app
+        while len(_graph_cache) > GRAPH_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
+    return app
+
+def _bind_handler(node_type: str, node: dict, compiled: CompiledExpression = None, policy: dict = None):
+    # Handler được chọn một lần lúc build graph, không phân loại lại mỗi lần node chạy
+    handlers = {
+        "start": lambda state: node_start(state),
+        "persona": lambda state: node_persona(state, node),
+        "task": lambda state: node_task(state, node, policy),
+        "tool": lambda state: node_tool(state, node),
+        "code": lambda state: node_code(state, node),
+        "condition": lambda state: node_condition(state, node, compiled),
+        "wait": lambda state: node_wait(state, node),
+        "expectation": lambda state: node_expectation(state, node, policy),
+        "end": lambda state: node_end(state, node),
+    }
+    call = handlers.get(node_type) or (lambda state: node_generic(state, node))
+
+    async def handler(state):
+        return await call(state)
+    return handler
+
+def _compile_dynamic_graph(scenario_config: dict = None, plan: dict = None):
+    """
+    Builds a LangGraph StateGraph from the scenario's execution plan.
     """
     workflow = StateGraph(CampaignState)
     
     if not scenario_config:
         # Fallback to simple default graph (Simulation -> Evaluation)
-        print("No scenario config provided. Building default graph.")
+        logger.info("No scenario config provided. Building default graph.")
         # Minimal dummy graph to accessing checkpointer
         workflow.add_node("start", lambda s: {})
         workflow.add_node("end", lambda s: {})
@@ -470,74 +614,50 @@ def build_dynamic_graph(scenario_config: dict = None):
         checkpointer = get_checkpointer()
         return workflow.compile(checkpointer=checkpointer)
 
-    nodes = scenario_config.get("nodes", [])
-    edges = scenario_config.get("edges", [])
+    plan = plan or execution_plan(scenario_config)
+    nodes = plan["nodes"]
+    edges = plan["edges"]
     
-    print(f"Building Graph with {len(nodes)} nodes and {len(edges)} edges.")
+    logger.info("Building graph with %d nodes and %d edges", len(nodes), len(edges))
     
     # 1. Add Nodes
-    node_map = {n["id"]: n for n in nodes}
+    node_types = {n["id"]: n["type"] for n in nodes}
     
     for node in nodes:
         node_id = node["id"]
-        # Determine Node Type
-        # Data might have 'category' or 'type' inside 'data', or top-level 'type'
-        # Normalize type
-        node_type = node.get("data", {}).get("category") or node.get("type", "default")
-        node_type = node_type.replace("customNode", "").lower() # Handle 'customNode' wrapper if present
+        node_type = node["type"]
+        node_data = node.get("data", {})
         
-        # We need to bind the config to the handler
-        # Using a closure/wrapper
-        async def handler_wrapper(state, node_config=node):
-            # Select underlying handler based on type
-            n_type = node_config.get("data", {}).get("category") or node_config.get("type", "default")
-            n_type = n_type.lower()
-            
-            if n_type == "start": return await node_start(state)
-            if n_type == "persona": return await node_persona(state, node_config)
-            if n_type == "task": return await node_task(state, node_config)
-            if n_type == "tool": return await node_tool(state, node_config)
-            if n_type == "code": return await node_code(state, node_config) # NEW
-            if n_type == "condition": return await node_condition(state, node_config)
-            if n_type == "wait": return await node_wait(state, node_config)
-            if n_type == "expectation": return await node_expectation(state, node_config)
-            if n_type == "end": return await node_end(state, node_config)
-            
-            return await node_generic(state, node_config)
-
-        workflow.add_node(node_id, handler_wrapper)
+        # Condition expressions are parsed/validated once here: invalid ones fail the build
+        compiled = None
+        if node_type == "condition" and node_data.get("logicType", "keyword") == "expression":
+            try:
+                compiled = compile_expression(node_data.get("expression", ""))
+            except ExpressionError as e:
+                raise ExpressionError(f"Condition node '{node_data.get('label') or node_id}': {e}") from e
+
+        # Timeout / retry / hedging của node gọi worker (scenario + node data)
+        policy = resolve_policy(node_type, scenario_config, node_data) if node_type in ("task", "expectation") else None
+
+        workflow.add_node(node_id, _bind_handler(node_type, node, compiled, policy))
         
-        # Set Entry Point
-        if node_type == "start":
-            workflow.set_entry_point(node_id)
+    # Set Entry Point
+    if plan.get("entry"):
+        workflow.set_entry_point(plan["entry"])
 
     # 2. Add Edges
     # Group edges by source to handle conditional logic
     edges_by_source = {}
     for edge in edges:
-        src = edge["source"]
-        if src not in edges_by_source: edges_by_source[src] = []
-        edges_by_source[src].append(edge)
+        edges_by_source.setdefault(edge["source"], []).append(edge)
         
     for source_id, source_edges in edges_by_source.items():
-        source_node = node_map.get(source_id)
-        if not source_node: continue
-        
-        node_type = source_node.get("data", {}).get("category") or source_node.get("type", "default")
-        node_type = node_type.lower()
+        node_type = node_types.get(source_id)
+        if not node_type: continue
         
         if node_type == "condition":
-            # Conditional Edge Logic
-            mapping = {}
-            for edge in source_edges:
-                # Handle ID is usually 'true', 'false', 'a', 'b' etc.
-                # ReactFlow edges have 'sourceHandle' property
-                handle = edge.get("sourceHandle") # e.g. "true", "false"
-                target = edge["target"]
-                
-                # If handle is missing (single output), map 'default' or assume true
-                key = handle if handle else "default"
-                mapping[key] = target
+            # Conditional Edge Logic: handle 'true', 'false', ... ('default' for a single output)
+            mapping = {edge["handle"]: edge["target"] for edge in source_edges}
                 
             # Add Conditional Edge using router
             # Router must return keys present in mapping
@@ -555,12 +675,12 @@ def build_dynamic_graph(scenario_config: dict = None):
 
     # 3. Compile
     try:
-        print("Initializing Checkpointer...")
+        logger.debug("Initializing checkpointer")
         checkpointer = get_checkpointer()
-        print(f"Checkpointer initialized: {checkpointer}")
+        logger.debug("Checkpointer initialized: %s", checkpointer)
         app = workflow.compile(checkpointer=checkpointer)
-        print("Graph compiled with checkpointer.")
+        logger.debug("Graph compiled with checkpointer")
         return app
     except Exception as e:
-        print(f"Checkpointer init failed: {e}")
+        logger.error("Checkpointer init failed: %s", e)
         return workflow.compile()
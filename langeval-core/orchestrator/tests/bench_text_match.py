@@ -0,0 +1,106 @@
+"""
+Micro-benchmark cho app/core/text_match.py: throughput quét (MB/s) của matcher biên dịch sẵn
+so với cách cũ (`any(kw in text.lower() ...)` và re.sub gọi lại mỗi lần).
+
+    python tests/bench_text_match.py [--mb 8] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.text_match import (
+    KeywordMatcher, SAFETY_REFUSAL_KEYWORDS, PII_PATTERNS, safety_refusal_matcher, pii_patterns
+)
+
+WORDS = (
+    "the agent replied with a detailed answer about refunds shipping and order status "
+    "khách hàng hỏi về chính sách đổi trả giao hàng và tình trạng đơn hàng của họ"
+).split()
+
+def make_corpus(size_mb: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts, length = [], 0
+    while length < target:
+        word = rng.choice(WORDS)
+        roll = rng.random()
+        if roll < 0.001:
+            word = "contact john.doe@example.com"
+        elif roll < 0.002:
+            word = "call 0912345678"
+        elif roll < 0.003:
+            word = rng.choice(SAFETY_REFUSAL_KEYWORDS).upper()
+        parts.append(word)
+        length += len(word.encode("utf-8")) + 1
+    return " ".join(parts)
+
+def large_keyword_list(count: int = 300, seed: int = 11):
+    # Danh sách lớn (vd blocklist) để thấy chi phí tăng theo số keyword
+    rng = random.Random(seed)
+    generated = {"".join(rng.choice("abcdeghiklmnoprstuy") for _ in range(rng.randint(4, 9))) for _ in range(count)}
+    return SAFETY_REFUSAL_KEYWORDS + sorted(generated)
+
+def naive_find_all(text: str, keywords=SAFETY_REFUSAL_KEYWORDS) -> int:
+    lowered = text.lower()
+    count = 0
+    for kw in keywords:
+        start = lowered.find(kw)
+        while start != -1:
+            count += 1
+            start = lowered.find(kw, start + len(kw))
+    return count
+
+def naive_contains(text: str) -> bool:
+    lowered = text.lower()
+    return any(kw in lowered for kw in SAFETY_REFUSAL_KEYWORDS)
+
+def repeated(fn, count: int = 2000):
+    # Call site thật quét văn bản ngắn (một câu trả lời) nhiều lần
+    return lambda texts: [fn(t) for t in texts[:count]]
+
+def naive_mask(text: str) -> str:
+    for pattern in PII_PATTERNS.values():
+        text = re.sub(pattern, "<PII>", text)
+    return text
+
+def bench(name: str, fn, text, repeat: int):
+    size_mb = sum(len(t.encode("utf-8")) for t in ([text] if isinstance(text, str) else text)) / (1024 * 1024)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:<40} {size_mb / best:8.1f} MB/s  ({best * 1000:.1f} ms / {size_mb:.1f} MB)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = make_corpus(args.mb)
+    print(f"Corpus: {args.mb} MB, {len(SAFETY_REFUSAL_KEYWORDS)} keywords, {len(PII_PATTERNS)} PII patterns")
+    bench("keywords: naive find per keyword", naive_find_all, text, args.repeat)
+    bench("keywords: KeywordMatcher.findall", safety_refusal_matcher.findall, text, args.repeat)
+
+    replies = [text[i:i + 400] for i in range(0, 400 * 2000, 400)]
+    print("-- 2000 replies x 400 chars")
+    bench("keywords: naive any(kw in text)", repeated(naive_contains), replies, args.repeat)
+    bench("keywords: KeywordMatcher.contains", repeated(safety_refusal_matcher.contains), replies, args.repeat)
+
+    large = large_keyword_list()
+    large_matcher = KeywordMatcher(large)
+    print(f"-- {len(large)} keywords")
+    bench("keywords: naive find per keyword", lambda t: naive_find_all(t, large), text, args.repeat)
+    bench("keywords: KeywordMatcher.findall", large_matcher.findall, text, args.repeat)
+
+    bench("pii: re.sub per pattern", naive_mask, text, args.repeat)
+    bench("pii: RegexSet.sub", pii_patterns.sub, text, args.repeat)
+
+if __name__ == "__main__":
+    main()
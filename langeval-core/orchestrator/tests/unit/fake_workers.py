@@ -0,0 +1,36 @@
+"""
+Worker giả cho test các workflow gọi dispatch_and_wait (red teaming, battle, tournament).
+
+Mỗi lời gọi chờ `delay` giây rồi trả về `respond(payload)` (dict -> JSON). Ghi lại thứ tự gọi, sự kiện
+start/end và số lời gọi đồng thời cao nhất; `counted(payload)` chọn lời gọi nào được tính vào in_flight/peak.
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, Optional
+
+class FakeWorkers:
+
+    def __init__(self, respond: Callable[[Dict[str, Any]], Any], delay: float = 0.05,
+                 counted: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.respond = respond
+        self.delay = delay
+        self.counted = counted or (lambda payload: True)
+        self.calls = []
+        self.events = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def dispatch(self, topic, payload, redis_key, policy):
+        node_id = payload["node_id"]
+        counted = self.counted(payload)
+        self.calls.append(node_id)
+        self.events.append(("start", node_id))
+        if counted:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        if counted:
+            self.in_flight -= 1
+        self.events.append(("end", node_id))
+        result = self.respond(payload)
+        return result if isinstance(result, str) else json.dumps(result)
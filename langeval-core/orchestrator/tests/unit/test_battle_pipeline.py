@@ -0,0 +1,72 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+# Fix sys.path to find 'app' (và helper test cùng thư mục)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services import battle_arena_workflow
+from app.services.battle_arena_workflow import node_pipeline_wave, should_continue
+from fake_workers import FakeWorkers
+
+def is_judge(payload):
+    return payload["node_id"].startswith("battle_judge")
+
+def battle_workers(fail_turn=None):
+    """Agent và judge đều trả lời sau 50ms; lượt chẵn A thắng, lượt lẻ B thắng. peak chỉ đếm lượt sinh câu trả lời."""
+    def respond(payload):
+        node_id = payload["node_id"]
+        turn = int(node_id.rsplit("_t", 1)[1])
+        if is_judge(payload):
+            return {"winner": "A" if turn % 2 == 0 else "B", "reason": f"turn {turn}"}
+        status = "error" if turn == fail_turn else "success"
+        return {"status": status, "new_messages": [{"role": "assistant", "content": f"{node_id} says hi"}]}
+    return FakeWorkers(respond, counted=lambda payload: not is_judge(payload))
+
+class TestBattlePipeline(unittest.TestCase):
+
+    def run_wave(self, workers, metadata, current_turn=0, max_turns=4):
+        state = {
+            "campaign_id": "b1", "agent_a_id": "a", "agent_b_id": "b", "status": "running",
+            "current_turn": current_turn, "max_turns": max_turns, "metadata": metadata,
+        }
+        async def scenario():
+            with patch.object(battle_arena_workflow, "dispatch_and_wait", new=workers.dispatch), \
+                 patch.object(battle_arena_workflow, "add_battle_turn", new=AsyncMock()) as add_turn:
+                update = await node_pipeline_wave(state)
+            return update, [call.args[0] for call in add_turn.await_args_list]
+        return asyncio.run(scenario())
+
+    def test_next_turn_generates_while_current_turn_is_judged(self):
+        workers = battle_workers()
+        update, turns = self.run_wave(workers, {"lookahead": 1})
+
+        self.assertEqual([t["turn_number"] for t in turns], [1, 2, 3, 4])
+        self.assertEqual(turns[0]["id"], "b1:turn:1")
+        self.assertEqual([t["winner"] for t in turns], ["agent_a", "agent_b", "agent_a", "agent_b"])
+        self.assertEqual(turns[2]["agent_b_response"], "agent_b_t2 says hi")
+        self.assertEqual((update["agent_a_wins"], update["agent_b_wins"], update["ties"]), (2, 2, 0))
+        self.assertEqual(update["current_turn"], 4)
+        self.assertLess(workers.events.index(("start", "agent_a_t1")), workers.events.index(("end", "battle_judge_t0")))
+        self.assertEqual(workers.peak, 4)  # A và B của tối đa 2 lượt
+
+    def test_zero_lookahead_is_serial(self):
+        workers = battle_workers()
+        self.run_wave(workers, {"lookahead": 0})
+        self.assertGreater(workers.events.index(("start", "agent_a_t1")), workers.events.index(("end", "battle_judge_t0")))
+
+    def test_wave_respects_size_and_failure_stops_battle(self):
+        update, turns = self.run_wave(battle_workers(), {"pipeline_wave": 2}, current_turn=1)
+        self.assertEqual([t["turn_number"] for t in turns], [2, 3])
+        self.assertEqual(update["current_turn"], 2)
+
+        update, turns = self.run_wave(battle_workers(fail_turn=1), {"lookahead": 2})
+        self.assertEqual([t["winner"] for t in turns], ["agent_a", "tie"])
+        self.assertEqual((update["status"], update["current_turn"]), ("failed", 2))
+        self.assertEqual(should_continue({**update, "max_turns": 4}), "end")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+from pydantic import ValidationError
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.api.routes import campaigns
+from app.api.routes.campaigns import summarize_batch_results, count_expectations, run_campaign_batch, batch_key
+from app.models.schemas import CreateBatchRequest, CreateCampaignRequest
+from app.services.durable_timers import WAIT_INTERRUPT
+
+class TestCampaignBatch(unittest.TestCase):
+
+    def test_summary_mean_and_stdev_per_agent(self):
+        runs = [
+            {"campaign_id": "c1", "agent_id": "a", "repetition": 0},
+            {"campaign_id": "c2", "agent_id": "a", "repetition": 1},
+            {"campaign_id": "c3", "agent_id": "b", "repetition": 0},
+            {"campaign_id": "c4", "agent_id": "b", "repetition": 1},
+        ]
+        results = {
+            "c1": {"status": "completed", "score": 6.0},
+            "c2": {"status": "completed", "score": 8.0},
+            "c3": {"status": "failed", "score": None},
+        }
+        summary = summarize_batch_results(runs, results)
+
+        self.assertEqual(summary["a"]["completed"], 2)
+        self.assertEqual(summary["a"]["mean_score"], 7.0)
+        self.assertAlmostEqual(summary["a"]["stdev_score"], 1.4142, places=4)
+
+        # c4 still pending: counted as a run but not as finished
+        self.assertEqual(summary["b"]["runs"], 2)
+        self.assertEqual(summary["b"]["failed"], 1)
+        self.assertIsNone(summary["b"]["mean_score"])
+
+    def test_count_expectations(self):
+        scenario = {"nodes": [
+            {"id": "1", "type": "start", "data": {}},
+            {"id": "2", "type": "customNode", "data": {"category": "expectation"}},
+            {"id": "3", "type": "expectation", "data": {}},
+        ]}
+        self.assertEqual(count_expectations(scenario), 2)
+        self.assertEqual(count_expectations(None), 1)
+
+    def test_request_bounds(self):
+        with self.assertRaises(ValidationError):
+            CreateBatchRequest(scenario_id="s", agent_ids=["a"], concurrency=1000)
+        with self.assertRaises(ValidationError):
+            CreateBatchRequest(scenario_id="s", agent_ids=["a"], repetitions=0)
+
+    def test_batch_runs_each_campaign_as_a_scheduler_job(self):
+        runs = [{"campaign_id": f"c{i}", "agent_id": "a", "repetition": i} for i in range(6)]
+        running = {"now": 0, "peak": 0}
+        jobs = []
+
+        async def enqueue(kind, campaign_id, payload, workspace_id=None, priority=0):
+            jobs.append({"kind": kind, "campaign_id": campaign_id, "payload": payload,
+                         "workspace_id": workspace_id, "priority": priority})
+
+        async def execute(campaign_id, req, scenario_data):
+            self.assertEqual(scenario_data, {"nodes": []})
+            self.assertEqual(req.metadata["batch_id"], "b1")
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            if campaign_id == "c1":
+                raise RuntimeError("boom")
+            if campaign_id == "c2":
+                return {"__interrupt__": [{"type": WAIT_INTERRUPT, "resume_at": 1e12}]}
+            return {"status": "completed", "current_score": 1.0}
+
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            await redis.hset(batch_key("b1"), mapping={"status": "queued", "runs": json.dumps(runs)})
+            req = CreateBatchRequest(scenario_id="s", agent_ids=["a"], repetitions=6, concurrency=3)
+            fetch_scenario = AsyncMock(return_value={"nodes": []})
+            fetch_agent = AsyncMock(return_value=None)
+            with patch.object(campaigns.resources, "redis_client", redis), \
+                 patch.object(campaigns.campaign_scheduler, "enqueue", new=enqueue), \
+                 patch.object(campaigns, "fetch_scenario", new=fetch_scenario), \
+                 patch.object(campaigns, "build_dynamic_graph"), \
+                 patch.object(campaigns, "fetch_agent_target_config", new=fetch_agent), \
+                 patch.object(campaigns, "execute_campaign", new=execute), \
+                 patch.object(campaigns, "update_campaign_status", new=AsyncMock()) as update_status:
+                await run_campaign_batch("b1", req, runs, workspace_id="ws1", priority=3)
+                lanes = list(jobs)
+                # Scheduler giả: chạy các job đang chờ cùng lúc cho đến khi hết
+                with self.assertLogs(campaigns.logger, level="ERROR") as logs:
+                    while jobs:
+                        batch, jobs[:] = list(jobs), []
+                        await asyncio.gather(*[campaigns.run_batch_lane_job(job) for job in batch])
+            results = {cid: json.loads(raw) for cid, raw in (await redis.hgetall(f"{batch_key('b1')}:results")).items()}
+            return (lanes, await redis.hget(batch_key("b1"), "status"), results, update_status, logs,
+                    fetch_scenario.await_count + fetch_agent.await_count)
+
+        lanes, status, results, update_status, logs, fetches = asyncio.run(scenario())
+        self.assertEqual([(job["kind"], job["campaign_id"]) for job in lanes], [("batch_run", f"c{i}") for i in range(3)])
+        self.assertEqual({(job["workspace_id"], job["priority"]) for job in lanes}, {("ws1", 3)})
+        self.assertEqual(fetches, 2)
+        self.assertEqual(running["peak"], 3)
+        self.assertEqual(sorted(results), [f"c{i}" for i in range(6)])
+        self.assertEqual(results["c1"]["status"], "failed")
+        self.assertEqual(results["c2"]["status"], "waiting")
+        self.assertEqual(status, "waiting")
+        update_status.assert_awaited_once_with("c1", "failed", metrics={"error": "boom"})
+        self.assertIn("boom", "\n".join(logs.output))
+        self.assertEqual(campaigns.derive_batch_status(runs, {**results, "c2": {"status": "completed"}}), "partial")
+        self.assertEqual(campaigns.derive_batch_status(runs, {"c0": {"status": "completed"}}), "running")
+
+class TestExecuteCampaign(unittest.TestCase):
+
+    def test_graph_error_marks_campaign_failed(self):
+        """Campaign lỗi phải rời trạng thái running, nếu không recovery chạy lại nó sau mỗi restart"""
+        async def scenario():
+            with patch.object(campaigns, "build_dynamic_graph", return_value=object()), \
+                 patch.object(campaigns, "resume_point", new=AsyncMock(side_effect=RuntimeError("node exploded"))), \
+                 patch.object(campaigns.event_stream, "publish", new=AsyncMock()) as publish, \
+                 patch.object(campaigns, "update_campaign_status", new=AsyncMock()) as update_status:
+                with self.assertLogs(campaigns.logger, level="ERROR"):
+                    result = await campaigns.execute_campaign("c1", CreateCampaignRequest(scenario_id="s"), None)
+            return result, update_status, publish
+
+        result, update_status, publish = asyncio.run(scenario())
+        self.assertIsNone(result)
+        update_status.assert_awaited_once_with("c1", "failed", metrics={"error": "node exploded"})
+        publish.assert_awaited_once_with("c1", "error", {"error": "node exploded"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.campaign_index import CampaignIndex, index_key
+
+def make_meta(campaign_id, created_ts, **extra):
+    return {
+        "id": campaign_id,
+        "scenario_id": "s1",
+        "name": f"Campaign {campaign_id}",
+        "agent_id": "a1",
+        "created_at": "2026-01-01T00:00:00",
+        "status": "queued",
+        "created_by": {"name": "tester"},
+        "created_ts": created_ts,
+        **extra,
+    }
+
+class TestCampaignIndex(unittest.TestCase):
+
+    def run_with_redis(self, scenario):
+        async def runner():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            with patch("app.services.campaign_index.resources.redis_client", redis):
+                return await scenario(CampaignIndex(), redis)
+        return asyncio.run(runner())
+
+    def test_list_newest_first_with_total(self):
+        async def scenario(index, redis):
+            for i in range(5):
+                await index.register(make_meta(f"c{i}", 100 + i), workspace_id="ws1")
+            return await index.list(offset=1, limit=2)
+
+        total, items = self.run_with_redis(scenario)
+        self.assertEqual(total, 5)
+        self.assertEqual([item["id"] for item in items], ["c3", "c2"])
+        self.assertEqual(items[0]["created_by"], {"name": "tester"})
+        self.assertEqual(items[0]["current_score"], 0.0)
+        self.assertEqual(items[0]["workspace_id"], "ws1")
+
+    def test_status_update_moves_between_indexes(self):
+        async def scenario(index, redis):
+            await index.register(make_meta("c1", 100), workspace_id="ws1")
+            await index.register(make_meta("c2", 101), workspace_id="ws2")
+            await index.update("c1", status="running")
+            await index.update("c1", status="completed", current_score=8.5)
+            updated_missing = await index.update("unknown", status="running")
+            return (
+                await index.list(status="completed"),
+                await index.list(status="queued"),
+                await index.list(workspace_id="ws1", status="completed"),
+                await redis.zcard(index_key("ws1", "running")),
+                updated_missing,
+            )
+
+        completed, queued, ws_completed, running_count, updated_missing = self.run_with_redis(scenario)
+        self.assertEqual(completed[0], 1)
+        self.assertEqual(completed[1][0]["current_score"], 8.5)
+        self.assertEqual([item["id"] for item in queued[1]], ["c2"])
+        self.assertEqual([item["id"] for item in ws_completed[1]], ["c1"])
+        self.assertEqual(running_count, 0)
+        self.assertFalse(updated_missing)
+
+    def run_with_checkpoints(self, scenario, states):
+        """Checkpointer giả: thread_id -> values (không có -> snapshot rỗng)."""
+        async def aget_state(config):
+            values = states.get(config["configurable"]["thread_id"])
+            if isinstance(values, Exception):
+                raise values
+            return SimpleNamespace(values=values or {}, created_at="2025-02-01T00:00:00" if values else None)
+        graph = MagicMock(aget_state=AsyncMock(side_effect=aget_state))
+        with patch("app.services.workflow.build_dynamic_graph", return_value=graph):
+            return self.run_with_redis(scenario)
+
+    def test_legacy_list_is_backfilled_once(self):
+        async def scenario(index, redis):
+            for i in range(3):
+                meta = make_meta(f"old{i}", None, created_at=f"2025-01-0{i + 1}T00:00:00")
+                await redis.lpush("campaigns:list", json.dumps(meta))
+            first = await index.list()
+            await redis.lpush("campaigns:list", json.dumps(make_meta("old9", None)))
+            second = await index.list()
+            return first, second
+
+        first, second = self.run_with_checkpoints(scenario, {})
+        self.assertEqual(first[0], 3)
+        self.assertEqual([item["id"] for item in first[1]], ["old2", "old1", "old0"])
+        self.assertEqual(second[0], 3)
+
+    def test_legacy_backfill_uses_live_state_and_resumes_after_crash(self):
+        async def scenario(index, redis):
+            for i in range(3):
+                await redis.lpush("campaigns:list", json.dumps(make_meta(f"old{i}", None)))
+            original = index.register
+
+            async def crash_on_old1(meta, workspace_id=None):
+                if meta["id"] == "old1":
+                    raise SystemExit("replica killed")
+                await original(meta, workspace_id)
+
+            with patch.object(index, "register", new=crash_on_old1):
+                with self.assertRaises(SystemExit):
+                    await index.list()
+            await redis.delete("campaigns:index:legacy_backfilled:lock")  # lock hết hạn
+            return await index.list(), await index.list(status="completed")
+
+        states = {
+            "old0": {"status": "completed", "current_score": 7.5},
+            "old1": {"status": "running", "current_score": 2.0},
+            "old2": RuntimeError("checkpointer down"),
+        }
+        (total, items), (done_total, done) = self.run_with_checkpoints(scenario, states)
+        self.assertEqual(total, 3)
+        by_id = {item["id"]: item for item in items}
+        self.assertEqual((by_id["old0"]["status"], by_id["old0"]["current_score"]), ("completed", 7.5))
+        self.assertEqual((by_id["old1"]["status"], by_id["old1"]["current_score"]), ("running", 2.0))
+        self.assertEqual(by_id["old0"]["updated_at"], "2025-02-01T00:00:00")
+        self.assertEqual(by_id["old2"]["status"], "queued")  # lỗi checkpointer: giữ meta
+        self.assertEqual([item["id"] for item in done], ["old0"])
+
+if __name__ == "__main__":
+    unittest.main()
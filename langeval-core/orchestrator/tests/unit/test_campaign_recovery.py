@@ -0,0 +1,129 @@
+import unittest
+import asyncio
+import json
+import operator
+import sys
+import os
+from typing import Annotated, TypedDict
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, END
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.campaign_recovery import CampaignRecovery, resume_point
+from app.services.campaign_index import CampaignIndex
+from app.services.campaign_scheduler import KEY_PREFIX
+from app.services import node_dispatch
+
+class DemoState(TypedDict):
+    campaign_id: str
+    messages: Annotated[list, operator.add]
+    status: str
+
+def build_flaky_graph(calls):
+    async def node_talk(state):
+        calls.append("talk")
+        return {"messages": ["hi"]}
+
+    async def node_judge(state):
+        calls.append("judge")
+        if calls.count("judge") == 1:
+            raise RuntimeError("orchestrator restarted")
+        return {"status": "completed"}
+
+    graph = StateGraph(DemoState)
+    graph.add_node("talk", node_talk)
+    graph.add_node("judge", node_judge)
+    graph.set_entry_point("talk")
+    graph.add_edge("talk", "judge")
+    graph.add_edge("judge", END)
+    return graph.compile(checkpointer=MemorySaver())
+
+class TestCampaignRecovery(unittest.TestCase):
+
+    def test_resume_point_continues_from_last_completed_node(self):
+        async def scenario():
+            calls = []
+            graph = build_flaky_graph(calls)
+            config = {"configurable": {"thread_id": "c1"}}
+            initial = {"campaign_id": "c1", "messages": [], "status": "running"}
+
+            graph_input, done = await resume_point(graph, config, initial)
+            self.assertIs(graph_input, initial)
+            with self.assertRaises(RuntimeError):
+                await graph.ainvoke(graph_input, config)
+
+            graph_input, done = await resume_point(graph, config, initial)
+            self.assertIsNone(graph_input)
+            self.assertIsNone(done)
+            final_state = await graph.ainvoke(graph_input, config)
+
+            _, done = await resume_point(graph, config, initial)
+            return calls, final_state, done
+
+        calls, final_state, done = asyncio.run(scenario())
+        # "talk" (lượt LLM đã xong) không bị chạy lại
+        self.assertEqual(calls, ["talk", "judge", "judge"])
+        self.assertEqual(final_state, {"campaign_id": "c1", "messages": ["hi"], "status": "completed"})
+        self.assertEqual(done, final_state)
+
+    def test_recover_enqueues_only_orphaned_running_campaigns(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            with patch("app.services.campaign_index.resources.redis_client", redis):
+                index = CampaignIndex()
+                for campaign_id in ("c1", "c2", "c3", "c4"):
+                    await index.register({"id": campaign_id, "status": "running"}, workspace_id="ws1")
+                await index.update("c4", status="completed")
+                # c1: job campaign còn trong scheduler, c2: thuộc một batch job
+                await redis.hset(f"{KEY_PREFIX}jobs", mapping={
+                    "j1": json.dumps({"campaign_id": "c1", "payload": {}}),
+                    "j2": json.dumps({"campaign_id": "b1", "payload": {"runs": [{"campaign_id": "c2"}]}}),
+                })
+                with patch("app.services.campaign_recovery.campaign_scheduler.enqueue", new=AsyncMock()) as enqueue:
+                    recovery = CampaignRecovery()
+                    recovered = await recovery.recover()
+                    again = await recovery.recover()
+                return recovered, again, enqueue.await_args_list
+
+        recovered, again, enqueued = asyncio.run(scenario())
+        self.assertEqual(recovered, ["c3"])
+        self.assertEqual(again, [])
+        self.assertEqual(len(enqueued), 1)
+        self.assertEqual(enqueued[0].args[:2], ("resume", "c3"))
+        self.assertEqual(enqueued[0].kwargs["workspace_id"], "ws1")
+
+    def test_dispatch_reattaches_to_outstanding_request(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            redis_key = node_dispatch.result_key("c1", "n1")
+
+            async def worker_replies(topic, payload, partition=None):
+                await redis.rpush(redis_key, json.dumps({"new_messages": ["again"]}))
+
+            with patch("app.services.node_dispatch.resources.redis_client", redis), \
+                 patch("app.services.result_dispatcher.resources.redis_client", redis), \
+                 patch("app.services.node_dispatch.kafka_producer.send_and_wait", new=AsyncMock(side_effect=worker_replies)) as send:
+                # Lần chạy đầu: gửi request rồi process chết trước khi có kết quả
+                await redis.set(f"{redis_key}:pending", json.dumps([redis_key]), ex=60)
+                await redis.rpush(redis_key, json.dumps({"new_messages": ["done"]}))
+                resumed = await node_dispatch.dispatch_and_wait("simulation.requests", {}, redis_key, 1)
+                sends_after_resume = send.await_count
+
+                fresh = await node_dispatch.dispatch_and_wait("simulation.requests", {}, redis_key, 1)
+                pending_left = await redis.exists(f"{redis_key}:pending")
+                return resumed, sends_after_resume, fresh, send.await_count, pending_left
+
+        resumed, sends_after_resume, fresh, sends, pending_left = asyncio.run(scenario())
+        self.assertEqual(json.loads(resumed), {"new_messages": ["done"]})
+        self.assertEqual(sends_after_resume, 0)
+        self.assertEqual(json.loads(fresh), {"new_messages": ["again"]})
+        self.assertEqual(sends, 1)
+        self.assertEqual(pending_left, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services import checkpointer
+from app.services.checkpointer import apply_retention
+
+class TestCheckpointRetention(unittest.TestCase):
+
+    def run_retention(self, retention="latest", keep_last=3, archive=False, final_state=None):
+        saver = MagicMock()
+        saver.aprune = AsyncMock()
+        with patch.object(checkpointer, "get_checkpointer", return_value=saver), \
+             patch.object(checkpointer, "archive_final_state", new=AsyncMock()) as archive_mock, \
+             patch.object(checkpointer, "CHECKPOINT_RETENTION", retention), \
+             patch.object(checkpointer, "CHECKPOINT_KEEP_LAST", keep_last), \
+             patch.object(checkpointer, "CHECKPOINT_ARCHIVE", archive):
+            asyncio.run(apply_retention("c1", final_state, kind="campaign"))
+        return saver.aprune, archive_mock
+
+    def test_prunes_to_latest_n(self):
+        aprune, archive = self.run_retention(keep_last=3)
+        aprune.assert_awaited_once_with(["c1"], keep_last=3)
+        archive.assert_not_awaited()
+
+    def test_full_retention_keeps_everything(self):
+        aprune, _ = self.run_retention(retention="full")
+        aprune.assert_not_awaited()
+
+    def test_archives_final_state_and_never_prunes_latest(self):
+        aprune, archive = self.run_retention(keep_last=0, archive=True, final_state={"status": "completed"})
+        archive.assert_awaited_once_with("c1", "campaign", {"status": "completed"})
+        aprune.assert_awaited_once_with(["c1"], keep_last=1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import asyncio
+import sys
+import os
+import time
+from unittest.mock import patch
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services import code_executor
+from app.services.code_executor import CodeExecutor
+
+class TestCodeExecutor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.executor = CodeExecutor(workers=1, memory_limit_mb=128)
+        cls.loop.run_until_complete(cls.executor.start())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.run_until_complete(cls.executor.stop())
+        cls.loop.close()
+
+    def run_code(self, code, context=None, outputs=("result",), timeout=None):
+        return self.loop.run_until_complete(
+            self.executor.run(code, context or {}, list(outputs), timeout=timeout)
+        )
+
+    def test_outputs_are_returned(self):
+        result = self.run_code(
+            "def double(x):\n    return x * 2\nresult = [double(n) for n in numbers]\ntext = json.dumps(result)",
+            {"numbers": [1, 2, 3]},
+            outputs=("result", "text", "missing"),
+        )
+        self.assertTrue(result["ok"], result["error"])
+        self.assertEqual(result["outputs"], {"result": [2, 4, 6], "text": "[2, 4, 6]"})
+        self.assertGreaterEqual(result["queue_ms"], 0)
+
+    def test_errors_and_no_imports(self):
+        result = self.run_code("import os\nresult = os.getcwd()")
+        self.assertFalse(result["ok"])
+        self.assertIn("ImportError", result["error"])
+
+    def test_timeout_cannot_be_swallowed(self):
+        code = "while True:\n    try:\n        pass\n    except Exception:\n        pass"
+        result = self.run_code(code, timeout=0.3)
+        self.assertFalse(result["ok"])
+        self.assertTrue(result["timeout"])
+        # Worker is reused afterwards
+        self.assertTrue(self.run_code("result = 1")["ok"])
+
+    def test_memory_limit(self):
+        result = self.run_code("result = len(' ' * (512 * 1024 * 1024))")
+        self.assertFalse(result["ok"])
+        self.assertIn("Memory", result["error"])
+        self.assertTrue(self.run_code("result = 1")["ok"])
+        self.assertGreaterEqual(self.executor.stats()["failed"], 1)
+
+    def test_queued_jobs_do_not_restart_the_pool(self):
+        """Chờ hàng đợi lâu chỉ trả lỗi queue timeout, không kill worker đang chạy code bình thường"""
+        before = self.executor.stats()
+
+        async def burst():
+            return await asyncio.gather(*[
+                self.executor.run("sleep(0.4)\nresult = 1", {"sleep": time.sleep}, ["result"], timeout=1)
+                for _ in range(8)
+            ])
+
+        with patch.object(code_executor, "QUEUE_TIMEOUT", 1):
+            results = self.loop.run_until_complete(burst())
+
+        ok = [r for r in results if r["ok"]]
+        busy = [r for r in results if not r["ok"]]
+        self.assertGreaterEqual(len(ok), 2)
+        self.assertTrue(busy)
+        self.assertTrue(all("queue timeout" in r["error"] and not r["timeout"] for r in busy))
+        stats = self.executor.stats()
+        self.assertEqual(stats["pool_restarts"], before["pool_restarts"])
+        self.assertEqual(stats["timeouts"], before["timeouts"])
+        self.assertEqual(stats["queue_timeouts"] - before["queue_timeouts"], len(busy))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.config_cache import ConfigCache
+
+class TestConfigCache(unittest.TestCase):
+
+    def test_concurrent_misses_are_coalesced(self):
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"name": "gpt-4o"}
+
+        async def scenario():
+            cache = ConfigCache(ttl=60)
+            results = await asyncio.gather(*[cache.get("model:m1", loader) for _ in range(10)])
+            # Served from cache, no extra load
+            results.append(await cache.get("model:m1", loader))
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r == {"name": "gpt-4o"} for r in results))
+
+    def test_ttl_expiry_and_none_not_cached(self):
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            return None if len(calls) == 1 else {"name": "agent"}
+
+        async def scenario():
+            cache = ConfigCache(ttl=0.05)
+            first = await cache.get("agent:a1", loader)
+            second = await cache.get("agent:a1", loader)
+            await asyncio.sleep(0.1)
+            third = await cache.get("agent:a1", loader)
+            return first, second, third
+
+        first, second, third = asyncio.run(scenario())
+        self.assertIsNone(first)
+        self.assertEqual(second, {"name": "agent"})
+        self.assertEqual(third, {"name": "agent"})
+        self.assertEqual(len(calls), 3)
+
+    def test_invalidation_event(self):
+        versions = iter([{"v": 1}, {"v": 2}])
+
+        async def loader():
+            return next(versions)
+
+        async def scenario():
+            cache = ConfigCache(ttl=60)
+            before = await cache.get("agent:a1", loader)
+            cache.handle_event(json.dumps({"type": "agent", "id": "a1"}))
+            cache.handle_event("not-json")
+            after = await cache.get("agent:a1", loader)
+            return before, after
+
+        self.assertEqual(asyncio.run(scenario()), ({"v": 1}, {"v": 2}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import asyncio
+import json
+import operator
+import time
+import sys
+import os
+from typing import Annotated, TypedDict
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, END
+from langgraph.types import Command
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.durable_timers import DurableTimers, wait_deadline, TIMER_KEY
+from app.services.campaign_recovery import resume_point
+from app.services.event_stream import CampaignEventStream
+from app.services.workflow import node_wait
+
+class DemoState(TypedDict):
+    campaign_id: str
+    messages: Annotated[list, operator.add]
+    status: str
+
+def build_wait_graph(calls):
+    async def node_talk(state):
+        calls.append("talk")
+        return {"messages": ["hi"]}
+
+    async def node_done(state):
+        calls.append("done")
+        return {"status": "completed"}
+
+    async def node_long_wait(state):
+        return await node_wait(state, {"id": "wait", "data": {"duration": 3600}})
+
+    graph = StateGraph(DemoState)
+    graph.add_node("talk", node_talk)
+    graph.add_node("wait", node_long_wait)
+    graph.add_node("done", node_done)
+    graph.set_entry_point("talk")
+    graph.add_edge("talk", "wait")
+    graph.add_edge("wait", "done")
+    graph.add_edge("done", END)
+    return graph.compile(checkpointer=MemorySaver())
+
+class TestDurableTimers(unittest.TestCase):
+
+    def test_wait_node_suspends_and_resumes_when_due(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            calls = []
+            graph = build_wait_graph(calls)
+            config = {"configurable": {"thread_id": "c1"}}
+            initial = {"campaign_id": "c1", "messages": [], "status": "running"}
+            stream = CampaignEventStream()
+            with patch("app.services.event_stream.resources.redis_client", redis):
+                suspended = await stream.run_graph(graph, initial, config, "c1")
+                events = [json.loads(e)["type"] for e in await redis.lrange("campaign:c1:events:log", 0, -1)]
+                not_due = await resume_point(graph, config, initial)
+                with patch("app.services.campaign_recovery.time.time", return_value=time.time() + 3601):
+                    graph_input, _ = await resume_point(graph, config, initial)
+                final_state = await stream.run_graph(graph, graph_input, config, "c1")
+            return calls, suspended, not_due, graph_input, final_state, events
+
+        calls, suspended, not_due, graph_input, final_state, events = asyncio.run(scenario())
+        resume_at = wait_deadline(suspended)
+        self.assertAlmostEqual(resume_at, time.time() + 3600, delta=5)
+        self.assertEqual(suspended["messages"], ["hi"])
+        self.assertEqual(wait_deadline(not_due[1]), resume_at)
+        self.assertIsNone(not_due[0])
+        self.assertIsInstance(graph_input, Command)
+        self.assertEqual(final_state, {"campaign_id": "c1", "messages": ["hi"], "status": "completed"})
+        self.assertEqual(calls, ["talk", "done"])
+        # Không có "end" khi đang chờ -> viewer giữ kết nối qua lần suspend
+        self.assertEqual(events[-1], "status")
+        self.assertNotIn("end", events)
+
+    def test_fire_due_enqueues_resume_jobs_once(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            timers = DurableTimers()
+            with patch("app.services.durable_timers.resources.redis_client", redis), \
+                 patch("app.services.durable_timers.campaign_scheduler.enqueue", new=AsyncMock()) as enqueue:
+                await redis.hset("campaign:c1:summary", "workspace_id", "ws1")
+                await timers.schedule("c1", time.time() - 1)
+                await timers.schedule("c2", time.time() + 3600)
+                first = await timers.fire_due()
+                second = await timers.fire_due()
+                remaining = await redis.zrange(TIMER_KEY, 0, -1)
+                return first, second, remaining, enqueue.await_args_list
+
+        first, second, remaining, enqueued = asyncio.run(scenario())
+        self.assertEqual(first, ["c1"])
+        self.assertEqual(second, [])
+        self.assertEqual(remaining, ["c2"])
+        self.assertEqual(enqueued[0].args[:2], ("resume", "c1"))
+        self.assertEqual(enqueued[0].kwargs["workspace_id"], "ws1")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import asyncio
+import operator
+import sys
+import os
+from typing import Annotated, TypedDict
+from unittest.mock import patch
+
+import fakeredis
+from langgraph.graph import StateGraph, END
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.event_stream import CampaignEventStream
+
+class DemoState(TypedDict):
+    campaign_id: str
+    messages: Annotated[list, operator.add]
+    current_score: float
+    status: str
+
+async def node_talk(state):
+    return {"messages": [{"role": "user", "content": "hi"}]}
+
+async def node_score(state):
+    return {"current_score": 7.5, "status": "completed"}
+
+def build_demo_graph():
+    graph = StateGraph(DemoState)
+    graph.add_node("talk", node_talk)
+    graph.add_node("score", node_score)
+    graph.set_entry_point("talk")
+    graph.add_edge("talk", "score")
+    graph.add_edge("score", END)
+    return graph.compile()
+
+class TestEventStream(unittest.TestCase):
+
+    def run_with_redis(self, scenario):
+        async def runner():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            stream = CampaignEventStream()
+            with patch("app.services.event_stream.resources.redis_client", redis):
+                await stream.start()
+                try:
+                    return await scenario(stream)
+                finally:
+                    await stream.stop()
+        return asyncio.run(runner())
+
+    async def collect(self, stream, campaign_id, last_event_id=None):
+        return [e async for e in stream.subscribe(campaign_id, last_event_id=last_event_id)]
+
+    def test_live_viewers_receive_node_events(self):
+        async def scenario(stream):
+            viewers = [asyncio.create_task(self.collect(stream, "c1")) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            initial = {"campaign_id": "c1", "messages": [], "current_score": 0.0, "status": "running"}
+            final_state = await stream.run_graph(build_demo_graph(), initial, {}, "c1")
+            events = await asyncio.wait_for(asyncio.gather(*viewers), timeout=5)
+            return final_state, events, stream.viewers
+
+        final_state, (first, second), viewers_left = self.run_with_redis(scenario)
+        self.assertEqual(final_state["current_score"], 7.5)
+        self.assertEqual(first, second)
+        types = [e["type"] for e in first]
+        self.assertEqual(types, [
+            "node_start", "node_end", "message", "node_start", "node_end", "score", "status", "end",
+        ])
+        self.assertEqual(first[2]["data"]["message"]["content"], "hi")
+        self.assertEqual(first[-1]["data"], {"status": "completed", "current_score": 7.5})
+        self.assertEqual(viewers_left, 0)
+
+    def test_late_viewer_replays_after_last_event_id(self):
+        async def scenario(stream):
+            initial = {"campaign_id": "c2", "messages": [], "current_score": 0.0, "status": "running"}
+            await stream.run_graph(build_demo_graph(), initial, {}, "c2")
+            replay = await asyncio.wait_for(self.collect(stream, "c2"), timeout=5)
+            resumed = await asyncio.wait_for(self.collect(stream, "c2", last_event_id=replay[4]["id"]), timeout=5)
+            return replay, resumed
+
+        replay, resumed = self.run_with_redis(scenario)
+        self.assertEqual(len(replay), 8)
+        self.assertEqual(resumed, replay[5:])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.expression import compile_expression, ExpressionError
+from app.services.workflow import build_dynamic_graph, clear_graph_cache
+
+class TestExpression(unittest.TestCase):
+
+    def evaluate(self, source, content="", variables=None, metadata=None):
+        return compile_expression(source).evaluate(content, variables, metadata)
+
+    def test_comparisons_and_functions(self):
+        variables = {"score": 7, "tags": ["refund", "vip"], "order": {"items": [{"id": "A1"}]}}
+        self.assertTrue(self.evaluate("variables['score'] >= 5 and 'vip' in variables['tags']", variables=variables))
+        self.assertTrue(self.evaluate("len(content) > 3 and 'hello' in content.lower()", content="Hello there"))
+        self.assertTrue(self.evaluate("matches(content, r'\\border-\\d+\\b')", content="see order-42"))
+        self.assertEqual(self.evaluate("path('variables.order.items[0].id')", variables=variables), "A1")
+        self.assertIsNone(self.evaluate("path('variables.missing.key')", variables=variables))
+        self.assertIsNone(self.evaluate("variables['missing']", variables=variables))
+
+    def test_rejects_unsafe_syntax(self):
+        for source in [
+            "__import__('os').system('id')",
+            "content.__class__",
+            "(lambda: 1)()",
+            "[x for x in content]",
+            "open('/etc/passwd')",
+            "content.format(1)",
+            "variables ** 2",
+            "foo == 1",
+            "",
+            "1 +",
+        ]:
+            with self.subTest(source=source), self.assertRaises(ExpressionError):
+                compile_expression(source)
+
+    def test_string_repetition_blocked(self):
+        with self.assertRaises(TypeError):
+            self.evaluate("content * 1000000000 == ''", content="a")
+
+    def test_invalid_expression_fails_graph_build(self):
+        clear_graph_cache()
+        scenario = {
+            "nodes": [
+                {"id": "n1", "type": "start", "data": {"category": "start"}},
+                {"id": "n2", "type": "condition", "data": {"category": "condition", "label": "Check",
+                                                            "logicType": "expression", "expression": "eval('1')"}},
+            ],
+            "edges": [{"id": "e1", "source": "n1", "target": "n2"}]
+        }
+        with self.assertRaises(ExpressionError) as ctx:
+            build_dynamic_graph(scenario)
+        self.assertIn("Check", str(ctx.exception))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import importlib.util
+import sys
+import os
+from unittest.mock import patch
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+SCENARIO_COMPILER_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "../../../resource-service/app/services/scenario_compiler.py"
+))
+
+from app.services import workflow
+from app.services.workflow import build_dynamic_graph, scenario_hash, clear_graph_cache, execution_plan
+
+def make_scenario(x=0):
+    return {
+        "nodes": [
+            {"id": "n1", "type": "start", "position": {"x": x, "y": 0}, "data": {"category": "start"}},
+            {"id": "n2", "type": "end", "position": {"x": 200, "y": 0}, "data": {"category": "end"}}
+        ],
+        "edges": [
+            {"id": "e1", "source": "n1", "target": "n2"}
+        ]
+    }
+
+class TestGraphCache(unittest.TestCase):
+
+    def setUp(self):
+        clear_graph_cache()
+
+    def test_hash_ignores_layout(self):
+        """Moving nodes on the canvas must not invalidate the compiled graph"""
+        self.assertEqual(scenario_hash(make_scenario(0)), scenario_hash(make_scenario(500)))
+
+    def test_hash_changes_with_content(self):
+        changed = make_scenario()
+        changed["nodes"][1]["data"]["label"] = "Finish"
+        self.assertNotEqual(scenario_hash(make_scenario()), scenario_hash(changed))
+
+    @unittest.skipUnless(os.path.exists(SCENARIO_COMPILER_PATH), "resource-service source not available")
+    def test_hash_matches_resource_service_compiler(self):
+        """Plan hash từ Resource Service phải trùng scenario_hash để hai bên dùng chung key cache graph"""
+        spec = importlib.util.spec_from_file_location("resource_scenario_compiler", SCENARIO_COMPILER_PATH)
+        compiler = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(compiler)
+        scenario = make_scenario()
+        scenario["nodes"].append({"id": "c", "type": "customNode", "selected": True, "data": {
+            "category": "condition", "logicType": "expression", "expression": "len(content) > 3", "label": "Đủ dài"
+        }})
+        scenario["edges"].append({"id": "e2", "source": "c", "target": "n2", "sourceHandle": "true", "animated": True})
+
+        self.assertEqual(compiler.content_hash(scenario["nodes"], scenario["edges"]), scenario_hash(scenario))
+        self.assertEqual(compiler.compile_scenario(scenario["nodes"], scenario["edges"])["hash"], scenario_hash(scenario))
+
+    def test_same_scenario_reuses_compiled_graph(self):
+        first = build_dynamic_graph(make_scenario(0))
+        second = build_dynamic_graph(make_scenario(10))
+        self.assertIs(first, second)
+        self.assertIs(build_dynamic_graph(), build_dynamic_graph())
+
+    def test_precompiled_plan_is_used_directly(self):
+        scenario = make_scenario()
+        self.assertEqual(execution_plan(scenario)["hash"], scenario_hash(scenario))
+        self.assertEqual(execution_plan(scenario)["entry"], "n1")
+
+        scenario["execution_plan"] = {
+            "version": workflow.PLAN_VERSION, "hash": "plan-hash", "entry": "n1",
+            "nodes": [{"id": "n1", "type": "start", "data": {}}, {"id": "n2", "type": "expectation", "data": {}}],
+            "edges": [{"source": "n1", "target": "n2", "handle": "default"}],
+            "expectations_count": 1, "required_variables": [],
+        }
+        graph = build_dynamic_graph(scenario)
+        self.assertIs(workflow._graph_cache["plan-hash"], graph)
+        self.assertEqual(set(graph.get_graph().nodes) - {"__start__", "__end__"}, {"n1", "n2"})
+
+    def test_node_policies_from_resource_service_response(self):
+        """ScenarioRef trả policy trong meta_data.node_policies: phải tới được handler và vào cache key"""
+        scenario = make_scenario()
+        scenario["nodes"].insert(1, {"id": "t1", "type": "customNode", "data": {"category": "task"}})
+        scenario["edges"] = [{"id": "e1", "source": "n1", "target": "t1"}, {"id": "e2", "source": "t1", "target": "n2"}]
+        scenario["meta_data"] = {"node_policies": {"task": {"timeout": 5, "retries": 2}}}
+
+        bound = {}
+        original = workflow._bind_handler
+        def capture(node_type, node, compiled=None, policy=None):
+            bound[node["id"]] = policy
+            return original(node_type, node, compiled, policy)
+
+        with patch.object(workflow, "_bind_handler", side_effect=capture):
+            first = build_dynamic_graph(scenario)
+        self.assertEqual((bound["t1"]["timeout"], bound["t1"]["retries"]), (5.0, 2))
+
+        changed = {**scenario, "meta_data": {"node_policies": {"task": {"timeout": 10}}}}
+        self.assertIsNot(build_dynamic_graph(changed), first)
+        self.assertIs(build_dynamic_graph(dict(scenario)), first)
+
+    def test_lru_eviction(self):
+        original = workflow.GRAPH_CACHE_SIZE
+        workflow.GRAPH_CACHE_SIZE = 2
+        try:
+            scenarios = []
+            for i in range(3):
+                s = make_scenario()
+                s["nodes"][1]["data"]["label"] = f"end-{i}"
+                scenarios.append(s)
+                build_dynamic_graph(s)
+            self.assertEqual(len(workflow._graph_cache), 2)
+            self.assertNotIn(scenario_hash(scenarios[0]), workflow._graph_cache)
+        finally:
+            workflow.GRAPH_CACHE_SIZE = original
+
+if __name__ == "__main__":
+    unittest.main()
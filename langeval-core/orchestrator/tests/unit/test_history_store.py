@@ -0,0 +1,79 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from unittest.mock import patch
+
+import fakeredis
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.history_store import HistoryStore, history_key
+
+class TestHistoryStore(unittest.TestCase):
+
+    def run_with_redis(self, scenario):
+        async def runner():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            with patch("app.services.history_store.resources.redis_client", redis):
+                return await scenario(HistoryStore(), redis)
+        return asyncio.run(runner())
+
+    def test_only_new_messages_are_pushed(self):
+        async def scenario(store, redis):
+            messages = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+            first = await store.payload_fields("c1", messages)
+            messages.append({"role": "user", "content": "bye"})
+            second = await store.payload_fields("c1", messages)
+            stored = [json.loads(m) for m in await redis.lrange(history_key("c1"), 0, -1)]
+            return first, second, stored
+
+        first, second, stored = self.run_with_redis(scenario)
+        self.assertEqual(first, {"history_ref": {"key": "campaign:c1:history", "length": 2}})
+        self.assertEqual(second["history_ref"]["length"], 3)
+        self.assertNotIn("history", second)
+        self.assertEqual([m["content"] for m in stored], ["hi", "hello", "bye"])
+
+    def test_rewound_state_rewrites_history(self):
+        async def scenario(store, redis):
+            await store.sync("c2", [{"content": "a"}, {"content": "b"}])
+            # Another replica resumes from an older checkpoint
+            ref = await HistoryStore().sync("c2", [{"content": "x"}])
+            return ref, await redis.lrange(history_key("c2"), 0, -1)
+
+        ref, stored = self.run_with_redis(scenario)
+        self.assertEqual(ref["length"], 1)
+        self.assertIn("epoch", ref)
+        self.assertEqual([json.loads(m)["content"] for m in stored], ["x"])
+
+    def test_stale_cached_length_is_detected(self):
+        async def scenario(store, redis):
+            messages = [{"content": str(i)} for i in range(4)]
+            await store.sync("c4", messages[:2])
+            # Replica khác đã ghi thêm tới 3 message
+            await HistoryStore().sync("c4", messages[:3])
+            appended = await store.sync("c4", messages)
+            stored = [json.loads(m)["content"] for m in await redis.lrange(history_key("c4"), 0, -1)]
+            # Key hết hạn: độ dài nhớ trong process không còn đúng
+            await redis.delete(history_key("c4"))
+            expired = await store.sync("c4", messages)
+            restored = await redis.llen(history_key("c4"))
+            return appended, stored, expired, restored
+
+        appended, stored, expired, restored = self.run_with_redis(scenario)
+        self.assertEqual(stored, ["0", "1", "2", "3"])
+        self.assertEqual(restored, 4)
+        self.assertTrue(appended["epoch"])
+        self.assertNotEqual(expired["epoch"], appended["epoch"])
+
+    def test_inline_fallback_without_redis(self):
+        async def scenario():
+            with patch("app.services.history_store.resources.redis_client", None):
+                return await HistoryStore().payload_fields("c3", [{"content": "a"}])
+
+        self.assertEqual(asyncio.run(scenario()), {"history": [{"content": "a"}]})
+
+if __name__ == "__main__":
+    unittest.main()
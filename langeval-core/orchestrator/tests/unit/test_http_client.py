@@ -0,0 +1,42 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import patch
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core.http_client import get_http_client, init_http_clients, close_http_clients
+
+class TestHttpClient(unittest.TestCase):
+
+    def tearDown(self):
+        asyncio.run(close_http_clients())
+
+    def test_client_is_shared_per_profile(self):
+        async def scenario():
+            await init_http_clients()
+            return get_http_client(), get_http_client("resource"), get_http_client("external")
+
+        resource, again, external = asyncio.run(scenario())
+        self.assertIs(resource, again)
+        self.assertIsNot(resource, external)
+        self.assertEqual(resource.timeout.read, 10)
+        self.assertEqual(external.timeout.read, 30)
+
+    def test_env_override_and_recreate_after_close(self):
+        with patch.dict(os.environ, {"HTTP_BILLING_TIMEOUT": "2"}):
+            client = get_http_client("billing")
+        self.assertEqual(client.timeout.read, 2)
+
+        asyncio.run(close_http_clients())
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(get_http_client("billing"), client)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            get_http_client("nope")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import patch
+
+from aiokafka.structs import RecordMetadata, TopicPartition
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core import wire
+from app.core.kafka_producer import KafkaProducer, resolve_compression
+
+class FakeProducer:
+    """Giả lập accumulator: record chờ đến flush() rồi được ack cùng lúc như một batch."""
+
+    def __init__(self):
+        self.pending = []
+
+    async def send(self, topic, value, key=None, headers=None):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((topic, value, future))
+        return future
+
+    def flush_batch(self):
+        for offset, (topic, value, future) in enumerate(self.pending):
+            future.set_result(RecordMetadata(topic, 0, TopicPartition(topic, 0), offset, -1, 0, 0))
+        self.pending = []
+
+class TestKafkaProducer(unittest.TestCase):
+
+    def test_send_returns_delivery_future_and_tracks_batches(self):
+        async def scenario():
+            fake = FakeProducer()
+            producer = KafkaProducer()
+            with patch("app.core.kafka_producer.resources.producer", fake):
+                deliveries = [await producer.send("sim", {"n": i}) for i in range(3)]
+                in_flight = producer.stats()["in_flight"]
+                fake.flush_batch()
+                metadata = await asyncio.gather(*deliveries)
+                await asyncio.sleep(0)
+                return fake, metadata, in_flight, producer.stats()
+
+        fake, metadata, in_flight, stats = asyncio.run(scenario())
+        self.assertEqual(in_flight, 3)
+        self.assertEqual([m.offset for m in metadata], [0, 1, 2])
+        self.assertEqual(stats["delivered"], 3)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(stats["batches"], 1)
+        self.assertEqual(stats["batch_records_max"], 3)
+        self.assertEqual(stats["bytes_total"], sum(len(wire.encode({"n": i})[0]) for i in range(3)))
+
+    def test_failed_delivery_is_counted(self):
+        async def scenario():
+            fake = FakeProducer()
+            producer = KafkaProducer()
+            with patch("app.core.kafka_producer.resources.producer", fake):
+                delivery = await producer.send("sim", b"raw")
+                fake.pending[0][2].set_exception(RuntimeError("broker down"))
+                with self.assertRaises(RuntimeError):
+                    await delivery
+                await asyncio.sleep(0)
+                return producer.stats()
+
+        stats = asyncio.run(scenario())
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["delivered"], 0)
+
+    def test_unknown_compression_is_rejected(self):
+        self.assertIsNone(resolve_compression("none"))
+        self.assertEqual(resolve_compression("gzip"), "gzip")
+        with self.assertRaises(ValueError):
+            resolve_compression("brotli")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import asyncio
+import logging
+import sys
+import os
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core.log import ContextFilter, SamplingFilter, brief, campaign_context, set_campaign_id
+
+def make_record(msg="Task node: %s", level=logging.INFO, args=("x",), **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+class Unserializable:
+    calls = 0
+
+    def __repr__(self):
+        Unserializable.calls += 1
+        return "<unserializable>"
+
+class TestLog(unittest.TestCase):
+
+    def test_brief_is_lazy_and_truncated(self):
+        value = {"history": ["x" * 50] * 10}
+        wrapped = brief(value, limit=40)
+        text = str(wrapped)
+        self.assertTrue(text.startswith('{"history": ["xxx'))
+        self.assertIn("... (+", text)
+        self.assertLessEqual(len(text.split("...")[0]), 40)
+
+        Unserializable.calls = 0
+        logger = logging.getLogger("app.test.lazy")
+        logger.setLevel(logging.INFO)
+        logger.debug("payload %s", brief([Unserializable()]))
+        self.assertEqual(Unserializable.calls, 0)
+
+    def test_campaign_id_from_context_or_extra(self):
+        context_filter = ContextFilter()
+
+        async def task(campaign_id):
+            set_campaign_id(campaign_id)
+            await asyncio.sleep(0)
+            record = make_record()
+            context_filter.filter(record)
+            return record.campaign_id
+
+        async def main():
+            return await asyncio.gather(task("c1"), task("c2"))
+
+        self.assertEqual(asyncio.run(main()), ["c1", "c2"])
+
+        with campaign_context("c3"):
+            record = make_record(campaign_id="explicit")
+            context_filter.filter(record)
+            self.assertEqual(record.campaign_id, "explicit")
+        record = make_record()
+        context_filter.filter(record)
+        self.assertEqual(record.campaign_id, "-")
+
+    def test_rate_limit_per_template_keeps_warnings(self):
+        sampling = SamplingFilter(debug_rate=1.0, rate_limit=5)
+        kept = sum(sampling.filter(make_record(args=(i,))) for i in range(20))
+        self.assertEqual(kept, 5)
+        self.assertTrue(sampling.filter(make_record(msg="Other template %s")))
+        self.assertTrue(all(sampling.filter(make_record(level=logging.WARNING)) for _ in range(20)))
+        self.assertEqual(sampling.suppressed, 15)
+
+    def test_debug_sampling(self):
+        sampling = SamplingFilter(debug_rate=0.0, rate_limit=0)
+        self.assertFalse(sampling.filter(make_record(level=logging.DEBUG)))
+        self.assertTrue(sampling.filter(make_record(level=logging.INFO)))
+
+if __name__ == "__main__":
+    unittest.main()
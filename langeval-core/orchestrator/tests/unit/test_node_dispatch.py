@@ -0,0 +1,92 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.node_dispatch import NodeDispatcher, resolve_policy, result_key
+
+def dispatch_patches(redis, send, partitions=None):
+    return (
+        patch("app.services.node_dispatch.resources.redis_client", redis),
+        patch("app.services.result_dispatcher.resources.redis_client", redis),
+        patch("app.services.node_dispatch.kafka_producer.send_and_wait", new=AsyncMock(side_effect=send)),
+        patch("app.services.node_dispatch.kafka_producer.partitions_for", new=AsyncMock(return_value=partitions or set())),
+    )
+
+class TestNodeDispatch(unittest.TestCase):
+
+    def test_resolve_policy_layers_overrides(self):
+        scenario = {"node_policies": {"default": {"timeout": 30}, "task": {"retries": 2}}}
+        with patch("app.services.node_dispatch.NODE_POLICIES", {"task": {"timeout": 90, "hedge_percentile": 95}}):
+            policy = resolve_policy("task", scenario, {"timeout": "45"})
+            other = resolve_policy("expectation", scenario)
+        self.assertEqual(policy["timeout"], 45.0)
+        self.assertEqual(policy["retries"], 2)
+        self.assertEqual(policy["hedge_percentile"], 95.0)
+        self.assertEqual(policy["name"], "task")
+        self.assertEqual((other["timeout"], other["retries"]), (30.0, 0))
+
+        stored = {"meta_data": {"node_policies": {"task": {"retries": 3}}}}
+        self.assertEqual(resolve_policy("task", stored)["retries"], 3)
+
+    def test_retry_after_failed_result(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            redis_key = result_key("c1", "n1")
+            replies = [{"status": "failed", "error": "rate limited"}, {"new_messages": ["ok"]}]
+            sent = []
+
+            async def worker(topic, payload, partition=None):
+                sent.append(payload["node_id"])
+                await redis.rpush(result_key("c1", payload["node_id"]), json.dumps(replies.pop(0)))
+
+            dispatcher = NodeDispatcher()
+            policy = {**resolve_policy("task"), "timeout": 1, "retries": 1, "backoff": 0}
+            p1, p2, p3, p4 = dispatch_patches(redis, worker)
+            with p1, p2, p3, p4:
+                raw = await dispatcher.call("t", {"node_id": "n1"}, redis_key, policy)
+            return raw, sent, dispatcher.stats()
+
+        raw, sent, stats = asyncio.run(scenario())
+        self.assertEqual(json.loads(raw), {"new_messages": ["ok"]})
+        self.assertEqual(sent, ["n1", "n1~1"])
+        self.assertEqual((stats["attempts"], stats["retries"]), (2, 1))
+
+    def test_hedge_to_next_partition_wins_when_primary_is_slow(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            redis_key = result_key("c1", "n1")
+            sent = []
+
+            async def worker(topic, payload, partition=None):
+                sent.append((payload["node_id"], partition))
+                # Consumer của partition 0 bị treo, chỉ bản sao có kết quả
+                if payload["node_id"] != "n1":
+                    await redis.rpush(result_key("c1", payload["node_id"]), json.dumps({"new_messages": ["fast"]}))
+                return SimpleNamespace(topic=topic, partition=partition if partition is not None else 0)
+
+            dispatcher = NodeDispatcher()
+            policy = {**resolve_policy("task"), "timeout": 2, "hedge_percentile": 95, "hedge_min_delay": 0.05}
+            p1, p2, p3, p4 = dispatch_patches(redis, worker, partitions={0, 1, 2})
+            with p1, p2, p3, p4:
+                raw = await dispatcher.call("t", {"node_id": "n1"}, redis_key, policy)
+                pending_left = await redis.exists(f"{redis_key}:pending")
+            return raw, sent, dispatcher.stats(), pending_left
+
+        raw, sent, stats, pending_left = asyncio.run(scenario())
+        self.assertEqual(json.loads(raw), {"new_messages": ["fast"]})
+        self.assertEqual(sent, [("n1", None), ("n1~1", 1)])
+        self.assertEqual((stats["hedges"], stats["hedge_wins"], stats["timeouts"]), (1, 1, 0))
+        self.assertEqual(stats["latency"]["task"]["samples"], 1)
+        self.assertEqual(pending_left, 0)
+
+if __name__ == "__main__":
+    unittest.main()
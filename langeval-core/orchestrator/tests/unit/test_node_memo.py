@@ -0,0 +1,82 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.node_memo import NodeMemo, node_memo, KEY_PREFIX
+from app.services import node_dispatch
+
+HISTORY = [{"role": "user", "content": "xin chào"}]
+
+def task_key(memo, metadata, history=HISTORY, instruction="Đặt vé", api_key="k1"):
+    return memo.key(
+        metadata, "task", history, instruction=instruction,
+        target_config={"model": "gpt-4o", "api_key": api_key}, model_config=None
+    )
+
+class TestNodeMemo(unittest.TestCase):
+
+    def test_key_is_deterministic_and_opt_in(self):
+        memo = NodeMemo()
+        replay = {"memoize": "replay", "agent_id": "a1", "agent_version": "v1"}
+        self.assertIsNone(task_key(memo, {"agent_id": "a1"}))
+        self.assertEqual(task_key(memo, replay), task_key(memo, {**replay, "memoize": "record"}))
+        # Xoay API key không làm mất cache
+        self.assertEqual(task_key(memo, replay), task_key(memo, replay, api_key="k2"))
+        self.assertNotEqual(task_key(memo, replay), task_key(memo, replay, instruction="Hủy vé"))
+        self.assertNotEqual(task_key(memo, replay), task_key(memo, replay, history=HISTORY * 2))
+        self.assertNotEqual(task_key(memo, replay), task_key(memo, {**replay, "agent_version": "v2"}))
+
+    def test_replay_serves_cached_result_without_kafka(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            redis_key = node_dispatch.result_key("c1", "n1")
+            memo_key = task_key(node_memo, {"memoize": "replay"})
+            replies = [{"status": "failed", "error": "LLM down"}, {"new_messages": ["live"]}]
+
+            async def worker_replies(topic, payload, partition=None):
+                await redis.rpush(redis_key, json.dumps(replies.pop(0)))
+
+            with patch("app.services.node_dispatch.resources.redis_client", redis), \
+                 patch("app.services.node_memo.resources.redis_client", redis), \
+                 patch("app.services.result_dispatcher.resources.redis_client", redis), \
+                 patch("app.services.node_dispatch.kafka_producer.send_and_wait", new=AsyncMock(side_effect=worker_replies)) as send:
+                failed = await node_dispatch.dispatch_and_wait("t", {}, redis_key, 1, memo_key=memo_key, replay=True)
+                live = await node_dispatch.dispatch_and_wait("t", {}, redis_key, 1, memo_key=memo_key, replay=True)
+                replayed = await node_dispatch.dispatch_and_wait("t", {}, redis_key, 1, memo_key=memo_key, replay=True)
+                return failed, live, replayed, send.await_count
+
+        failed, live, replayed, sends = asyncio.run(scenario())
+        self.assertEqual(json.loads(failed)["status"], "failed")
+        self.assertEqual(json.loads(live), {"new_messages": ["live"]})
+        self.assertEqual(replayed, live)
+        # Lỗi không được lưu -> lần 2 vẫn gọi worker; lần 3 lấy từ memo
+        self.assertEqual(sends, 2)
+
+    def test_size_based_eviction_drops_least_recently_used(self):
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            memo = NodeMemo()
+            with patch("app.services.node_memo.resources.redis_client", redis), \
+                 patch("app.services.node_memo.NODE_MEMO_MAX_ENTRIES", 2):
+                await memo.put("k1", json.dumps({"n": 1}))
+                await memo.put("k2", json.dumps({"n": 2}))
+                await memo.get("k1")
+                await memo.put("k3", json.dumps({"n": 3}))
+                kept = [await memo.get(k) is not None for k in ("k1", "k2", "k3")]
+                return kept, memo.evictions, await redis.zcard(f"{KEY_PREFIX}lru")
+
+        kept, evictions, size = asyncio.run(scenario())
+        self.assertEqual(kept, [True, False, True])
+        self.assertEqual(evictions, 1)
+        self.assertEqual(size, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+# Fix sys.path to find 'app' (và helper test cùng thư mục)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services import red_teaming_workflow
+from app.services.red_teaming_workflow import node_probe_wave, node_rt_progress, max_probes_for
+from fake_workers import FakeWorkers
+
+def probe_response(payload):
+    """Simulator trả lời từng probe; probe lẻ bị lọt lưới (toxicity cao)."""
+    probe = int(payload["node_id"].rsplit("_", 1)[1])
+    if payload["node_id"].startswith("rt_attack"):
+        return {"new_messages": [
+            {"role": "user", "content": f"probe {probe}"},
+            {"role": "assistant", "content": f"answer {probe}"},
+        ]}
+    return {"metrics": {"toxicity": 0.9 if probe % 2 else 0.1}}
+
+class TestRedTeamingParallel(unittest.TestCase):
+
+    def test_max_probes_scales_with_intensity(self):
+        self.assertEqual(max_probes_for({"intensity": 75}), 7)
+        self.assertEqual(max_probes_for({"intensity": 30}), 3)
+        self.assertEqual(max_probes_for({"intensity": 75, "max_probes": 300}), 300)
+
+    def test_wave_runs_probes_concurrently_and_aggregates(self):
+        async def scenario():
+            workers = FakeWorkers(probe_response)
+            state = {
+                "campaign_id": "rt1", "agent_id": "a1", "total_probes": 0, "messages": [],
+                "metadata": {"parallel": True, "concurrency": 3, "max_probes": 5},
+            }
+            with patch.object(red_teaming_workflow, "dispatch_and_wait", new=workers.dispatch), \
+                 patch("app.services.resource_client.get_adversarial_prompt", new=AsyncMock(return_value="attack")):
+                first = await node_probe_wave(state)
+                second = await node_probe_wave({**state, "total_probes": first["total_probes"]})
+            return workers, first, second
+
+        workers, first, second = asyncio.run(scenario())
+        self.assertEqual(workers.peak, 3)
+        self.assertEqual((first["total_probes"], second["total_probes"]), (3, 2))
+        self.assertEqual(len(set(workers.calls)), 10)
+        self.assertEqual((first["successful_attacks"], first["blocked_attacks"]), (1, 2))
+        self.assertEqual((first["critical_count"], first["low_count"]), (1, 2))
+        self.assertEqual([entry["probe_index"] for entry in first["logs"]], [0, 1, 2])
+        self.assertEqual([entry["probe"] for entry in second["logs"]], ["probe 3", "probe 4"])
+
+    def test_progress_sends_only_new_logs(self):
+        async def scenario():
+            state = {
+                "campaign_id": "rt1", "total_probes": 3, "reported_logs": 2,
+                "logs": [{"id": "l1"}, {"id": "l2"}, {"id": "l3"}], "metadata": {"max_probes": 4},
+            }
+            with patch("app.services.resource_client.append_red_teaming_progress", new=AsyncMock(return_value=True)) as append:
+                update = await node_rt_progress(state)
+            return update, append.await_args.args
+
+        update, (campaign_id, delta) = asyncio.run(scenario())
+        self.assertEqual(campaign_id, "rt1")
+        self.assertEqual(delta["logs"], [{"id": "l3"}])
+        self.assertEqual((delta["total_probes"], delta["progress"], delta["status"]), (3, 75, "running"))
+        self.assertEqual(update, {"progress": 75, "status": "running", "reported_logs": 3})
+
+    def test_failed_append_resends_unacked_logs(self):
+        async def scenario():
+            state = {
+                "campaign_id": "rt1", "total_probes": 2, "reported_logs": 1,
+                "logs": [{"id": "l1"}, {"id": "l2"}], "metadata": {"max_probes": 4},
+            }
+            with patch("app.services.resource_client.append_red_teaming_progress",
+                       new=AsyncMock(side_effect=[False, True])) as append:
+                first = await node_rt_progress(state)
+                state = {**state, **first, "total_probes": 3, "logs": state["logs"] + [{"id": "l3"}]}
+                second = await node_rt_progress(state)
+            return first, second, [call.args[1]["logs"] for call in append.await_args_list]
+
+        first, second, sent = asyncio.run(scenario())
+        self.assertEqual(first["reported_logs"], 1)
+        self.assertEqual(sent, [[{"id": "l2"}], [{"id": "l2"}, {"id": "l3"}]])
+        self.assertEqual(second["reported_logs"], 3)
+
+    def test_failed_final_append_raises(self):
+        state = {"campaign_id": "rt1", "total_probes": 4, "logs": [{"id": "l1"}], "metadata": {"max_probes": 4}}
+        with patch("app.services.resource_client.append_red_teaming_progress", new=AsyncMock(return_value=False)):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(node_rt_progress(state))
+
+if __name__ == "__main__":
+    unittest.main()
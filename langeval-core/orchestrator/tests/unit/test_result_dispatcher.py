@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import patch
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.result_dispatcher import ResultDispatcher, RESULT_CHANNEL
+
+class FakePubSub:
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        pass
+
+    async def unsubscribe(self, *channels):
+        pass
+
+    async def aclose(self):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class FakeRedis:
+    """In-memory stand-in for the list + publish commands used by workers."""
+    def __init__(self):
+        self.lists = {}
+        self._pubsub = FakePubSub()
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return self._pubsub
+
+    async def lpop(self, key):
+        items = self.lists.get(key)
+        return items.pop(0) if items else None
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    async def publish(self, channel, message):
+        await self._pubsub.queue.put({"type": "message", "channel": channel, "data": message})
+
+class TestResultDispatcher(unittest.TestCase):
+
+    def run_with_dispatcher(self, scenario):
+        async def runner():
+            redis = FakeRedis()
+            with patch("app.services.result_dispatcher.resources.redis_client", redis):
+                dispatcher = ResultDispatcher()
+                await dispatcher.start()
+                try:
+                    return await scenario(dispatcher, redis)
+                finally:
+                    await dispatcher.stop()
+        return asyncio.run(runner())
+
+    def test_result_published_after_wait(self):
+        async def scenario(dispatcher, redis):
+            key = "campaign:c1:node:n1:result"
+            waiter = asyncio.create_task(dispatcher.wait(key, timeout=2))
+            await asyncio.sleep(0.05)
+            await redis.rpush(key, '{"ok": true}')
+            await redis.publish(RESULT_CHANNEL, key)
+            return await waiter, dispatcher.pending
+
+        result, pending = self.run_with_dispatcher(scenario)
+        self.assertEqual(result, '{"ok": true}')
+        self.assertEqual(pending, 0)
+
+    def test_result_pushed_before_wait(self):
+        async def scenario(dispatcher, redis):
+            key = "campaign:c1:node:n2:result"
+            await redis.rpush(key, "early")
+            return await dispatcher.wait(key, timeout=1)
+
+        self.assertEqual(self.run_with_dispatcher(scenario), "early")
+
+    def test_timeout_returns_none(self):
+        async def scenario(dispatcher, redis):
+            result = await dispatcher.wait("campaign:c1:node:n3:result", timeout=0.1)
+            return result, dispatcher.pending
+
+        self.assertEqual(self.run_with_dispatcher(scenario), (None, 0))
+
+if __name__ == "__main__":
+    unittest.main()
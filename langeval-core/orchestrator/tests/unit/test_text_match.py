@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core import text_match
+from app.core.text_match import KeywordMatcher, Match, pii_patterns, politeness_matcher
+from app.services.red_teaming_workflow import is_refusal_response
+
+class TestTextMatch(unittest.TestCase):
+
+    def test_keyword_offsets_prefer_longest_match(self):
+        matcher = KeywordMatcher(["sorry", "i'm sorry", "cannot", "can"])
+        text = "Well, I'm SORRY but I cannot."
+        self.assertEqual(matcher.findall(text), [Match(6, 15, "i'm sorry"), Match(22, 28, "cannot")])
+        self.assertEqual(text[6:15], "I'm SORRY")
+
+    def test_offsets_survive_length_changing_lowercase(self):
+        matcher = KeywordMatcher(["sorry"])
+        text = "İstanbul: Sorry"
+        found = matcher.search(text)
+        self.assertEqual(text[found.start:found.end], "Sorry")
+        self.assertEqual(found.label, "sorry")
+
+    def test_start_boundary(self):
+        self.assertFalse(politeness_matcher.contains("this is it"))
+        self.assertTrue(politeness_matcher.contains("Thanks a lot"))
+        self.assertTrue(politeness_matcher.contains("Dạ, Xin chào anh"))
+        self.assertFalse(KeywordMatcher(["thank"], boundary="word").contains("thanks"))
+
+    def test_small_sets_match_like_the_trie(self):
+        """Tập nhỏ dùng str.find, tập lớn dùng regex trie: kết quả phải giống nhau"""
+        keywords = ["thank", "thanks", "hi", "xin chào", "can", "cannot", "not"]
+        texts = ["Thanks, hi! I cannot. Xin chào", "this cannot be", "nothing", "chi hi-hi", ""]
+        for boundary in (None, "start", "word"):
+            small = KeywordMatcher(keywords, boundary=boundary)
+            with patch.object(text_match, "TRIE_MIN_KEYWORDS", 1):
+                trie = KeywordMatcher(keywords, boundary=boundary)
+            self.assertFalse(small.use_trie)
+            self.assertTrue(trie.use_trie)
+            for text in texts:
+                self.assertEqual(small.findall(text), trie.findall(text), (boundary, text))
+                self.assertEqual(small.contains(text), trie.contains(text), (boundary, text))
+
+    def test_pii_masked(self):
+        masked = pii_patterns.sub("mail john.doe@example.com or call 0912345678")
+        self.assertEqual(masked, "mail <EMAIL> or call <PHONE>")
+        self.assertEqual([m.label for m in pii_patterns.finditer("0912345678 a@b.c")], ["PHONE", "EMAIL"])
+
+    def test_refusal_response(self):
+        self.assertTrue(is_refusal_response("I'm sorry, I cannot help with that."))
+        self.assertTrue(is_refusal_response("Xin lỗi, tôi không thể hỗ trợ yêu cầu này."))
+        self.assertFalse(is_refusal_response("Here is the recipe you asked for."))
+        self.assertFalse(is_refusal_response("sorry " + "x" * 1200))
+
+if __name__ == "__main__":
+    unittest.main()
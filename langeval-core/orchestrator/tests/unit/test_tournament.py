@@ -0,0 +1,118 @@
+import unittest
+import asyncio
+import sys
+import os
+from itertools import combinations
+from unittest.mock import AsyncMock, patch
+
+# Fix sys.path to find 'app' (và helper test cùng thư mục)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.schemas import CreateTournamentRequest
+from app.services import tournament
+from app.services.tournament import round_robin_rounds, swiss_pairings, run_tournament
+from fake_workers import FakeWorkers
+
+def tournament_response(payload):
+    """Judge luôn chọn câu trả lời ở vị trí A."""
+    if "response_a" in payload:
+        return {"winner": "A", "reason": "first is better"}
+    return {"new_messages": [{"role": "assistant", "content": f"{payload['agent_id']}: {payload['instruction']}"}]}
+
+class TestTournament(unittest.TestCase):
+
+    def test_round_robin_schedules_every_pair_once(self):
+        for n in (4, 5):
+            agents = [f"a{i}" for i in range(n)]
+            rounds = round_robin_rounds(agents)
+            pairs = [frozenset(p) for r in rounds for p in r]
+            self.assertEqual(sorted(map(sorted, pairs)), sorted(map(sorted, map(frozenset, combinations(agents, 2)))))
+            for r in rounds:
+                self.assertEqual(len({a for p in r for a in p}), 2 * len(r))
+
+    def test_swiss_pairs_by_points_without_rematch(self):
+        agents = ["a", "b", "c", "d"]
+        self.assertEqual(swiss_pairings(agents, {"c": 2, "a": 1}, set()), [("c", "a"), ("b", "d")])
+        self.assertEqual(swiss_pairings(agents, {"c": 2, "a": 1}, {frozenset(("c", "a"))}), [("c", "b"), ("a", "d")])
+        self.assertEqual(len(swiss_pairings(agents[:3], {}, set())), 1)
+
+    def test_responses_are_reused_across_pairings(self):
+        workers = FakeWorkers(tournament_response, delay=0.01)
+        req = CreateTournamentRequest(
+            tournament_id="t1", agent_ids=["a", "b", "c", "d"], prompts=["p0", "p1"], concurrency=3
+        )
+
+        async def scenario():
+            with patch.object(tournament, "dispatch_and_wait", new=workers.dispatch), \
+                 patch.object(tournament, "record_tournament_matches", new=AsyncMock(return_value={})) as record, \
+                 patch.object(tournament, "update_tournament_data", new=AsyncMock()), \
+                 patch.object(tournament, "get_tournament_matches", new=AsyncMock(return_value=[])):
+                summary = await run_tournament(req)
+            return summary, [call.args[1]["matches"] for call in record.await_args_list]
+
+        summary, batches = asyncio.run(scenario())
+        generations = [c for c in workers.calls if c.startswith("gen_")]
+        self.assertEqual(len(generations), 8)
+        self.assertEqual(len(set(generations)), 8)
+        self.assertEqual(summary["completed_matches"], 12)
+        self.assertEqual(len(batches), 3)
+        self.assertLessEqual(workers.peak, 3)
+
+        match = next(m for m in batches[0] if m["prompt_index"] == 1)
+        self.assertEqual(match["winner"], "agent_b")  # judge thấy B ở vị trí A khi prompt lẻ
+        self.assertEqual(match["response_a"], f"{match['agent_a_id']}: p1")
+        self.assertEqual(len({m["id"] for b in batches for m in b}), 12)
+
+    def test_restarted_swiss_rebuilds_points_from_recorded_rounds(self):
+        workers = FakeWorkers(tournament_response, delay=0.01)
+        req = CreateTournamentRequest(
+            tournament_id="t2", agent_ids=["a", "b", "c", "d"], prompts=["p0"], format="swiss", rounds=2
+        )
+        recorded = [
+            {"id": "t2:r0:a:b:p0", "round": 0, "agent_a_id": "a", "agent_b_id": "b", "prompt_index": 0, "winner": "agent_b"},
+            {"id": "t2:r0:c:d:p0", "round": 0, "agent_a_id": "c", "agent_b_id": "d", "prompt_index": 0, "winner": "agent_a"},
+        ]
+
+        async def scenario():
+            with patch.object(tournament, "dispatch_and_wait", new=workers.dispatch), \
+                 patch.object(tournament, "record_tournament_matches", new=AsyncMock(return_value={})) as record, \
+                 patch.object(tournament, "update_tournament_data", new=AsyncMock()), \
+                 patch.object(tournament, "get_tournament_matches", new=AsyncMock(return_value=recorded)):
+                summary = await run_tournament(req)
+            return summary, [call.args[1]["matches"] for call in record.await_args_list]
+
+        summary, batches = asyncio.run(scenario())
+        self.assertFalse([c for c in workers.calls if c.startswith("judge_r0")])
+        self.assertEqual(len(batches), 1)
+        self.assertEqual({(m["agent_a_id"], m["agent_b_id"]) for m in batches[0]}, {("b", "c"), ("a", "d")})
+        self.assertEqual(summary["completed_matches"], 4)
+
+    def test_failed_round_record_is_retried_then_fails_the_tournament(self):
+        req = CreateTournamentRequest(tournament_id="t3", agent_ids=["a", "b"], prompts=["p0"])
+
+        async def scenario(record):
+            workers = FakeWorkers(tournament_response, delay=0)
+            with patch.object(tournament, "dispatch_and_wait", new=workers.dispatch), \
+                 patch.object(tournament, "record_tournament_matches", new=record), \
+                 patch.object(tournament, "update_tournament_data", new=AsyncMock()) as update, \
+                 patch.object(tournament, "get_tournament_matches", new=AsyncMock(return_value=[])), \
+                 patch.object(tournament, "RECORD_RETRY_DELAY", 0):
+                try:
+                    return await run_tournament(req), update
+                except RuntimeError as e:
+                    return e, update
+
+        flaky = AsyncMock(side_effect=[None, {}])
+        summary, _ = asyncio.run(scenario(flaky))
+        self.assertEqual(flaky.await_count, 2)
+        self.assertEqual((summary["status"], summary["completed_matches"]), ("completed", 1))
+
+        down = AsyncMock(return_value=None)
+        error, update = asyncio.run(scenario(down))
+        self.assertIsInstance(error, RuntimeError)
+        self.assertEqual(down.await_count, tournament.RECORD_ATTEMPTS)
+        self.assertEqual(update.await_args.args[1], {"status": "failed"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import json
+import sys
+import os
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core import wire
+
+PAYLOAD = {
+    "campaign_id": "c1",
+    "node_id": "n1",
+    "history": [{"role": "user", "content": "xin chào"}] * 3,
+    "target_config": {"timeout": 30, "ratio": 0.5, "enabled": True, "extra": None},
+}
+
+class TestWire(unittest.TestCase):
+
+    def test_legacy_json_without_headers(self):
+        self.assertEqual(wire.decode(json.dumps(PAYLOAD).encode("utf-8")), PAYLOAD)
+        self.assertEqual(wire.decode(json.dumps(PAYLOAD).encode("utf-8"), []), PAYLOAD)
+
+    def test_json_round_trip(self):
+        data, headers = wire.encode(PAYLOAD, fmt="json")
+        self.assertIn(("content-type", b"application/json"), headers)
+        self.assertIn(("wire-version", b"1"), headers)
+        self.assertEqual(wire.decode(data, headers), PAYLOAD)
+        # JSON text vẫn đọc được bằng stdlib (data-ingestion, orchestrator cũ)
+        self.assertEqual(json.loads(wire.dumps(PAYLOAD)), PAYLOAD)
+
+    @unittest.skipUnless(wire.msgpack, "msgpack not installed")
+    def test_msgpack_round_trip(self):
+        data, headers = wire.encode(PAYLOAD, fmt="msgpack")
+        self.assertIn(("content-type", b"application/msgpack"), headers)
+        self.assertEqual(wire.decode(data, headers), PAYLOAD)
+
+    def test_unknown_version_or_content_type_is_rejected(self):
+        data, _ = wire.encode(PAYLOAD, fmt="json")
+        with self.assertRaises(ValueError):
+            wire.decode(data, [("content-type", b"application/json"), ("wire-version", b"2")])
+        with self.assertRaises(ValueError):
+            wire.decode(data, [("content-type", b"application/xml")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,9 +10,15 @@ from app.models.domain import (
     BattleCampaignUpdate,
     BattleTurn,
     BattleTurnCreate,
+    BattleTournament,
+    BattleTournamentCreate,
+    BattleTournamentUpdate,
+    TournamentMatch,
+    TournamentMatchBatch,
+    TournamentRating,
     Page
 )
-from app.services.battle_service import BattleService
+from app.services.battle_service import BattleService, TournamentService
 from math import ceil
 
 router = APIRouter()
@@ -114,3 +120,106 @@ def add_turn(
     """
     service = BattleService(db, workspace_id)
     return service.add_turn(turn_in)
+
+# --- Tournaments ---
+
+@router.post("/tournaments", response_model=BattleTournament)
+def create_tournament(
+    *,
+    db: Session = Depends(get_session),
+    tournament_in: BattleTournamentCreate,
+    workspace_id: uuid.UUID = Depends(get_current_workspace)
+) -> BattleTournament:
+    """
+    Tạo giải đấu nhiều Agent (rating Elo khởi tạo cho từng Agent).
+    """
+    service = TournamentService(db, workspace_id)
+    try:
+        return service.create(tournament_in)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/tournaments", response_model=List[BattleTournament])
+def list_tournaments(
+    *,
+    db: Session = Depends(get_session),
+    skip: int = 0,
+    limit: int = 100,
+    workspace_id: uuid.UUID = Depends(get_current_workspace)
+) -> List[BattleTournament]:
+    service = TournamentService(db, workspace_id)
+    return service.get_multi(skip=skip, limit=limit)
+
+@router.get("/tournaments/{tournament_id}", response_model=BattleTournament)
+def get_tournament(
+    *,
+    db: Session = Depends(get_session),
+    tournament_id: str,
+    workspace_id: Optional[uuid.UUID] = Depends(get_current_workspace_or_none)
+) -> BattleTournament:
+    service = TournamentService(db, workspace_id)
+    tournament = service.get(tournament_id)
+    if not tournament:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return tournament
+
+@router.patch("/tournaments/{tournament_id}", response_model=BattleTournament)
+def update_tournament(
+    *,
+    db: Session = Depends(get_session),
+    tournament_id: str,
+    tournament_update: BattleTournamentUpdate,
+    workspace_id: Optional[uuid.UUID] = Depends(get_current_workspace_or_none)
+) -> BattleTournament:
+    """
+    Cập nhật trạng thái giải đấu (được gọi từ Orchestrator).
+    """
+    service = TournamentService(db, workspace_id)
+    tournament = service.get(tournament_id)
+    if not tournament:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return service.update(tournament, tournament_update)
+
+@router.post("/tournaments/{tournament_id}/matches", response_model=BattleTournament)
+def record_tournament_matches(
+    *,
+    db: Session = Depends(get_session),
+    tournament_id: str,
+    batch: TournamentMatchBatch,
+    workspace_id: Optional[uuid.UUID] = Depends(get_current_workspace_or_none)
+) -> BattleTournament:
+    """
+    Ghi nhận các trận mới và cập nhật Elo (được gọi từ Orchestrator).
+    """
+    service = TournamentService(db, workspace_id)
+    tournament = service.record_matches(tournament_id, batch)
+    if not tournament:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return tournament
+
+@router.get("/tournaments/{tournament_id}/matches", response_model=List[TournamentMatch])
+def get_tournament_matches(
+    *,
+    db: Session = Depends(get_session),
+    tournament_id: str,
+    workspace_id: Optional[uuid.UUID] = Depends(get_current_workspace_or_none)
+) -> List[TournamentMatch]:
+    service = TournamentService(db, workspace_id)
+    if not service.get(tournament_id):
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return service.get_matches(tournament_id)
+
+@router.get("/tournaments/{tournament_id}/standings", response_model=List[TournamentRating])
+def get_tournament_standings(
+    *,
+    db: Session = Depends(get_session),
+    tournament_id: str,
+    workspace_id: Optional[uuid.UUID] = Depends(get_current_workspace_or_none)
+) -> List[TournamentRating]:
+    """
+    Bảng xếp hạng theo rating Elo hiện tại.
+    """
+    service = TournamentService(db, workspace_id)
+    if not service.get(tournament_id):
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return service.get_standings(tournament_id)
@@ -8,6 +8,7 @@ from app.models.domain import (
     RedTeamingCampaign, 
     RedTeamingCampaignCreate, 
     RedTeamingCampaignUpdate,
+    RedTeamingProgressDelta,
     Page
 )
 from app.services.red_teaming_service import RedTeamingService
@@ -109,7 +110,7 @@ def get_campaign_logs(
     campaign = service.get(campaign_id)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    return {"data": campaign.logs}
+    return {"data": service.get_logs(campaign)}
 
 @router.get("/campaigns/{campaign_id}/stats")
 def get_campaign_stats(
@@ -151,3 +152,20 @@ def update_campaign(
         raise HTTPException(status_code=404, detail="Campaign not found")
     
     return service.update(campaign, campaign_update)
+
+@router.post("/campaigns/{campaign_id}/progress", response_model=RedTeamingCampaign)
+def append_campaign_progress(
+    *,
+    db: Session = Depends(get_session),
+    campaign_id: str,
+    delta: RedTeamingProgressDelta,
+    workspace_id: Optional[uuid.UUID] = Depends(get_current_workspace_or_none)
+) -> RedTeamingCampaign:
+    """
+    Append log của các probe mới và cộng dồn counters (được gọi từ Orchestrator sau mỗi probe / wave).
+    """
+    service = RedTeamingService(db, workspace_id)
+    campaign = service.append_progress(campaign_id, delta)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
@@ -5,6 +5,7 @@ from sqlmodel import Session
 from app.core.database import get_session
 from app.models.domain import ScenarioRef, ScenarioUpdate, ScenarioCreate, Page
 from app.services.scenario_service import ScenarioService
+from app.services.scenario_compiler import ScenarioCompileError, compile_scenario
 from app.api.deps import get_current_workspace
 
 import httpx
@@ -42,11 +43,23 @@ async def create_scenario(
     service = ScenarioService(session, workspace_id)
     try:
         return service.create_scenario(scenario_in)
+    except ScenarioCompileError as e:
+        raise HTTPException(status_code=422, detail={"message": "Invalid scenario graph", "errors": e.errors})
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Create Scenario failed: {str(e)}")
 
+@router.post("/compile")
+def compile_scenario_preview(scenario_in: ScenarioCreate):
+    """
+    Validate graph và trả về execution plan (không lưu) để Scenario Builder báo lỗi sớm.
+    """
+    try:
+        return compile_scenario(scenario_in.nodes, scenario_in.edges)
+    except ScenarioCompileError as e:
+        raise HTTPException(status_code=422, detail={"message": "Invalid scenario graph", "errors": e.errors})
+
 @router.get("", response_model=Page[ScenarioRef])
 def read_scenarios(
     page: int = 1, 
@@ -84,6 +97,10 @@ def update_scenario(
         if not updated_scenario:
             raise HTTPException(status_code=404, detail="Scenario not found")
         return updated_scenario
+    except HTTPException:
+        raise
+    except ScenarioCompileError as e:
+        raise HTTPException(status_code=422, detail={"message": "Invalid scenario graph", "errors": e.errors})
     except Exception as e:
         import traceback
         traceback.print_exc()
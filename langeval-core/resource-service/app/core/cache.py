@@ -4,6 +4,9 @@ from typing import Optional, Any
 from functools import wraps
 import os
 
+# Kênh Pub/Sub thông báo Agent/Model thay đổi (Orchestrator lắng nghe để xóa config cache)
+RESOURCE_EVENTS_CHANNEL = os.getenv("RESOURCE_EVENTS_CHANNEL", "resource:invalidate")
+
 class CacheService:
     """
     Redis caching service cho frequently accessed data.
@@ -73,6 +76,17 @@ class CacheService:
         except Exception as e:
             print(f"Cache delete pattern error for '{pattern}': {e}")
     
+    def publish_invalidation(self, resource_type: str, resource_id: str):
+        """Thông báo cho các service khác rằng resource đã thay đổi"""
+        if not self.enabled:
+            return
+        
+        try:
+            message = json.dumps({"type": resource_type, "id": str(resource_id)})
+            self.client.publish(RESOURCE_EVENTS_CHANNEL, message)
+        except Exception as e:
+            print(f"Cache publish error for {resource_type}:{resource_id}: {e}")
+    
     def clear_all(self):
         """Xóa toàn bộ cache (dùng cho testing)"""
         if not self.enabled:
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy import inspect, text
 from sqlalchemy.pool import QueuePool
 from app.core.config import settings
 import os
@@ -27,6 +28,25 @@ engine = create_engine(
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+
+def add_missing_columns():
+    """
+    create_all không thêm cột mới vào bảng đã tồn tại: bổ sung các cột nullable còn thiếu
+    (vd scenario_ref.execution_plan) để DB cũ chạy được với model mới.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
 
 def get_session():
     with Session(engine) as session:
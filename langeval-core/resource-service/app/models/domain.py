@@ -188,6 +188,9 @@ class ScenarioRef(SQLModel, table=True):
     description: Optional[str] = None
     agent_id: Optional[str] = Field(default=None, index=True)
     meta_data: Dict = Field(default={}, sa_column=Column(JSON))
+    # Execution plan biên dịch lúc lưu (scenario_compiler), orchestrator dùng trực tiếp
+    execution_plan: Dict = Field(default={}, sa_column=Column(JSON))
+    plan_hash: Optional[str] = Field(default=None, index=True)
     updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     
     __table_args__ = (
@@ -238,8 +241,8 @@ class ScenarioCreate(SQLModel):
                 "description": "Tests the agent's ability to process refunds.",
                 "workspace_id": "660e8400-e29b-41d4-a716-446655441111",
                 "nodes": [
-                    {"id": "start", "type": "input", "position": {"x": 0, "y": 0}, "data": {"label": "USER START"}},
-                    {"id": "node-1", "type": "custom", "position": {"x": 200, "y": 0}, "data": {"content": "I want a refund for item #123"}}
+                    {"id": "start", "type": "start", "position": {"x": 0, "y": 0}, "data": {"label": "USER START"}},
+                    {"id": "node-1", "type": "task", "position": {"x": 200, "y": 0}, "data": {"instruction": "I want a refund for item #123"}}
                 ],
                 "edges": [
                     {"id": "e1", "source": "start", "target": "node-1"}
@@ -431,6 +434,34 @@ class RedTeamingCampaignUpdate(SQLModel):
     logs: Optional[List[Dict]] = None
     meta_data: Optional[Dict] = None
 
+class RedTeamingLog(SQLModel, table=True):
+    """
+    Log của từng probe Red Teaming (append-only, thay cho việc ghi lại cả cột JSON `logs`).
+    """
+    __tablename__ = "red_teaming_log"
+
+    id: str = Field(primary_key=True) # id của log entry do Orchestrator sinh -> append idempotent
+    campaign_id: str = Field(index=True)
+    probe_index: Optional[int] = None
+    severity: str = Field(default="low", index=True)
+    type: str = Field(default="blocked") # success, blocked
+    entry: Dict = Field(default={}, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_redteam_log_campaign_created', 'campaign_id', 'created_at'),
+    )
+
+class RedTeamingProgressDelta(SQLModel):
+    """
+    Cập nhật tiến độ dạng delta: chỉ các log mới. Counters lỗ hổng được cộng từ log mới chèn;
+    total_probes / progress / status là giá trị tuyệt đối.
+    """
+    logs: List[Dict] = []
+    total_probes: Optional[int] = None
+    progress: Optional[int] = None
+    status: Optional[str] = None
+
 # --- Battle Arena Models ---
 
 class BattleCampaign(SQLModel, table=True):
@@ -536,6 +567,7 @@ class BattleTurn(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class BattleTurnCreate(SQLModel):
+    id: Optional[str] = None # id xác định do Orchestrator sinh -> gửi lại lượt không tạo bản ghi trùng
     campaign_id: str
     turn_number: int
     user_message: str
@@ -549,6 +581,115 @@ class BattleTurnCreate(SQLModel):
     confidence: Optional[float] = 0
     meta_data: Optional[Dict] = {}
 
+# --- Battle Tournament Models ---
+
+class BattleTournament(SQLModel, table=True):
+    """
+    Giải đấu nhiều Agent (Battle Arena): các cặp đấu được lên lịch (round-robin / swiss) trên một bộ prompt,
+    rating Elo của từng Agent được cập nhật dần sau mỗi trận.
+    """
+    __tablename__ = "battle_tournament"
+
+    id: Optional[str] = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
+    workspace_id: uuid.UUID = Field(index=True)
+    name: str = Field(index=True)
+    status: str = Field(default="queued", index=True) # queued, running, completed, failed
+    format: str = Field(default="round_robin") # round_robin, swiss
+
+    agent_ids: List[str] = Field(default=[], sa_column=Column(JSON))
+    prompts: List[str] = Field(default=[], sa_column=Column(JSON))
+    rounds: Optional[int] = None # swiss: số vòng; round_robin: N-1 (N lẻ: N)
+    k_factor: float = Field(default=32.0)
+
+    total_matches: int = Field(default=0)
+    completed_matches: int = Field(default=0)
+
+    meta_data: Dict = Field(default={}, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BattleTournamentCreate(SQLModel):
+    name: str
+    format: Optional[str] = "round_robin"
+    agent_ids: List[str]
+    prompts: List[str]
+    rounds: Optional[int] = None
+    k_factor: Optional[float] = 32.0
+    meta_data: Optional[Dict] = {}
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "name": "Support bots ranking",
+                "format": "round_robin",
+                "agent_ids": ["agent-gpt4", "agent-claude3", "agent-llama3"],
+                "prompts": ["Tôi muốn đổi trả đơn hàng", "How do I reset my password?"]
+            }
+        }
+    }
+
+class BattleTournamentUpdate(SQLModel):
+    status: Optional[str] = None
+    total_matches: Optional[int] = None
+    meta_data: Optional[Dict] = None
+
+class TournamentRating(SQLModel, table=True):
+    """
+    Rating Elo hiện tại của một Agent trong giải đấu.
+    """
+    __tablename__ = "battle_tournament_rating"
+
+    id: Optional[str] = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
+    tournament_id: str = Field(index=True)
+    agent_id: str = Field(index=True)
+    rating: float = Field(default=1500.0)
+    matches: int = Field(default=0)
+    wins: int = Field(default=0)
+    losses: int = Field(default=0)
+    ties: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TournamentMatch(SQLModel, table=True):
+    """
+    Một trận (cặp Agent x một prompt) của giải đấu.
+    """
+    __tablename__ = "battle_tournament_match"
+
+    id: str = Field(primary_key=True) # id do Orchestrator sinh -> ghi nhận idempotent
+    tournament_id: str = Field(index=True)
+    round: int = Field(default=0)
+    agent_a_id: str
+    agent_b_id: str
+    prompt_index: int = Field(default=0)
+    response_a: Optional[str] = None
+    response_b: Optional[str] = None
+    winner: str = Field(default="tie") # agent_a, agent_b, tie
+    judge_reasoning: Optional[str] = None
+    rating_delta: float = Field(default=0) # thay đổi rating của agent_a (agent_b nhận giá trị âm)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_tournament_match_round', 'tournament_id', 'round'),
+    )
+
+class TournamentMatchCreate(SQLModel):
+    id: str
+    round: int = 0
+    agent_a_id: str
+    agent_b_id: str
+    prompt_index: int = 0
+    response_a: Optional[str] = None
+    response_b: Optional[str] = None
+    winner: str = "tie"
+    judge_reasoning: Optional[str] = None
+
+class TournamentMatchBatch(SQLModel):
+    """
+    Các trận mới hoàn thành (gửi theo vòng). status là giá trị tuyệt đối.
+    """
+    matches: List[TournamentMatchCreate] = []
+    status: Optional[str] = None
+
 # --- Benchmark Models ---
 
 class BenchmarkResult(SQLModel, table=True):
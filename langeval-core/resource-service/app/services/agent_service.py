@@ -80,6 +80,7 @@ class AgentService:
         # Invalidate cache
         cache_service.delete(f"agent:{agent_id}")
         cache_service.delete_pattern("agents_list:*")
+        cache_service.publish_invalidation("agent", agent_id)
         
         return result
 
@@ -90,5 +91,6 @@ class AgentService:
         if agent:
             cache_service.delete(f"agent:{agent_id}")
             cache_service.delete_pattern("agents_list:*")
+            cache_service.publish_invalidation("agent", agent_id)
         
         return agent is not None
@@ -1,9 +1,19 @@
 from typing import List, Optional, Dict
-from sqlmodel import Session
-from app.models.domain import BattleCampaign, BattleCampaignCreate, BattleCampaignUpdate, BattleTurn, BattleTurnCreate
+from datetime import datetime
+from sqlmodel import Session, select
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.models.domain import (
+    BattleCampaign, BattleCampaignCreate, BattleCampaignUpdate, BattleTurn, BattleTurnCreate,
+    BattleTournament, BattleTournamentCreate, BattleTournamentUpdate,
+    TournamentRating, TournamentMatch, TournamentMatchBatch
+)
 from app.repositories.battle import BattleCampaignRepository, BattleTurnRepository
 import uuid
 
+INITIAL_RATING = 1500.0
+MATCH_SCORES = {"agent_a": 1.0, "agent_b": 0.0, "tie": 0.5}
+
 class BattleService:
     def __init__(self, db: Session, workspace_id: Optional[uuid.UUID] = None):
         self.campaign_repo = BattleCampaignRepository(db)
@@ -45,11 +55,19 @@ class BattleService:
 
     # --- Turn Management ---
     def add_turn(self, obj_in: BattleTurnCreate) -> BattleTurn:
-        db_obj = BattleTurn(
-            id=str(uuid.uuid4()),
-            **obj_in.dict()
-        )
-        turn = self.turn_repo.create(db_obj)
+        if obj_in.id:
+            # Lượt đã ghi (Orchestrator chạy lại wave sau restart): không tạo bản ghi trùng, không cộng stats lần nữa
+            existing = self.turn_repo.get(obj_in.id)
+            if existing:
+                return existing
+        data = obj_in.dict()
+        data["id"] = obj_in.id or str(uuid.uuid4())
+        try:
+            turn = self.turn_repo.create(BattleTurn(**data))
+        except IntegrityError:
+            # Hai lần gửi đồng thời cùng id: lần sau lấy bản ghi của lần trước
+            self.session.rollback()
+            return self.turn_repo.get(data["id"])
         
         # After adding a turn, update campaign stats
         campaign = self.get_campaign(obj_in.campaign_id)
@@ -73,3 +91,139 @@ class BattleService:
 
     def get_turns(self, campaign_id: str) -> List[BattleTurn]:
         return self.turn_repo.get_by_campaign(campaign_id)
+
+
+def expected_score(rating_a: float, rating_b: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((rating_b - rating_a) / 400.0))
+
+def elo_delta(rating_a: float, rating_b: float, score_a: float, k_factor: float) -> float:
+    """Thay đổi rating của A sau một trận (B thay đổi ngược dấu)."""
+    return k_factor * (score_a - expected_score(rating_a, rating_b))
+
+def planned_matches(format: str, agents: int, prompts: int, rounds: Optional[int] = None) -> int:
+    if format == "swiss":
+        return (rounds or 0) * (agents // 2) * prompts
+    return agents * (agents - 1) // 2 * prompts
+
+class TournamentService:
+    def __init__(self, db: Session, workspace_id: Optional[uuid.UUID] = None):
+        self.workspace_id = workspace_id
+        self.session = db
+
+    def create(self, obj_in: BattleTournamentCreate) -> BattleTournament:
+        data = obj_in.dict()
+        data["agent_ids"] = list(dict.fromkeys(data["agent_ids"]))
+        if len(data["agent_ids"]) < 2:
+            raise ValueError("Tournament needs at least 2 distinct agents")
+        if not data["prompts"]:
+            raise ValueError("Tournament needs at least 1 prompt")
+        data["format"] = data.get("format") or "round_robin"
+        if data["format"] not in ("round_robin", "swiss"):
+            raise ValueError(f"Unknown tournament format: {data['format']}")
+        if data["format"] == "swiss" and not data.get("rounds"):
+            # Đủ vòng để phân hạng: ceil(log2(N))
+            data["rounds"] = max(1, (len(data["agent_ids"]) - 1).bit_length())
+        if self.workspace_id:
+            data["workspace_id"] = self.workspace_id
+
+        tournament = BattleTournament(id=str(uuid.uuid4()), **data)
+        tournament.total_matches = planned_matches(
+            tournament.format, len(tournament.agent_ids), len(tournament.prompts), tournament.rounds
+        )
+        self.session.add(tournament)
+        for agent_id in tournament.agent_ids:
+            self.session.add(TournamentRating(tournament_id=tournament.id, agent_id=agent_id, rating=INITIAL_RATING))
+        self.session.commit()
+        self.session.refresh(tournament)
+        return tournament
+
+    def get(self, id: str) -> Optional[BattleTournament]:
+        tournament = self.session.get(BattleTournament, id)
+        if tournament and self.workspace_id and tournament.workspace_id != self.workspace_id:
+            return None
+        return tournament
+
+    def get_multi(self, skip: int = 0, limit: int = 100) -> List[BattleTournament]:
+        statement = select(BattleTournament)
+        if self.workspace_id:
+            statement = statement.where(BattleTournament.workspace_id == self.workspace_id)
+        statement = statement.offset(skip).limit(limit).order_by(BattleTournament.created_at.desc())
+        return self.session.exec(statement).all()
+
+    def update(self, db_obj: BattleTournament, obj_in: BattleTournamentUpdate) -> BattleTournament:
+        if self.workspace_id and db_obj.workspace_id != self.workspace_id:
+            return db_obj
+        for field, value in obj_in.dict(exclude_unset=True).items():
+            setattr(db_obj, field, value)
+        db_obj.updated_at = datetime.utcnow()
+        self.session.add(db_obj)
+        self.session.commit()
+        self.session.refresh(db_obj)
+        return db_obj
+
+    def record_matches(self, tournament_id: str, batch: TournamentMatchBatch) -> Optional[BattleTournament]:
+        """
+        Ghi nhận các trận mới và cập nhật Elo tăng dần theo thứ tự trận trong batch (một transaction).
+        Trận đã ghi (cùng id, vd Orchestrator gửi lại sau restart) bị bỏ qua, rating không bị cộng trùng.
+        """
+        tournament = self.get(tournament_id)
+        if not tournament:
+            return None
+
+        # Khóa rating trước rồi mới đọc trận đã có: hai lần gửi cùng batch đồng thời được tuần tự hóa,
+        # lần sau thấy các trận lần trước vừa ghi (không lỗi PK, không cộng Elo hai lần)
+        ratings = {
+            r.agent_id: r for r in self.session.exec(
+                select(TournamentRating).where(TournamentRating.tournament_id == tournament_id).with_for_update()
+            ).all()
+        }
+        ids = [m.id for m in batch.matches]
+        existing = set(self.session.exec(select(TournamentMatch.id).where(TournamentMatch.id.in_(ids))).all()) if ids else set()
+
+        recorded = 0
+        for match in batch.matches:
+            if match.id in existing:
+                continue
+            existing.add(match.id)
+            rating_a = ratings.get(match.agent_a_id)
+            rating_b = ratings.get(match.agent_b_id)
+            if not rating_a or not rating_b or match.winner not in MATCH_SCORES:
+                continue
+
+            score_a = MATCH_SCORES[match.winner]
+            delta = elo_delta(rating_a.rating, rating_b.rating, score_a, tournament.k_factor)
+            rating_a.rating += delta
+            rating_b.rating -= delta
+            for rating, score in ((rating_a, score_a), (rating_b, 1.0 - score_a)):
+                rating.matches += 1
+                if score == 1.0:
+                    rating.wins += 1
+                elif score == 0.0:
+                    rating.losses += 1
+                else:
+                    rating.ties += 1
+                rating.updated_at = datetime.utcnow()
+                self.session.add(rating)
+
+            self.session.add(TournamentMatch(tournament_id=tournament_id, rating_delta=delta, **match.dict()))
+            recorded += 1
+
+        values = {"updated_at": datetime.utcnow()}
+        if recorded:
+            values["completed_matches"] = BattleTournament.completed_matches + recorded
+        if batch.status is not None:
+            values["status"] = batch.status
+        self.session.execute(update(BattleTournament).where(BattleTournament.id == tournament_id).values(**values))
+        self.session.commit()
+        self.session.refresh(tournament)
+        return tournament
+
+    def get_standings(self, tournament_id: str) -> List[TournamentRating]:
+        statement = select(TournamentRating).where(TournamentRating.tournament_id == tournament_id) \
+            .order_by(TournamentRating.rating.desc())
+        return self.session.exec(statement).all()
+
+    def get_matches(self, tournament_id: str) -> List[TournamentMatch]:
+        statement = select(TournamentMatch).where(TournamentMatch.tournament_id == tournament_id) \
+            .order_by(TournamentMatch.round, TournamentMatch.created_at)
+        return self.session.exec(statement).all()
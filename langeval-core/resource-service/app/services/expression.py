@@ -0,0 +1,268 @@
+"""
+Expression của Condition Node: parse + kiểm tra whitelist một lần, biên dịch thành cây closure (không eval()).
+
+File này được giữ giống nhau ở orchestrator (chạy) và resource-service (validate lúc compile scenario).
+"""
+import ast
+import operator
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple
+
+# Biến được phép dùng trong expression của Condition Node
+ALLOWED_NAMES = ("content", "variables", "metadata")
+MAX_EXPRESSION_LENGTH = int(os.getenv("CONDITION_EXPRESSION_MAX_LENGTH", "1000"))
+
+class ExpressionError(ValueError):
+    """Expression không hợp lệ hoặc dùng cú pháp ngoài whitelist."""
+
+Evaluator = Callable[[Dict[str, Any]], Any]
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+_UNARY_OPS = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+def _numbers_only(op):
+    # Chặn "a" * 10**9 và các phép toán tương tự trên chuỗi/list
+    def checked(a, b):
+        if not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in (a, b)):
+            raise TypeError("Arithmetic is only allowed on numbers")
+        return op(a, b)
+    return checked
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: _numbers_only(operator.sub),
+    ast.Mult: _numbers_only(operator.mul),
+    ast.Div: _numbers_only(operator.truediv),
+    ast.Mod: _numbers_only(operator.mod),
+}
+
+def _regex_match(text: Any, pattern: Any) -> bool:
+    return re.search(pattern, str(text or "")) is not None
+
+_FUNCTIONS: Dict[str, Callable] = {
+    "len": len,
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "lower": lambda s: str(s or "").lower(),
+    "upper": lambda s: str(s or "").upper(),
+    "matches": _regex_match,
+}
+
+# Method call được phép trên giá trị: content.lower(), variables.get("x")...
+_METHODS = {
+    "lower", "upper", "strip", "startswith", "endswith", "split", "count", "get", "keys", "values",
+}
+
+_PATH_TOKEN = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+def _parse_path(path: str) -> Tuple[Any, ...]:
+    """'variables.order.items[0].id' -> ('variables', 'order', 'items', 0, 'id')"""
+    if not isinstance(path, str) or not path:
+        raise ExpressionError(f"Invalid JSON path: {path!r}")
+    keys = []
+    for name, index in _PATH_TOKEN.findall(path):
+        keys.append(int(index) if index else name)
+    if not keys or keys[0] not in ALLOWED_NAMES:
+        raise ExpressionError(f"JSON path must start with one of {ALLOWED_NAMES}: {path!r}")
+    return tuple(keys)
+
+def _walk_path(root: Dict[str, Any], keys: Tuple[Any, ...]) -> Any:
+    value = root
+    for key in keys:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
+def _compile_node(node: ast.AST) -> Evaluator:
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda ctx: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in ALLOWED_NAMES:
+            raise ExpressionError(f"Unknown name '{node.id}'. Allowed: {', '.join(ALLOWED_NAMES)}")
+        name = node.id
+        return lambda ctx: ctx.get(name)
+
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        items = [_compile_node(e) for e in node.elts]
+        factory = {ast.List: list, ast.Tuple: tuple, ast.Set: set}[type(node)]
+        return lambda ctx: factory(item(ctx) for item in items)
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(v) for v in node.values]
+        if isinstance(node.op, ast.And):
+            def _and(ctx):
+                result = True
+                for part in parts:
+                    result = part(ctx)
+                    if not result:
+                        return result
+                return result
+            return _and
+
+        def _or(ctx):
+            result = False
+            for part in parts:
+                result = part(ctx)
+                if result:
+                    return result
+            return result
+        return _or
+
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPS.get(type(node.op))
+        if not op:
+            raise ExpressionError(f"Operator '{type(node.op).__name__}' is not allowed")
+        operand = _compile_node(node.operand)
+        return lambda ctx: op(operand(ctx))
+
+    if isinstance(node, ast.BinOp):
+        op = _BIN_OPS.get(type(node.op))
+        if not op:
+            raise ExpressionError(f"Operator '{type(node.op).__name__}' is not allowed")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda ctx: op(left(ctx), right(ctx))
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left)
+        ops = []
+        for op_node, comparator in zip(node.ops, node.comparators):
+            op = _COMPARE_OPS.get(type(op_node))
+            if not op:
+                raise ExpressionError(f"Comparison '{type(op_node).__name__}' is not allowed")
+            ops.append((op, _compile_node(comparator)))
+
+        def _compare(ctx):
+            a = left(ctx)
+            for op, right in ops:
+                b = right(ctx)
+                if not op(a, b):
+                    return False
+                a = b
+            return True
+        return _compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _compile_node(node.test), _compile_node(node.body), _compile_node(node.orelse)
+        return lambda ctx: body(ctx) if test(ctx) else orelse(ctx)
+
+    if isinstance(node, ast.Subscript):
+        if isinstance(node.slice, ast.Slice):
+            raise ExpressionError("Slicing is not allowed")
+        value, index = _compile_node(node.value), _compile_node(node.slice)
+
+        def _subscript(ctx):
+            # Key/index thiếu -> None thay vì lỗi, để điều kiện viết ngắn gọn
+            try:
+                return value(ctx)[index(ctx)]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return _subscript
+
+    if isinstance(node, ast.Call):
+        return _compile_call(node)
+
+    raise ExpressionError(f"Syntax '{type(node).__name__}' is not allowed in condition expressions")
+
+def _compile_call(node: ast.Call) -> Evaluator:
+    if node.keywords:
+        raise ExpressionError("Keyword arguments are not allowed")
+    if any(isinstance(a, ast.Starred) for a in node.args):
+        raise ExpressionError("Star arguments are not allowed")
+
+    func = node.func
+    if isinstance(func, ast.Attribute):
+        if func.attr not in _METHODS:
+            raise ExpressionError(f"Method '{func.attr}' is not allowed")
+        target, method = _compile_node(func.value), func.attr
+        args = [_compile_node(a) for a in node.args]
+        return lambda ctx: getattr(target(ctx), method)(*[a(ctx) for a in args])
+
+    if not isinstance(func, ast.Name):
+        raise ExpressionError("Only whitelisted functions can be called")
+
+    if func.id == "path":
+        # path("variables.order.items[0].id"): parse một lần lúc compile
+        if len(node.args) != 1 or not isinstance(node.args[0], ast.Constant):
+            raise ExpressionError("path() takes a single string literal")
+        keys = _parse_path(node.args[0].value)
+        return lambda ctx: _walk_path(ctx, keys)
+
+    if func.id == "matches" and len(node.args) == 2 and isinstance(node.args[1], ast.Constant):
+        try:
+            pattern = re.compile(node.args[1].value)
+        except (re.error, TypeError) as e:
+            raise ExpressionError(f"Invalid regex {node.args[1].value!r}: {e}")
+        text = _compile_node(node.args[0])
+        return lambda ctx: pattern.search(str(text(ctx) or "")) is not None
+
+    fn = _FUNCTIONS.get(func.id)
+    if not fn:
+        raise ExpressionError(
+            f"Function '{func.id}' is not allowed. Allowed: {', '.join(sorted([*_FUNCTIONS, 'path']))}"
+        )
+    args = [_compile_node(a) for a in node.args]
+    return lambda ctx: fn(*[a(ctx) for a in args])
+
+class CompiledExpression:
+    """
+    Expression đã parse + kiểm tra whitelist, biên dịch thành cây closure.
+    Gọi evaluate() không parse lại và không dùng eval().
+    """
+
+    __slots__ = ("source", "_evaluator")
+
+    def __init__(self, source: str, evaluator: Evaluator):
+        self.source = source
+        self._evaluator = evaluator
+
+    def evaluate(self, content: str = "", variables: Dict[str, Any] = None, metadata: Dict[str, Any] = None) -> Any:
+        return self._evaluator({
+            "content": content,
+            "variables": variables or {},
+            "metadata": metadata or {},
+        })
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+@lru_cache(maxsize=int(os.getenv("CONDITION_EXPRESSION_CACHE_SIZE", "512")))
+def compile_expression(source: str) -> CompiledExpression:
+    """
+    Parse và validate expression. Raise ExpressionError nếu không hợp lệ.
+    """
+    if not isinstance(source, str) or not source.strip():
+        raise ExpressionError("Expression is empty")
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression syntax: {e.msg}")
+    return CompiledExpression(source, _compile_node(tree.body))
@@ -5,6 +5,7 @@ from sqlmodel import Session, func, select
 from app.repositories.model_llm import ModelRepository
 from app.models.domain import ModelRef, ModelUpdate, ModelCreate, Page
 from app.core.security import encrypt_value
+from app.core.cache import cache_service
 
 class ModelService:
     def __init__(self, session: Session, workspace_id: uuid.UUID):
@@ -69,11 +70,17 @@ class ModelService:
              if raw_key:
                  update_data["api_key_encrypted"] = encrypt_value(raw_key)
         
-        return self.repository.update(db_obj=db_model, obj_in=update_data)
+        result = self.repository.update(db_obj=db_model, obj_in=update_data)
+        
+        # Notify consumers (Orchestrator config cache)
+        cache_service.publish_invalidation("model", model_id)
+        
+        return result
 
     def delete_model(self, model_id: str) -> bool:
         db_model = self.get_model(model_id)
         if not db_model:
             return False
         self.repository.remove(id=model_id)
+        cache_service.publish_invalidation("model", model_id)
         return True
@@ -1,9 +1,24 @@
 from typing import List, Optional, Dict
-from sqlmodel import Session
-from app.models.domain import RedTeamingCampaign, RedTeamingCampaignCreate, RedTeamingCampaignUpdate
+from datetime import datetime
+from sqlmodel import Session, select
+from sqlalchemy import case, update
+from app.models.domain import (
+    RedTeamingCampaign, RedTeamingCampaignCreate, RedTeamingCampaignUpdate,
+    RedTeamingLog, RedTeamingProgressDelta
+)
 from app.repositories.red_teaming import RedTeamingRepository
 import uuid
 
+def _dialect_insert(session: Session, model):
+    # insert() có on_conflict_do_nothing: PostgreSQL (production) hoặc SQLite (test / dev)
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+SEVERITY_COUNTERS = {"critical": "critical_count", "high": "high_count", "medium": "medium_count", "low": "low_count"}
+
 class RedTeamingService:
     def __init__(self, db: Session, workspace_id: Optional[uuid.UUID] = None):
         self.repository = RedTeamingRepository(db)
@@ -41,22 +56,71 @@ class RedTeamingService:
         return self.repository.update(db_obj=db_obj, obj_in=obj_in)
 
     def add_log(self, campaign_id: str, log_entry: Dict) -> Optional[RedTeamingCampaign]:
+        return self.append_progress(campaign_id, RedTeamingProgressDelta(logs=[log_entry]))
+
+    def append_progress(self, campaign_id: str, delta: RedTeamingProgressDelta) -> Optional[RedTeamingCampaign]:
+        """
+        Chèn các log mới vào bảng red_teaming_log và cộng counters bằng một câu UPDATE
+        (col = col + n) trong cùng transaction: chi phí mỗi lần chỉ phụ thuộc số log mới.
+        Log đã có (cùng id, vd orchestrator gửi lại sau restart) bị bỏ qua bằng ON CONFLICT DO NOTHING,
+        counters không bị cộng trùng kể cả khi hai lần gửi lại chạy đồng thời.
+        """
         db_obj = self.get(campaign_id)
         if not db_obj:
             return None
-        
-        # Cập nhật list logs hiện tại
-        current_logs = list(db_obj.logs) if db_obj.logs else []
-        current_logs.append(log_entry)
-        
-        # Cập nhật stats dựa trên log_entry nếu cần
-        update_data = {"logs": current_logs}
-        
-        # Nếu attack thành công/bị chặn, cập nhật counters
-        if log_entry.get("type") == "success":
-            update_data["successful_attacks"] = (db_obj.successful_attacks or 0) + 1
-        elif log_entry.get("type") == "blocked":
-            update_data["blocked_attacks"] = (db_obj.blocked_attacks or 0) + 1
-            
-        update_obj = RedTeamingCampaignUpdate(**update_data)
-        return self.update(db_obj, update_obj)
+
+        # Trùng id trong cùng delta: giữ bản đầu
+        entries: Dict[str, Dict] = {}
+        for e in delta.logs:
+            entry = dict(e, id=e.get("id") or str(uuid.uuid4()))
+            entries.setdefault(entry["id"], entry)
+        entries = list(entries.values())
+        inserted = set()
+        if entries:
+            now = datetime.utcnow()
+            rows = [{
+                "id": e["id"], "campaign_id": campaign_id, "probe_index": e.get("probe_index"),
+                "severity": e.get("severity", "low"), "type": e.get("type", "blocked"), "entry": e, "created_at": now
+            } for e in entries]
+            # INSERT ... ON CONFLICT DO NOTHING RETURNING id: hai lần gửi lại đồng thời không lỗi PK,
+            # counters chỉ cộng từ các dòng thực sự được chèn
+            statement = _dialect_insert(self.session, RedTeamingLog).values(rows) \
+                .on_conflict_do_nothing(index_elements=["id"]).returning(RedTeamingLog.id)
+            inserted = set(self.session.execute(statement).scalars().all())
+
+        increments: Dict[str, int] = {}
+        for entry in entries:
+            if entry["id"] not in inserted:
+                continue
+            counter = SEVERITY_COUNTERS.get(entry.get("severity", "low"))
+            if counter:
+                increments[counter] = increments.get(counter, 0) + 1
+            log_type = entry.get("type", "blocked")
+            if log_type == "success":
+                increments["successful_attacks"] = increments.get("successful_attacks", 0) + 1
+            elif log_type == "blocked":
+                increments["blocked_attacks"] = increments.get("blocked_attacks", 0) + 1
+
+        values = {field: getattr(RedTeamingCampaign, field) + n for field, n in increments.items()}
+        if delta.total_probes is not None:
+            # Giá trị tuyệt đối, không lùi khi nhận bản gửi lại cũ hơn
+            values["total_probes"] = case(
+                (RedTeamingCampaign.total_probes < delta.total_probes, delta.total_probes),
+                else_=RedTeamingCampaign.total_probes
+            )
+        if delta.progress is not None:
+            values["progress"] = delta.progress
+        if delta.status is not None:
+            values["status"] = delta.status
+        values["updated_at"] = datetime.utcnow()
+
+        self.session.execute(update(RedTeamingCampaign).where(RedTeamingCampaign.id == campaign_id).values(**values))
+        self.session.commit()
+        self.session.refresh(db_obj)
+        return db_obj
+
+    def get_logs(self, campaign: RedTeamingCampaign) -> List[Dict]:
+        # Log cũ (trước khi có bảng red_teaming_log) vẫn nằm trong cột JSON
+        statement = select(RedTeamingLog.entry).where(RedTeamingLog.campaign_id == campaign.id) \
+            .order_by(RedTeamingLog.created_at, RedTeamingLog.probe_index)
+        return list(campaign.logs or []) + list(self.session.exec(statement).all())
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from app.services.expression import ExpressionError, compile_expression
+
+# Phiên bản định dạng execution plan (orchestrator bỏ qua plan khác version và tự build như cũ)
+PLAN_VERSION = 1
+
+# Loại node orchestrator có handler riêng; loại khác chạy node_generic
+KNOWN_NODE_TYPES = {"start", "persona", "task", "tool", "code", "condition", "wait", "expectation", "end"}
+
+# Trường chỉ phục vụ hiển thị trên canvas, không ảnh hưởng tới graph (giống orchestrator)
+_LAYOUT_NODE_KEYS = {"position", "positionAbsolute", "width", "height", "selected", "dragging"}
+_LAYOUT_EDGE_KEYS = {"id", "type", "animated", "selected", "style", "label"}
+
+_VARIABLE_PATTERN = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+class ScenarioCompileError(ValueError):
+    """
+    Scenario không hợp lệ (graph không chạy được). `errors` chứa từng lỗi cụ thể.
+    """
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+def _as_dict(item: Any) -> Dict[str, Any]:
+    return item if isinstance(item, dict) else item.dict()
+
+def normalize_node_type(node: Dict[str, Any]) -> str:
+    node_type = (node.get("data") or {}).get("category") or node.get("type") or "default"
+    return node_type.replace("customNode", "").lower()
+
+def content_hash(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> str:
+    """
+    Hash nội dung nodes/edges (bỏ trường layout). Cùng thuật toán với scenario_hash của orchestrator
+    để hai bên dùng chung một key cache graph.
+    """
+    nodes = [{k: v for k, v in n.items() if k not in _LAYOUT_NODE_KEYS} for n in nodes]
+    edges = [{k: v for k, v in e.items() if k not in _LAYOUT_EDGE_KEYS} for e in edges]
+    nodes.sort(key=lambda n: str(n.get("id")))
+    edges.sort(key=lambda e: (str(e.get("source")), str(e.get("target")), str(e.get("sourceHandle"))))
+    canonical = json.dumps({"nodes": nodes, "edges": edges}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _referenced_variables(value: Any, found: Set[str]):
+    if isinstance(value, str):
+        found.update(_VARIABLE_PATTERN.findall(value))
+    elif isinstance(value, dict):
+        for item in value.values():
+            _referenced_variables(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            _referenced_variables(item, found)
+
+def _produced_variables(data: Dict[str, Any]) -> Set[str]:
+    produced = {data.get("output_variable"), data.get("outputVar")}
+    produced.update(key.strip() for key in (data.get("outputKeys") or "").split(","))
+    return {name for name in produced if name}
+
+def _strongly_connected(node_ids: List[str], successors: Dict[str, List[str]]) -> List[List[str]]:
+    # Tarjan (iterative) - graph do người dùng vẽ có thể sâu hơn giới hạn đệ quy
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    components = []
+    counter = 0
+    for root in node_ids:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, child = work.pop()
+            if child == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack.add(node)
+            targets = successors.get(node, [])
+            if child < len(targets):
+                work.append((node, child + 1))
+                target = targets[child]
+                if target not in index:
+                    work.append((target, 0))
+                elif target in on_stack:
+                    low[node] = min(low[node], index[target])
+                continue
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return components
+
+def compile_scenario(nodes: List[Any], edges: List[Any]) -> Dict[str, Any]:
+    """
+    Validate graph của scenario và trả về execution plan gọn cho orchestrator:
+    loại node đã chuẩn hóa, entry point, cạnh (kèm handle của Condition Node), số expectation,
+    biến cần truyền vào khi chạy và content hash. Raise ScenarioCompileError nếu graph không chạy được.
+    """
+    nodes = [_as_dict(n) for n in nodes or []]
+    edges = [_as_dict(e) for e in edges or []]
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    plan_nodes = []
+    node_types: Dict[str, str] = {}
+    referenced: Set[str] = set()
+    produced: Set[str] = set()
+    for node in nodes:
+        node_id = node.get("id")
+        if node_id in node_types:
+            errors.append(f"Duplicate node id '{node_id}'")
+            continue
+        node_type = normalize_node_type(node)
+        data = node.get("data") or {}
+        node_types[node_id] = node_type
+        if node_type not in KNOWN_NODE_TYPES:
+            warnings.append(f"Node '{node_id}' has unknown type '{node_type}' and runs as a generic node")
+        # Expression sai cú pháp / ngoài whitelist bị từ chối khi lưu, không phải lúc orchestrator build graph
+        if node_type == "condition" and data.get("logicType", "keyword") == "expression":
+            try:
+                compile_expression(data.get("expression", ""))
+            except ExpressionError as e:
+                errors.append(f"Condition node '{data.get('label') or node_id}': {e}")
+        _referenced_variables(data, referenced)
+        produced |= _produced_variables(data)
+        plan_nodes.append({"id": node_id, "type": node_type, "data": data})
+
+    starts = [node_id for node_id, node_type in node_types.items() if node_type == "start"]
+    if nodes and len(starts) != 1:
+        errors.append(f"Scenario must have exactly one start node (found {len(starts)})")
+
+    plan_edges = []
+    successors: Dict[str, List[str]] = {}
+    for edge in edges:
+        source, target = edge.get("source"), edge.get("target")
+        missing = [node_id for node_id in (source, target) if node_id not in node_types]
+        if missing:
+            errors.append(f"Edge {source} -> {target} references unknown node '{missing[0]}'")
+            continue
+        plan_edges.append({"source": source, "target": target, "handle": edge.get("sourceHandle") or "default"})
+        successors.setdefault(source, []).append(target)
+
+    for source, targets in successors.items():
+        if node_types[source] != "condition" and len(targets) > 1:
+            warnings.append(f"Node '{source}' has {len(targets)} outgoing edges; only the first one is followed")
+
+    # Vòng lặp phải có Condition Node với nhánh thoát ra ngoài, nếu không campaign chạy tới recursion limit
+    cycles = []
+    for component in _strongly_connected(list(node_types), successors):
+        members = set(component)
+        if len(component) == 1 and component[0] not in successors.get(component[0], []):
+            continue
+        cycles.append(sorted(component))
+        has_exit = any(
+            node_types[node_id] == "condition" and any(t not in members for t in successors.get(node_id, []))
+            for node_id in component
+        )
+        if not has_exit:
+            errors.append(f"Cycle {' -> '.join(sorted(component))} has no condition node with an exit edge")
+
+    entry = starts[0] if len(starts) == 1 else None
+    if entry:
+        reachable = {entry}
+        frontier = [entry]
+        while frontier:
+            for target in successors.get(frontier.pop(), []):
+                if target not in reachable:
+                    reachable.add(target)
+                    frontier.append(target)
+        unreachable = [node_id for node_id in node_types if node_id not in reachable]
+        if unreachable:
+            warnings.append(f"Unreachable nodes: {', '.join(unreachable)}")
+
+    if errors:
+        raise ScenarioCompileError(errors)
+
+    return {
+        "version": PLAN_VERSION,
+        "hash": content_hash(nodes, edges),
+        "entry": entry,
+        "nodes": plan_nodes,
+        "edges": plan_edges,
+        "expectations_count": sum(1 for t in node_types.values() if t == "expectation"),
+        "required_variables": sorted(referenced - produced),
+        "cycles": cycles,
+        "warnings": warnings,
+    }
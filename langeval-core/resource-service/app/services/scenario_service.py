@@ -5,6 +5,7 @@ from sqlmodel import Session, func, select
 from app.repositories.scenario import ScenarioRepository
 from app.models.domain import ScenarioRef, ScenarioUpdate, ScenarioCreate, Page
 from app.core.cache import cached, cache_service
+from app.services.scenario_compiler import compile_scenario
 
 class ScenarioService:
     def __init__(self, session: Session, workspace_id: uuid.UUID = None):
@@ -16,6 +17,10 @@ class ScenarioService:
         data = scenario_in.dict()
         if self.workspace_id:
             data["workspace_id"] = self.workspace_id
+        # Graph không hợp lệ bị từ chối ngay lúc lưu (ScenarioCompileError) thay vì lỗi giữa campaign
+        plan = compile_scenario(data["nodes"], data["edges"])
+        data["execution_plan"] = plan
+        data["plan_hash"] = plan["hash"]
         db_scenario = ScenarioRef(**data)
         return self.repository.create(db_scenario)
 
@@ -69,7 +74,16 @@ class ScenarioService:
         if self.workspace_id and db_scenario.workspace_id != self.workspace_id:
             return None
         
-        result = self.repository.update(db_obj=db_scenario, obj_in=scenario_update)
+        update_data = scenario_update.dict(exclude_unset=True)
+        if "nodes" in update_data or "edges" in update_data:
+            plan = compile_scenario(
+                update_data["nodes"] if update_data.get("nodes") is not None else db_scenario.nodes,
+                update_data["edges"] if update_data.get("edges") is not None else db_scenario.edges,
+            )
+            update_data["execution_plan"] = plan
+            update_data["plan_hash"] = plan["hash"]
+
+        result = self.repository.update(db_obj=db_scenario, obj_in=update_data)
         
         # Invalidate cache
         cache_service.delete(f"scenario:{scenario_id}")
@@ -0,0 +1,24 @@
+"""
+SQLite engine cho unit test của service dùng DB.
+
+Model dùng datetime.utcnow() (naive). sqlmodel mới map datetime sang UTCDateTime và từ chối giá trị naive
+khi bind -> engine test đổi các cột đó về DateTime thường trước khi create_all.
+"""
+from sqlalchemy import DateTime
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+try:
+    from sqlmodel.sql.sqltypes import UTCDateTime
+except ImportError:  # sqlmodel cũ: datetime đã là DateTime naive
+    UTCDateTime = None
+
+def make_test_engine():
+    if UTCDateTime is not None:
+        for table in SQLModel.metadata.tables.values():
+            for column in table.columns:
+                if isinstance(column.type, UTCDateTime):
+                    column.type = DateTime()
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
@@ -0,0 +1,86 @@
+import unittest
+import uuid
+import sys
+import os
+
+from sqlmodel import Session
+
+# Fix sys.path to find 'app' (và helper test cùng thư mục)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.domain import (
+    BattleCampaignCreate, BattleTurnCreate, BattleTournamentCreate, TournamentMatchBatch, TournamentMatchCreate
+)
+from app.services.battle_service import BattleService, TournamentService, elo_delta, expected_score, planned_matches
+from db_support import make_test_engine
+
+def match(match_id, a, b, winner, round=0):
+    return TournamentMatchCreate(id=match_id, round=round, agent_a_id=a, agent_b_id=b, winner=winner)
+
+class TestElo(unittest.TestCase):
+
+    def test_elo_delta(self):
+        self.assertAlmostEqual(expected_score(1500, 1500), 0.5)
+        self.assertAlmostEqual(elo_delta(1500, 1500, 1.0, 32), 16.0)
+        self.assertAlmostEqual(elo_delta(1500, 1500, 0.5, 32), 0.0)
+        # Thắng đối thủ mạnh hơn được cộng nhiều hơn
+        self.assertGreater(elo_delta(1400, 1600, 1.0, 32), elo_delta(1600, 1400, 1.0, 32))
+
+    def test_planned_matches(self):
+        self.assertEqual(planned_matches("round_robin", 10, 3), 135)
+        self.assertEqual(planned_matches("swiss", 5, 2, rounds=3), 12)
+
+class TestTournamentService(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Session(make_test_engine())
+        self.service = TournamentService(self.session, uuid.uuid4())
+        self.tournament = self.service.create(BattleTournamentCreate(
+            name="t", agent_ids=["a", "b", "c", "a"], prompts=["p1", "p2"]
+        ))
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_create_validates_and_seeds_ratings(self):
+        self.assertEqual(self.tournament.agent_ids, ["a", "b", "c"])
+        self.assertEqual(self.tournament.total_matches, 6)
+        self.assertEqual([r.rating for r in self.service.get_standings(self.tournament.id)], [1500.0] * 3)
+        with self.assertRaises(ValueError):
+            self.service.create(BattleTournamentCreate(name="t", agent_ids=["a", "a"], prompts=["p"]))
+
+    def test_matches_update_ratings_incrementally_and_idempotently(self):
+        tid = self.tournament.id
+        self.service.record_matches(tid, TournamentMatchBatch(matches=[match("m1", "a", "b", "agent_a")]))
+        tournament = self.service.record_matches(tid, TournamentMatchBatch(
+            matches=[match("m1", "a", "b", "agent_a"), match("m2", "a", "c", "tie", 1)], status="running"
+        ))
+
+        self.assertEqual((tournament.completed_matches, tournament.status), (2, "running"))
+        standings = {r.agent_id: r for r in self.service.get_standings(tid)}
+        self.assertAlmostEqual(standings["a"].rating + standings["b"].rating + standings["c"].rating, 4500.0)
+        self.assertAlmostEqual(standings["b"].rating, 1484.0)
+        self.assertEqual((standings["a"].wins, standings["a"].ties, standings["a"].matches), (1, 1, 2))
+        self.assertEqual(standings["b"].losses, 1)
+        self.assertGreater(standings["c"].rating, 1500.0)  # hòa với agent đã có rating cao hơn
+        self.assertEqual([m.id for m in self.service.get_matches(tid)], ["m1", "m2"])
+
+class TestBattleTurns(unittest.TestCase):
+
+    def test_resent_turn_is_not_recorded_twice(self):
+        with Session(make_test_engine()) as session:
+            service = BattleService(session, uuid.uuid4())
+            campaign = service.create_campaign(BattleCampaignCreate(name="b", mode="comparison", agent_a_id="a", agent_b_id="b"))
+            turn = BattleTurnCreate(
+                id=f"{campaign.id}:turn:1", campaign_id=campaign.id, turn_number=1,
+                user_message="hi", agent_a_response="A", agent_b_response="B", winner="agent_a"
+            )
+            service.add_turn(turn)
+            service.add_turn(turn)
+
+            self.assertEqual(len(service.get_turns(campaign.id)), 1)
+            self.assertEqual(service.get_campaign(campaign.id).agent_a_wins, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import uuid
+import sys
+import os
+
+from sqlmodel import Session
+
+# Fix sys.path to find 'app' (và helper test cùng thư mục)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.domain import RedTeamingCampaignCreate, RedTeamingProgressDelta
+from app.services.red_teaming_service import RedTeamingService
+from db_support import make_test_engine
+
+def log(log_id, severity, log_type, probe_index=None):
+    return {"id": log_id, "severity": severity, "type": log_type, "probe": f"probe {log_id}", "probe_index": probe_index}
+
+class TestRedTeamingProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Session(make_test_engine())
+        self.service = RedTeamingService(self.session, uuid.uuid4())
+        self.campaign = self.service.create(RedTeamingCampaignCreate(name="rt", agent_id="a1", strategy="jailbreak"))
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_append_inserts_logs_and_increments_counters(self):
+        self.service.append_progress(self.campaign.id, RedTeamingProgressDelta(
+            logs=[log("l1", "critical", "success", 0), log("l2", "low", "blocked", 1)], total_probes=2, progress=20
+        ))
+        campaign = self.service.append_progress(self.campaign.id, RedTeamingProgressDelta(
+            logs=[log("l3", "high", "success", 2)], total_probes=3, progress=30, status="running"
+        ))
+
+        self.assertEqual((campaign.total_probes, campaign.progress, campaign.status), (3, 30, "running"))
+        self.assertEqual((campaign.successful_attacks, campaign.blocked_attacks), (2, 1))
+        self.assertEqual((campaign.critical_count, campaign.high_count, campaign.low_count), (1, 1, 1))
+        self.assertEqual(campaign.logs, [])
+        self.assertEqual([entry["id"] for entry in self.service.get_logs(campaign)], ["l1", "l2", "l3"])
+
+    def test_resent_delta_is_not_counted_twice(self):
+        delta = RedTeamingProgressDelta(logs=[log("l1", "medium", "blocked")], total_probes=5)
+        self.service.append_progress(self.campaign.id, delta)
+        campaign = self.service.append_progress(self.campaign.id, RedTeamingProgressDelta(
+            logs=[log("l1", "medium", "blocked")], total_probes=4
+        ))
+
+        self.assertEqual((campaign.medium_count, campaign.blocked_attacks), (1, 1))
+        self.assertEqual(campaign.total_probes, 5)
+        self.assertEqual(len(self.service.get_logs(campaign)), 1)
+
+    def test_overlapping_delta_counts_only_inserted_rows(self):
+        self.service.append_progress(self.campaign.id, RedTeamingProgressDelta(logs=[log("l1", "critical", "success")]))
+        campaign = self.service.append_progress(self.campaign.id, RedTeamingProgressDelta(logs=[
+            log("l1", "critical", "success"), log("l2", "critical", "success"), log("l2", "critical", "success")
+        ]))
+
+        self.assertEqual((campaign.critical_count, campaign.successful_attacks), (2, 2))
+        self.assertEqual([entry["id"] for entry in self.service.get_logs(campaign)], ["l1", "l2"])
+
+if __name__ == "__main__":
+    unittest.main()
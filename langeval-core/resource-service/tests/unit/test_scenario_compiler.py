@@ -0,0 +1,68 @@
+import unittest
+import sys
+import os
+
+# Fix sys.path to find 'app'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.scenario_compiler import ScenarioCompileError, compile_scenario, content_hash
+
+def node(node_id, category, x=0, **data):
+    return {"id": node_id, "type": "customNode", "position": {"x": x, "y": 0}, "data": {"category": category, **data}}
+
+def edge(source, target, handle=None):
+    return {"id": f"e-{source}-{target}", "source": source, "target": target, "sourceHandle": handle}
+
+class TestScenarioCompiler(unittest.TestCase):
+
+    def test_plan_normalizes_types_and_counts_expectations(self):
+        nodes = [
+            node("s", "Start"),
+            node("t", "task", instruction="Đặt vé cho {{customer}}", output_variable="booking"),
+            node("x", "expectation", criteria="Xác nhận {{booking}}"),
+            node("c", "condition", keyword="retry"),
+            node("e", "end"),
+        ]
+        edges = [edge("s", "t"), edge("t", "x"), edge("x", "c"), edge("c", "t", "true"), edge("c", "e", "false")]
+        plan = compile_scenario(nodes, edges)
+
+        self.assertEqual(plan["entry"], "s")
+        self.assertEqual([n["type"] for n in plan["nodes"]], ["start", "task", "expectation", "condition", "end"])
+        self.assertEqual(plan["expectations_count"], 1)
+        self.assertEqual(plan["required_variables"], ["customer"])
+        self.assertEqual(plan["cycles"], [["c", "t", "x"]])
+        self.assertIn({"source": "c", "target": "e", "handle": "false"}, plan["edges"])
+        # Kéo node trên canvas không đổi hash
+        moved = [node("s", "Start", x=500)] + nodes[1:]
+        self.assertEqual(plan["hash"], content_hash(moved, edges))
+
+    def test_invalid_graphs_are_rejected(self):
+        loop = [node("s", "start"), node("a", "task"), node("b", "wait")]
+        with self.assertRaises(ScenarioCompileError) as ctx:
+            compile_scenario(loop, [edge("s", "a"), edge("a", "b"), edge("b", "a"), edge("a", "ghost")])
+        self.assertEqual(len(ctx.exception.errors), 2)
+        self.assertIn("ghost", ctx.exception.errors[0])
+        self.assertIn("no condition node", ctx.exception.errors[1])
+
+        with self.assertRaises(ScenarioCompileError):
+            compile_scenario([node("a", "task")], [])
+
+    def test_condition_expressions_are_validated(self):
+        nodes = [
+            node("s", "start"),
+            node("ok", "condition", logicType="expression", expression="'refund' in content.lower()"),
+            node("bad", "condition", logicType="expression", expression="__import__('os').system('id')", label="Xấu"),
+            node("broken", "condition", logicType="expression", expression="len(content >"),
+        ]
+        with self.assertRaises(ScenarioCompileError) as ctx:
+            compile_scenario(nodes, [edge("s", "ok"), edge("ok", "bad", "true"), edge("ok", "broken", "false")])
+        self.assertEqual(len(ctx.exception.errors), 2)
+        self.assertIn("Condition node 'Xấu'", ctx.exception.errors[0])
+        self.assertIn("Condition node 'broken'", ctx.exception.errors[1])
+
+    def test_unreachable_nodes_only_warn(self):
+        plan = compile_scenario([node("s", "start"), node("orphan", "task")], [])
+        self.assertEqual(plan["warnings"], ["Unreachable nodes: orphan"])
+
+if __name__ == "__main__":
+    unittest.main()
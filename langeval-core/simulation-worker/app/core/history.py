@@ -0,0 +1,40 @@
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from app.core import wire
+
+# Cache history theo campaign: lần sau chỉ LRANGE phần message mới
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "256"))
+
+_cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+async def fetch_history(redis_client, ref: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Đọc `length` message đầu tiên của history list (append-only) do Orchestrator ghi.
+    Cache theo (key, epoch): Orchestrator đổi epoch mỗi khi ghi lại list từ đầu.
+    """
+    key, length = ref["key"], int(ref.get("length", 0))
+    cache_key = f"{key}#{ref['epoch']}" if ref.get("epoch") else key
+    cached = _cache.get(cache_key, [])
+    if len(cached) > length:
+        # Orchestrator đã ghi lại history (resume từ checkpoint cũ) -> đọc lại từ đầu
+        cached = []
+    if len(cached) < length:
+        new_items = await redis_client.lrange(key, len(cached), length - 1)
+        cached = cached + [wire.loads(item) for item in new_items]
+        _cache[cache_key] = cached
+    if cache_key in _cache:
+        _cache.move_to_end(cache_key)
+        while len(_cache) > HISTORY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return cached[:length]
+
+async def resolve_history(redis_client, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Payload mới mang `history_ref` thay vì `history`; payload cũ giữ nguyên.
+    """
+    ref = payload.get("history_ref")
+    if ref and "history" not in payload and redis_client:
+        payload["history"] = await fetch_history(redis_client, ref)
+    return payload
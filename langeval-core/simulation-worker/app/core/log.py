@@ -0,0 +1,152 @@
+"""
+Logging dùng chung, giữ giống nhau ở orchestrator, simulation-worker và evaluation-worker.
+
+- Level qua LOG_LEVEL. Format text hoặc JSON (LOG_FORMAT=json).
+- campaign_id (correlation id) lấy từ contextvar và được gắn vào mọi record.
+- brief(obj): format lười + cắt ngắn. Payload chỉ được serialize khi record thực sự được ghi.
+- Record dưới WARNING được sample (DEBUG) và giới hạn tần suất theo message template.
+
+Dùng: logger.debug("Sending payload %s", brief(payload)). Không dùng f-string ở hot path.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "1000"))
+# Tỉ lệ giữ lại record DEBUG (1.0 = tất cả)
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+# Số record/giây tối đa cho mỗi (logger, message template) dưới WARNING; 0 = không giới hạn
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "50"))
+
+campaign_id_var: contextvars.ContextVar = contextvars.ContextVar("campaign_id", default=None)
+
+def set_campaign_id(campaign_id: Optional[str]) -> contextvars.Token:
+    """
+    Gắn campaign_id cho task hiện tại (và các task con tạo sau đó).
+    """
+    return campaign_id_var.set(campaign_id)
+
+@contextmanager
+def campaign_context(campaign_id: Optional[str]):
+    token = campaign_id_var.set(campaign_id)
+    try:
+        yield
+    finally:
+        campaign_id_var.reset(token)
+
+class _Brief:
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value
+        if isinstance(value, str):
+            text = value
+        else:
+            try:
+                text = json.dumps(value, default=str, ensure_ascii=False)
+            except (TypeError, ValueError):
+                text = repr(value)
+        if len(text) > self.limit:
+            text = f"{text[:self.limit]}... (+{len(text) - self.limit} chars)"
+        return text
+
+def brief(value: Any, limit: Optional[int] = None) -> _Brief:
+    return _Brief(value, limit or LOG_PAYLOAD_MAX_CHARS)
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # extra={"campaign_id": ...} (vd: batch nhiều campaign) được ưu tiên hơn contextvar
+        if not getattr(record, "campaign_id", None):
+            record.campaign_id = campaign_id_var.get() or "-"
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    WARNING trở lên luôn được ghi. DEBUG được sample theo debug_rate; DEBUG/INFO bị giới hạn
+    `rate_limit` record/giây cho mỗi message template (token bucket).
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self, debug_rate: float = LOG_DEBUG_SAMPLE_RATE, rate_limit: float = LOG_RATE_LIMIT):
+        super().__init__()
+        self.debug_rate = debug_rate
+        self.rate_limit = rate_limit
+        self.suppressed = 0
+        self._buckets: Dict[Tuple[str, Any], Tuple[float, float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if record.levelno <= logging.DEBUG and self.debug_rate < 1.0 and random.random() >= self.debug_rate:
+            self.suppressed += 1
+            return False
+        if self.rate_limit <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.rate_limit, now))
+        tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.suppressed += 1
+            return False
+        if len(self._buckets) >= self.MAX_KEYS and key not in self._buckets:
+            # Message không dùng template (f-string) -> tránh giữ key vô hạn
+            self._buckets.clear()
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "campaign_id": getattr(record, "campaign_id", "-"),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] [campaign=%(campaign_id)s] %(message)s"
+
+_configured = False
+
+def setup_logging(service: str, level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> logging.Handler:
+    """
+    Cấu hình root logger (một lần mỗi process). Trả về handler đã gắn.
+    """
+    global _configured
+    root = logging.getLogger()
+    if _configured:
+        return root.handlers[0]
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter())
+    handler.setFormatter(JsonFormatter(service) if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    root.handlers = [handler]
+    root.setLevel(level)
+    _configured = True
+    return handler
@@ -2,7 +2,10 @@ from aiokafka import AIOKafkaProducer
 from redis.asyncio import Redis
 import os
 import asyncio
-import json
+import logging
+from app.core import wire
+
+logger = logging.getLogger(__name__)
 
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:29092")
 TRACES_TOPIC = os.getenv("KAFKA_TOPIC_TRACES", "traces")
@@ -14,18 +17,18 @@ redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
 async def wait_for_kafka(bootstrap_servers, retries=10, delay=2):
     for i in range(retries):
         try:
-            print(f"Attempting to connect to Kafka ({bootstrap_servers}) - Attempt {i+1}/{retries}...")
+            logger.info("Attempting to connect to Kafka (%s) - Attempt %d/%d...", bootstrap_servers, i + 1, retries)
             # Initialize Producer
             temp_producer = AIOKafkaProducer(
                 bootstrap_servers=bootstrap_servers,
-                value_serializer=lambda m: json.dumps(m).encode('utf-8')
+                value_serializer=wire.dumps_bytes
             )
             await temp_producer.start()
-            print("Successfully connected to Kafka.")
+            logger.info("Successfully connected to Kafka.")
             await temp_producer.stop() 
             return True
         except Exception as e:
-            print(f"Failed to connect to Kafka: {e}")
+            logger.error("Failed to connect to Kafka: %s", e)
             if i < retries - 1:
                 await asyncio.sleep(delay)
                 delay = min(delay * 2, 30)
@@ -34,7 +37,7 @@ async def wait_for_kafka(bootstrap_servers, retries=10, delay=2):
 
 async def init_resources():
     global producer, redis_client
-    print(f"Initializing Resources... Kafka={KAFKA_BOOTSTRAP_SERVERS}, Redis={redis_url}")
+    logger.info("Initializing Resources... Kafka=%s, Redis=%s", KAFKA_BOOTSTRAP_SERVERS, redis_url)
     
     # Wait for Kafka to be ready
     await wait_for_kafka(KAFKA_BOOTSTRAP_SERVERS)
@@ -42,7 +45,7 @@ async def init_resources():
     # Initialize Producer
     producer = AIOKafkaProducer(
         bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-        value_serializer=lambda m: json.dumps(m).encode('utf-8')
+        value_serializer=wire.dumps_bytes
     )
     await producer.start()
     
@@ -60,6 +63,6 @@ async def push_trace(event_data: dict):
     """
     if producer:
         try:
-            await producer.send_and_wait(TRACES_TOPIC, event_data)
+            await producer.send_and_wait(TRACES_TOPIC, event_data, headers=wire.kafka_headers())
         except Exception as e:
-            print(f"Failed to push trace: {e}")
+            logger.error("Failed to push trace: %s", e)
@@ -0,0 +1,148 @@
+"""
+Wire format cho message giữa các service (Kafka topics, Redis result/history keys).
+
+File này được giữ giống nhau ở orchestrator, simulation-worker và evaluation-worker.
+
+Envelope (v1) nằm trong Kafka record headers:
+    content-type: application/msgpack | application/json
+    wire-version: 1
+Record không có header là message cũ (JSON) -> vẫn decode được.
+Redis dùng decode_responses=True nên luôn là JSON text (orjson nếu có).
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypedDict
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn: fallback stdlib json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack là tùy chọn: fallback JSON
+    msgpack = None
+
+WIRE_VERSION = 1
+MSGPACK = "application/msgpack"
+JSON = "application/json"
+
+# Format cho request topics (simulation.requests, evaluation.requests): json | msgpack
+# Mặc định json: worker bản cũ (json.loads thẳng record, không đọc envelope) vẫn đọc được khi Orchestrator
+# được deploy trước. Chỉ bật WIRE_FORMAT=msgpack khi mọi consumer đã chạy decoder đọc envelope (file này).
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "json").lower()
+
+Headers = List[Tuple[str, bytes]]
+
+# --- Shared message schemas ---
+
+class _HistoryRefBase(TypedDict):
+    key: str
+    length: int
+
+class HistoryRef(_HistoryRefBase, total=False):
+    epoch: str  # đổi khi Orchestrator ghi lại list từ đầu
+
+class SimulationRequest(TypedDict, total=False):
+    campaign_id: str
+    node_id: str
+    agent_id: str
+    persona: Any
+    instruction: str
+    target_config: Dict[str, Any]
+    model_config: Dict[str, Any]
+    history: List[Dict[str, Any]]
+    history_ref: HistoryRef
+    language: str
+
+class SimulationResult(TypedDict, total=False):
+    campaign_id: str
+    node_id: str
+    status: str
+    new_messages: List[Dict[str, Any]]
+    metrics: Dict[str, Any]
+    error: str
+
+class EvaluationRequest(TypedDict, total=False):
+    campaign_id: str
+    node_id: str
+    history: List[Dict[str, Any]]
+    history_ref: HistoryRef
+    eval_config: Dict[str, Any]
+    metrics_config: List[Dict[str, Any]]
+    model_config: Dict[str, Any]
+    # Battle judge
+    user_input: str
+    response_a: str
+    response_b: str
+
+class EvaluationResult(TypedDict, total=False):
+    campaign_id: str
+    node_id: str
+    total_score: float
+    passed: bool
+    metrics: Dict[str, Any]
+    reason: str
+    status: str
+
+# --- JSON text (Redis, topics đọc bởi data-ingestion) ---
+
+def dumps(value: Any) -> str:
+    return dumps_bytes(value).decode("utf-8")
+
+def dumps_bytes(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # Kiểu orjson không hỗ trợ (vd: int > 64 bit) -> stdlib
+    return json.dumps(value).encode("utf-8")
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# --- Kafka envelope ---
+
+def content_type(fmt: str = WIRE_FORMAT) -> str:
+    if fmt == "msgpack" and msgpack is not None:
+        return MSGPACK
+    return JSON
+
+def kafka_headers(ctype: str = JSON) -> Headers:
+    return [("content-type", ctype.encode()), ("wire-version", str(WIRE_VERSION).encode())]
+
+def encode(value: Any, fmt: str = WIRE_FORMAT) -> Tuple[bytes, Headers]:
+    """
+    Encode message cho Kafka, trả về (value, headers).
+    """
+    ctype = content_type(fmt)
+    if isinstance(value, (bytes, bytearray)):
+        # Đã encode sẵn (legacy caller) -> coi là JSON
+        return bytes(value), kafka_headers(JSON)
+    if ctype == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True), kafka_headers(MSGPACK)
+    return dumps_bytes(value), kafka_headers(JSON)
+
+def _header(headers: Optional[Sequence[Tuple[str, bytes]]], name: str) -> Optional[str]:
+    for key, value in headers or ():
+        if key == name:
+            return value.decode() if isinstance(value, bytes) else value
+    return None
+
+def decode(data: bytes, headers: Optional[Sequence[Tuple[str, bytes]]] = None) -> Any:
+    """
+    Decode Kafka record theo header content-type; không có header -> JSON (message cũ).
+    """
+    ctype = _header(headers, "content-type") or JSON
+    version = int(_header(headers, "wire-version") or WIRE_VERSION)
+    if version > WIRE_VERSION:
+        raise ValueError(f"Unsupported wire version {version} (max {WIRE_VERSION})")
+    if ctype == MSGPACK:
+        if msgpack is None:
+            raise ValueError("Received msgpack message but msgpack is not installed")
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    if ctype != JSON:
+        raise ValueError(f"Unsupported content-type: {ctype}")
+    return loads(data)
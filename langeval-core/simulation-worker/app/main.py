@@ -2,6 +2,9 @@ from fastapi import FastAPI
 import asyncio
 from app.worker import consume_messages
 from app.core.resources import init_resources, close_resources
+from app.core.log import setup_logging
+
+setup_logging("simulation-worker")
 
 app = FastAPI(
     title="simulation-worker",
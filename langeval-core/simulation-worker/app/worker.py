@@ -1,22 +1,27 @@
 from aiokafka import AIOKafkaConsumer
 import asyncio
-import json
+import logging
 import os
-from app.core import resources
+from app.core import resources, wire
+from app.core.log import brief, set_campaign_id
+from app.core.history import resolve_history
 from app.services.simulator import run_simulation
 
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:29092")
 SIMULATION_TOPIC = os.getenv("KAFKA_TOPIC_SIMULATION_REQUESTS", "simulation.requests")
 RESULT_TOPIC = os.getenv("KAFKA_TOPIC_SIMULATION_COMPLETED", "simulation.completed")
 CONSUMER_GROUP_ID = os.getenv("KAFKA_GROUP_SIMULATION", "simulation-group")
+# Orchestrator's result dispatcher listens here for ready result keys
+RESULT_CHANNEL = os.getenv("REDIS_RESULT_CHANNEL", "campaign:results")
+
+logger = logging.getLogger(__name__)
 
 async def consume_messages():
-    print(f"DEBUG: Starting consumer for {SIMULATION_TOPIC}...", flush=True)
+    logger.info("Starting consumer for %s", SIMULATION_TOPIC)
     consumer = AIOKafkaConsumer(
         SIMULATION_TOPIC,
         bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
         group_id=CONSUMER_GROUP_ID,
-        value_deserializer=lambda m: json.loads(m.decode('utf-8')),
         retry_backoff_ms=500,
         request_timeout_ms=30000,
         connections_max_idle_ms=600000
@@ -24,12 +29,16 @@ async def consume_messages():
     
     try:
         await consumer.start()
-        print(f"DEBUG: Consumer started successfully for {SIMULATION_TOPIC}", flush=True)
+        logger.info("Consumer started successfully for %s", SIMULATION_TOPIC)
         
         async for msg in consumer:
-            payload = msg.value
+            payload = {}
             try:
-                print(f"Received Simulation Request: {payload}")
+                # msgpack/JSON theo header content-type (message cũ không có header = JSON)
+                payload = wire.decode(msg.value, msg.headers)
+                set_campaign_id(payload.get("campaign_id"))
+                logger.debug("Received simulation request: %s", brief(payload))
+                await resolve_history(resources.redis_client, payload)
                 
                 # --- EXECUTE AUTOGEN ---
                 # Pass push_trace callback from resources
@@ -42,16 +51,17 @@ async def consume_messages():
                 
                 if campaign_id and resources.redis_client:
                     redis_key = f"campaign:{campaign_id}:node:{node_id}:result" if node_id else f"campaign:{campaign_id}:simulation_result"
-                    await resources.redis_client.rpush(redis_key, json.dumps(result))
+                    await resources.redis_client.rpush(redis_key, wire.dumps(result))
                     await resources.redis_client.expire(redis_key, 600)
+                    await resources.redis_client.publish(RESULT_CHANNEL, redis_key)
 
                 # 2. Send result to Kafka (for Data Ingestion)
                 if resources.producer:
-                    await resources.producer.send_and_wait(RESULT_TOPIC, result)
-                    print(f"Sent result to {RESULT_TOPIC} & Redis")
+                    await resources.producer.send_and_wait(RESULT_TOPIC, result, headers=wire.kafka_headers())
+                    logger.debug("Sent result to %s & Redis", RESULT_TOPIC)
                     
             except Exception as e:
-                print(f"ERROR: Exception processing simulation request: {e}", flush=True)
+                logger.exception("Exception processing simulation request: %s", e)
                 # Push failure result to Redis so orchestrator doesn't hang
                 try:
                     campaign_id = payload.get("campaign_id")
@@ -64,12 +74,13 @@ async def consume_messages():
                             "error": str(e)
                         }
                         redis_key = f"campaign:{campaign_id}:node:{node_id}:result" if node_id else f"campaign:{campaign_id}:simulation_result"
-                        await resources.redis_client.rpush(redis_key, json.dumps(failed_result))
+                        await resources.redis_client.rpush(redis_key, wire.dumps(failed_result))
+                        await resources.redis_client.publish(RESULT_CHANNEL, redis_key)
                 except Exception as inner_e:
-                    print(f"DEBUG: Failed to push error result to Redis: {inner_e}")
+                    logger.error("Failed to push error result to Redis: %s", inner_e)
                     
     except Exception as e:
-        print(f"CRITICAL: Consumer reported error: {e}", flush=True)
+        logger.critical("Consumer reported error: %s", e)
     finally:
         await consumer.stop()
-        print(f"DEBUG: Consumer stopped for {SIMULATION_TOPIC}")
+        logger.info("Consumer stopped for %s", SIMULATION_TOPIC)
@@ -0,0 +1,34 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+
+import fakeredis
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core import history
+from app.core.history import fetch_history
+
+class TestHistoryCache(unittest.TestCase):
+
+    def test_rewritten_history_is_not_served_from_cache(self):
+        async def run_test():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            history._cache.clear()
+            await redis.rpush("campaign:c1:history", *[json.dumps({"content": c}) for c in "abc"])
+            before = await fetch_history(redis, {"key": "campaign:c1:history", "length": 2})
+
+            # Orchestrator ghi lại list (cùng độ dài trở lên) với epoch mới
+            await redis.delete("campaign:c1:history")
+            await redis.rpush("campaign:c1:history", *[json.dumps({"content": c}) for c in "xyz"])
+            after = await fetch_history(redis, {"key": "campaign:c1:history", "length": 3, "epoch": "e1"})
+            return before, after
+
+        before, after = asyncio.run(run_test())
+        self.assertEqual([m["content"] for m in before], ["a", "b"])
+        self.assertEqual([m["content"] for m in after], ["x", "y", "z"])
+
+if __name__ == "__main__":
+    unittest.main()